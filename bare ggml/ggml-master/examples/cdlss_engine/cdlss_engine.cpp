@@ -14,25 +14,18 @@
 #include "common.h"
 #include "common-ggml.h"
 #include "ggml-cdlss.h"
+#include "cdlss_engine.h"
 
 #include <cassert>
 
-#if defined(_WIN32)
-#define CDLSS_API __declspec(dllexport)
-#else
-#define CDLSS_API __attribute__((visibility("default")))
-#endif
-
-static std::string g_result_buffer;
-static int g_cdlss_trajectories = 10;
-static float g_cdlss_dcx = 0.85f;
-
 #include <cmath>
 #include <cstdio>
 #include <cstring>
 #include <fstream>
 #include <map>
+#include <mutex>
 #include <string>
+#include <thread>
 #include <vector>
 
 #if defined(_MSC_VER)
@@ -95,22 +88,28 @@ struct gpt2_model {
 
     std::vector<gpt2_layer> layers;
 
-    // key + value memory
-    struct ggml_tensor * memory_k;
-    struct ggml_tensor * memory_v;
-
     //
-    struct ggml_context * ctx_w;
-    struct ggml_context * ctx_kv;
+    struct ggml_context * ctx_w = NULL;
 
     ggml_backend_t backend = NULL;
 
-    ggml_backend_buffer_t buffer_w;
-    ggml_backend_buffer_t buffer_kv;
+    ggml_backend_buffer_t buffer_w = NULL;
 
     std::map<std::string, struct ggml_tensor *> tensors;
 };
 
+// key + value memory; separate from the weights so several contexts can share one model
+struct gpt2_kv_cache {
+    int n_ctx = 0;
+
+    struct ggml_tensor * memory_k = NULL;
+    struct ggml_tensor * memory_v = NULL;
+
+    struct ggml_context * ctx = NULL;
+
+    ggml_backend_buffer_t buffer = NULL;
+};
+
 // load the model's weights from a file
 bool gpt2_model_load(const std::string & fname, gpt2_model & model, gpt_vocab & vocab, int n_ctx, int n_gpu_layers) {
     printf("%s: loading model from '%s'\n", __func__, fname.c_str());
@@ -318,47 +317,8 @@ bool gpt2_model_load(const std::string & fname, gpt2_model & model, gpt_vocab &
     printf("%s: backend buffer size = %6.2f MB\n", __func__, ggml_backend_buffer_get_size(model.buffer_w)/(1024.0*1024.0));
 
     // override the default training context with the user-provided
-    model.hparams.n_ctx = n_ctx;
-
-    // key + value memory
-    {
-        auto * ctx = model.ctx_kv;
-
-        // create the ggml context
-        {
-            size_t n_tensors = 2;
-            struct ggml_init_params params = {
-                /*.mem_size   =*/ ggml_tensor_overhead() * n_tensors,
-                /*.mem_buffer =*/ NULL,
-                /*.no_alloc   =*/ true,
-            };
-
-            ctx = ggml_init(params);
-            if (!ctx) {
-                fprintf(stderr, "%s: ggml_init() failed\n", __func__);
-                return false;
-            }
-        }
-
-        const auto & hparams = model.hparams;
-
-        const int n_embd  = hparams.n_embd;
-        const int n_layer = hparams.n_layer;
-        const int n_ctx   = hparams.n_ctx;
-
-        const int n_mem      = n_layer*n_ctx;
-        const int n_elements = n_embd*n_mem;
-
-        // k and v here can also be GGML_TYPE_F16 to save memory and speed up the computation
-        // if backend supports it
-        model.memory_k = ggml_new_tensor_1d(ctx, GGML_TYPE_F32, n_elements);
-        model.memory_v = ggml_new_tensor_1d(ctx, GGML_TYPE_F32, n_elements);
-
-        // allocate the KV memory in a backend buffer
-        model.buffer_kv = ggml_backend_alloc_ctx_tensors(ctx, model.backend);
-
-        const size_t memory_size = ggml_backend_buffer_get_size(model.buffer_kv);
-        printf("%s: memory size = %8.2f MB, n_mem = %d\n", __func__, memory_size/1024.0/1024.0, n_mem);
+    if (n_ctx > 0) {
+        model.hparams.n_ctx = n_ctx;
     }
 
     // load weights
@@ -454,9 +414,64 @@ bool gpt2_model_load(const std::string & fname, gpt2_model & model, gpt_vocab &
     return true;
 }
 
+// allocate n_ctx positions of key + value memory on backend
+bool gpt2_kv_cache_init(gpt2_kv_cache & kv, const gpt2_model & model, ggml_backend_t backend, int n_ctx) {
+    const auto & hparams = model.hparams;
+
+    const int n_embd  = hparams.n_embd;
+    const int n_layer = hparams.n_layer;
+
+    const int n_mem      = n_layer*n_ctx;
+    const int n_elements = n_embd*n_mem;
+
+    struct ggml_init_params params = {
+        /*.mem_size   =*/ ggml_tensor_overhead() * 2,
+        /*.mem_buffer =*/ NULL,
+        /*.no_alloc   =*/ true,
+    };
+
+    kv.ctx = ggml_init(params);
+    if (!kv.ctx) {
+        fprintf(stderr, "%s: ggml_init() failed\n", __func__);
+        return false;
+    }
+
+    kv.n_ctx = n_ctx;
+
+    // k and v here can also be GGML_TYPE_F16 to save memory and speed up the computation
+    // if backend supports it
+    kv.memory_k = ggml_new_tensor_1d(kv.ctx, GGML_TYPE_F32, n_elements);
+    kv.memory_v = ggml_new_tensor_1d(kv.ctx, GGML_TYPE_F32, n_elements);
+
+    // allocate the KV memory in a backend buffer
+    kv.buffer = ggml_backend_alloc_ctx_tensors(kv.ctx, backend);
+    if (!kv.buffer) {
+        fprintf(stderr, "%s: failed to allocate the KV memory\n", __func__);
+        return false;
+    }
+
+    const size_t memory_size = ggml_backend_buffer_get_size(kv.buffer);
+    printf("%s: memory size = %8.2f MB, n_mem = %d\n", __func__, memory_size/1024.0/1024.0, n_mem);
+
+    return true;
+}
+
+void gpt2_kv_cache_free(gpt2_kv_cache & kv) {
+    ggml_backend_buffer_free(kv.buffer);
+    ggml_free(kv.ctx);
+
+    kv = gpt2_kv_cache();
+}
+
 // build the computation graph
+//
+//   - buf: scratch for the ggml_tensor and ggml_cgraph structs (not the tensor data); one per caller,
+//          so graphs for different contexts can be built concurrently
+//
 struct ggml_cgraph * gpt2_graph(
         const gpt2_model & model,
+        const gpt2_kv_cache & kv,
+        std::vector<uint8_t> & buf,
         const int n_past,
         const int n_tokens) {
     const int N = n_tokens;
@@ -465,12 +480,12 @@ struct ggml_cgraph * gpt2_graph(
 
     const int n_embd  = hparams.n_embd;
     const int n_layer = hparams.n_layer;
-    const int n_ctx   = hparams.n_ctx;
+    const int n_ctx   = kv.n_ctx;
     const int n_head  = hparams.n_head;
 
     // since we are using ggml-alloc, this buffer only needs enough space to hold the ggml_tensor and ggml_cgraph structs, but not the tensor data
-    static size_t buf_size = ggml_tensor_overhead()*GPT2_MAX_NODES + ggml_graph_overhead_custom(GPT2_MAX_NODES, false);
-    static std::vector<uint8_t> buf(buf_size);
+    const size_t buf_size = ggml_tensor_overhead()*GPT2_MAX_NODES + ggml_graph_overhead_custom(GPT2_MAX_NODES, false);
+    buf.resize(buf_size);
 
     struct ggml_init_params params = {
         /*.mem_size   =*/ buf_size,
@@ -543,8 +558,8 @@ struct ggml_cgraph * gpt2_graph(
 
             // store key and value to memory
             if (N >= 1) {
-                struct ggml_tensor * k = ggml_view_1d(ctx, model.memory_k, N*n_embd, (ggml_element_size(model.memory_k)*n_embd)*(il*n_ctx + n_past));
-                struct ggml_tensor * v = ggml_view_1d(ctx, model.memory_v, N*n_embd, (ggml_element_size(model.memory_v)*n_embd)*(il*n_ctx + n_past));
+                struct ggml_tensor * k = ggml_view_1d(ctx, kv.memory_k, N*n_embd, (ggml_element_size(kv.memory_k)*n_embd)*(il*n_ctx + n_past));
+                struct ggml_tensor * v = ggml_view_1d(ctx, kv.memory_v, N*n_embd, (ggml_element_size(kv.memory_v)*n_embd)*(il*n_ctx + n_past));
 
                 ggml_build_forward_expand(gf, ggml_cpy(ctx, Kcur, k));
                 ggml_build_forward_expand(gf, ggml_cpy(ctx, Vcur, v));
@@ -562,7 +577,7 @@ struct ggml_cgraph * gpt2_graph(
             struct ggml_tensor * K =
                 ggml_permute(ctx,
                         ggml_reshape_3d(ctx,
-                            ggml_view_1d(ctx, model.memory_k, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(model.memory_k)*n_embd),
+                            ggml_view_1d(ctx, kv.memory_k, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(kv.memory_k)*n_embd),
                             n_embd/n_head, n_head, n_past + N),
                         0, 2, 1, 3);
 
@@ -571,7 +586,7 @@ struct ggml_cgraph * gpt2_graph(
             //    ggml_cpy(ctx0,
             //            ggml_permute(ctx0,
             //                ggml_reshape_3d(ctx0,
-            //                    ggml_view_1d(ctx0, model.memory_v, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(model.memory_v)*n_embd),
+            //                    ggml_view_1d(ctx0, kv.memory_v, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(kv.memory_v)*n_embd),
             //                    n_embd/n_head, n_head, n_past + N),
             //                1, 2, 0, 3),
             //            ggml_new_tensor_3d(ctx0, GGML_TYPE_F32, n_past + N, n_embd/n_head, n_head));
@@ -603,7 +618,7 @@ struct ggml_cgraph * gpt2_graph(
                 ggml_cont_3d(ctx,
                         ggml_permute(ctx,
                             ggml_reshape_3d(ctx,
-                                ggml_view_1d(ctx, model.memory_v, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(model.memory_v)*n_embd),
+                                ggml_view_1d(ctx, kv.memory_v, (n_past + N)*n_embd, il*n_ctx*ggml_element_size(kv.memory_v)*n_embd),
                                 n_embd/n_head, n_head, n_past + N),
                             1, 2, 0, 3),
                         n_past + N, n_embd/n_head, n_head);
@@ -735,7 +750,10 @@ struct ggml_cgraph * gpt2_graph(
 // evaluate the transformer
 //
 //   - model:     the model
+//   - kv:        the key + value memory of the calling context
+//   - backend:   the backend to compute on
 //   - allocr:    ggml_gallocr to use to allocate the compute buffer
+//   - buf:       graph scratch of the calling context (see gpt2_graph)
 //   - n_threads: number of threads to use
 //   - n_past:    the context size so far
 //   - embd_inp:  the embeddings of the tokens in the context
@@ -743,7 +761,10 @@ struct ggml_cgraph * gpt2_graph(
 //
 bool gpt2_eval(
         const gpt2_model & model,
+        const gpt2_kv_cache & kv,
+        ggml_backend_t backend,
         ggml_gallocr_t allocr,
+        std::vector<uint8_t> & buf,
         const int n_threads,
         const int n_past,
         const std::vector<gpt_vocab::id> & embd_inp,
@@ -754,7 +775,7 @@ bool gpt2_eval(
 
     const int n_vocab = hparams.n_vocab;
 
-    struct ggml_cgraph * gf = gpt2_graph(model, n_past, embd_inp.size());
+    struct ggml_cgraph * gf = gpt2_graph(model, kv, buf, n_past, embd_inp.size());
 
     // allocate the graph tensors
     ggml_gallocr_alloc_graph(allocr, gf);
@@ -770,12 +791,12 @@ bool gpt2_eval(
     }
 
     // set backend options
-    if (ggml_backend_is_cpu(model.backend)) {
-        ggml_backend_cpu_set_n_threads(model.backend, n_threads);
+    if (ggml_backend_is_cpu(backend)) {
+        ggml_backend_cpu_set_n_threads(backend, n_threads);
     }
 
     // run the computation
-    ggml_backend_graph_compute(model.backend, gf);
+    ggml_backend_graph_compute(backend, gf);
 
     //if (n_past%100 == 0) {
     //    ggml_graph_print   (&gf);
@@ -795,184 +816,312 @@ bool gpt2_eval(
     return true;
 }
 
-int main_inner(int argc, char ** argv) {
-    g_result_buffer.clear();
-    ggml_time_init();
+//
+// model handles and generation contexts (see cdlss_engine.h for the threading contract)
+//
 
-    const int64_t t_main_start_us = ggml_time_us();
+#define CDLSS_N_BATCH 32
+#define CDLSS_TOKEN_EOS 50256
 
-    gpt_params params;
-    params.model = "models/gpt-2-117M/ggml-model.bin";
+struct cdlss_model {
+    std::string path;
 
-    if (gpt_params_parse(argc, argv, params) == false) {
-        return 1;
-    }
+    gpt2_model model;   // weights only, read-only after load
+    gpt_vocab  vocab;
 
-    if (params.seed < 0) {
-        params.seed = time(NULL);
+    // contexts on a non-CPU backend share model.backend and take turns on it
+    std::mutex backend_mutex;
+};
+
+struct cdlss_context {
+    cdlss_model * model = NULL;
+
+    gpt2_kv_cache kv;
+
+    ggml_backend_t backend = NULL;
+    bool owns_backend = false;
+
+    ggml_gallocr_t allocr = NULL;
+    std::vector<uint8_t> graph_buf;
+
+    // tokens whose K/V currently sit in kv (last prompt + its continuation);
+    // the next call only evaluates what differs from its own prompt prefix
+    std::vector<gpt_vocab::id> kv_tokens;
+
+    std::vector<float> logits;
+    std::string result;
+
+    // sampling arena, reused by every token of every call; grows to the largest num_trajectories seen
+    ggml_cdlss_storm_t storm = NULL;
+
+    // timings of the last cdlss_generate call
+    int64_t t_sample_us  = 0;
+    int64_t t_predict_us = 0;
+    int32_t n_eval       = 0;
+};
+
+extern "C" CDLSS_API struct cdlss_gen_params cdlss_default_gen_params(void) {
+    struct cdlss_gen_params params;
+    params.num_trajectories = 10;
+    params.dcx_threshold    = 0.85f;
+    params.temp             = 0.9f;
+    params.top_k            = 40;
+    params.top_p            = 0.9f;
+    params.n_predict        = 200;
+    params.seed             = -1;
+    params.n_threads        = std::min(4, (int32_t) std::thread::hardware_concurrency());
+    params.ignore_eos       = false;
+    params.on_token         = NULL;
+    params.on_token_data    = NULL;
+    params.cancel           = NULL;
+    return params;
+}
+
+extern "C" CDLSS_API struct cdlss_model * cdlss_model_load(const char * model_path, int32_t n_ctx, int32_t n_gpu_layers) {
+    ggml_time_init();
+
+    cdlss_model * handle = new cdlss_model();
+    handle->path = model_path;
+
+    if (!gpt2_model_load(handle->path, handle->model, handle->vocab, n_ctx, n_gpu_layers)) {
+        fprintf(stderr, "%s: failed to load model from '%s'\n", __func__, model_path);
+        cdlss_model_free(handle);
+        return NULL;
     }
 
-    printf("%s: seed = %d\n", __func__, params.seed);
+    return handle;
+}
 
-    std::mt19937 rng(params.seed);
-    if (params.prompt.empty()) {
-        params.prompt = gpt_random_prompt(rng);
+extern "C" CDLSS_API void cdlss_model_free(struct cdlss_model * handle) {
+    if (!handle) {
+        return;
     }
 
-    int64_t t_load_us = 0;
+    gpt2_model & model = handle->model;
+
+    ggml_free(model.ctx_w);
 
-    gpt_vocab vocab;
-    gpt2_model model;
+    ggml_backend_buffer_free(model.buffer_w);
+    ggml_backend_free(model.backend);
 
-    // load the model
-    {
-        const int64_t t_start_us = ggml_time_us();
+    delete handle;
+}
 
-        if (!gpt2_model_load(params.model, model, vocab, params.n_ctx, params.n_gpu_layers)) {
-            fprintf(stderr, "%s: failed to load model from '%s'\n", __func__, params.model.c_str());
-            return 1;
-        }
+extern "C" CDLSS_API struct cdlss_context * cdlss_context_new(struct cdlss_model * model, int32_t n_ctx) {
+    if (!model) {
+        return NULL;
+    }
 
-        t_load_us = ggml_time_us() - t_start_us;
+    const int n_ctx_model = model->model.hparams.n_ctx;
+
+    cdlss_context * ctx = new cdlss_context();
+    ctx->model = model;
 
-        test_gpt_tokenizer(vocab, params.token_test);
+    // on the CPU every context computes on its own backend instance (thread pool and work buffer);
+    // the weights live in host memory and are read concurrently
+    if (ggml_backend_is_cpu(model->model.backend)) {
+        ctx->backend = ggml_backend_cpu_init();
+        ctx->owns_backend = true;
+    } else {
+        ctx->backend = model->model.backend;
     }
 
-    ggml_gallocr_t allocr = NULL;
-    // allocate the compute buffer
+    if (!ctx->backend || !gpt2_kv_cache_init(ctx->kv, model->model, ctx->backend, n_ctx > 0 ? std::min(n_ctx, n_ctx_model) : n_ctx_model)) {
+        cdlss_context_free(ctx);
+        return NULL;
+    }
+
+    // allocate the compute buffer once, for the worst case graph
     {
-        // create a graph allocator with the backend's default buffer type
-        allocr = ggml_gallocr_new(ggml_backend_get_default_buffer_type(model.backend));
+        ctx->allocr = ggml_gallocr_new(ggml_backend_get_default_buffer_type(ctx->backend));
 
-        // create the worst case graph for memory usage estimation
-        int n_tokens = std::min(model.hparams.n_ctx, params.n_batch);
-        int n_past = model.hparams.n_ctx - n_tokens;
-        struct ggml_cgraph * gf = gpt2_graph(model, n_past, n_tokens);
+        int n_tokens = std::min(ctx->kv.n_ctx, CDLSS_N_BATCH);
+        int n_past = ctx->kv.n_ctx - n_tokens;
+        struct ggml_cgraph * gf = gpt2_graph(model->model, ctx->kv, ctx->graph_buf, n_past, n_tokens);
 
-        // pre-allocate the compute buffer for the worst case (optional)
-        ggml_gallocr_reserve(allocr, gf);
-        size_t mem_size =  ggml_gallocr_get_buffer_size(allocr, 0);
+        ggml_gallocr_reserve(ctx->allocr, gf);
+        size_t mem_size = ggml_gallocr_get_buffer_size(ctx->allocr, 0);
         fprintf(stderr, "%s: compute buffer size: %.2f MB\n", __func__, mem_size/1024.0/1024.0);
     }
 
-    int n_past = 0;
+    return ctx;
+}
 
-    int64_t t_sample_us  = 0;
-    int64_t t_predict_us = 0;
+extern "C" CDLSS_API void cdlss_context_free(struct cdlss_context * ctx) {
+    if (!ctx) {
+        return;
+    }
 
-    std::vector<float> logits;
+    ggml_cdlss_storm_free(ctx->storm);
+    ggml_gallocr_free(ctx->allocr);
+    gpt2_kv_cache_free(ctx->kv);
+
+    if (ctx->owns_backend) {
+        ggml_backend_free(ctx->backend);
+    }
 
-    // tokenize the prompt
-    std::vector<gpt_vocab::id> embd_inp = ::gpt_tokenize(vocab, params.prompt);
+    delete ctx;
+}
 
-    params.n_predict = std::min(params.n_predict, model.hparams.n_ctx - (int) embd_inp.size());
+static bool cdlss_eval(cdlss_context & ctx, int n_threads, int n_past, const std::vector<gpt_vocab::id> & embd) {
+    const int64_t t_start_us = ggml_time_us();
 
-    printf("%s: prompt: '%s'\n", __func__, params.prompt.c_str());
-    printf("%s: number of tokens in prompt = %zu, first 8 tokens: ", __func__, embd_inp.size());
-    for (int i = 0; i < std::min(8, (int) embd_inp.size()); i++) {
-        printf("%d ", embd_inp[i]);
+    bool ok;
+    if (ctx.owns_backend) {
+        ok = gpt2_eval(ctx.model->model, ctx.kv, ctx.backend, ctx.allocr, ctx.graph_buf, n_threads, n_past, embd, ctx.logits);
+    } else {
+        std::lock_guard<std::mutex> lock(ctx.model->backend_mutex);
+        ok = gpt2_eval(ctx.model->model, ctx.kv, ctx.backend, ctx.allocr, ctx.graph_buf, n_threads, n_past, embd, ctx.logits);
     }
-    printf("\n\n");
 
-    // submit the input prompt token-by-token
-    // this reduces the memory usage during inference, at the cost of a bit of speed at the beginning
-    std::vector<gpt_vocab::id> embd;
+    ctx.t_predict_us += ggml_time_us() - t_start_us;
+    ctx.n_eval += (int32_t) embd.size();
+
+    return ok;
+}
 
-    for (size_t i = embd.size(); i < embd_inp.size() + params.n_predict; i++) {
-        // predict
-        if (embd.size() > 0) {
-            const int64_t t_start_us = ggml_time_us();
+// generates a continuation of prompt, sampling every token from the CDLSS-refined logits
+static bool cdlss_generate_impl(cdlss_context & ctx, const std::string & prompt, const cdlss_gen_params & params) {
+    gpt_vocab & vocab = ctx.model->vocab;
 
-            if (!gpt2_eval(model, allocr, params.n_threads, n_past, embd, logits)) {
-                printf("Failed to predict\n");
-                return 1;
-            }
+    const int n_vocab = ctx.model->model.hparams.n_vocab;
+    const int n_ctx   = ctx.kv.n_ctx;
+
+    ctx.result.clear();
+    ctx.t_sample_us  = 0;
+    ctx.t_predict_us = 0;
+    ctx.n_eval       = 0;
+
+    // unseeded calls draw from random_device: concurrent contexts started in the same second must not repeat each other
+    std::mt19937 rng(params.seed < 0 ? std::random_device{}() : (uint32_t) params.seed);
+
+    std::vector<gpt_vocab::id> embd_inp = ::gpt_tokenize(vocab, prompt);
+    if (embd_inp.empty() || (int) embd_inp.size() >= n_ctx) {
+        fprintf(stderr, "%s: prompt has %zu tokens (context is %d)\n", __func__, embd_inp.size(), n_ctx);
+        return false;
+    }
+
+    const int n_predict = std::min(params.n_predict, n_ctx - (int) embd_inp.size());
+
+    // keep the K/V of the prefix shared with the previous call; the last prompt token
+    // is always evaluated again because its logits are not kept
+    size_t n_past = 0;
+    while (n_past < ctx.kv_tokens.size() && n_past + 1 < embd_inp.size() && ctx.kv_tokens[n_past] == embd_inp[n_past]) {
+        n_past++;
+    }
+    ctx.kv_tokens.resize(n_past);
+
+    std::vector<gpt_vocab::id> embd;
 
-            t_predict_us += ggml_time_us() - t_start_us;
+    // submit the rest of the prompt in batches
+    while (n_past < embd_inp.size()) {
+        if (params.cancel && *params.cancel) {
+            return true;
         }
 
-        n_past += embd.size();
-        embd.clear();
+        const size_t n_eval = std::min(embd_inp.size() - n_past, (size_t) CDLSS_N_BATCH);
+        embd.assign(embd_inp.begin() + n_past, embd_inp.begin() + n_past + n_eval);
 
-        if (i >= embd_inp.size()) {
-            // sample next token
-            const int   top_k = params.top_k;
-            const float top_p = params.top_p;
-            const float temp  = params.temp;
+        if (!cdlss_eval(ctx, params.n_threads, (int) n_past, embd)) {
+            ctx.kv_tokens.clear();
+            return false;
+        }
 
-            const int n_vocab = model.hparams.n_vocab;
+        n_past += n_eval;
+        ctx.kv_tokens.insert(ctx.kv_tokens.end(), embd.begin(), embd.end());
+    }
 
-            gpt_vocab::id id = 0;
+    ggml_cdlss_params cdlss_p = {
+        /* num_trajectories = */ params.num_trajectories > 0 ? params.num_trajectories : 1,
+        /* temperature = */ params.temp,
+        /* dcx_threshold = */ params.dcx_threshold,
+        /* temporal_decay_lambda = */ 0.015f,
+        /* cache_aware = */ false
+    };
 
-            {
-                const int64_t t_start_sample_us = ggml_time_us();
-                float * base_logits = logits.data() + (logits.size() - n_vocab);
-
-                ggml_cdlss_storm_t storm = ggml_cdlss_storm_new(n_vocab, g_cdlss_trajectories);
-                ggml_cdlss_params cdlss_p = {
-                    /* num_trajectories = */ g_cdlss_trajectories,
-                    /* temperature = */ temp,
-                    /* dcx_threshold = */ g_cdlss_dcx,
-                    /* temporal_decay_lambda = */ 0.015f,
-                    /* cache_aware = */ false
-                };
-                ggml_cdlss_storm_generate(storm, base_logits, cdlss_p);
-                ggml_cdlss_storm_collapse(storm);
-                float * refined_logits = ggml_cdlss_storm_get_refined_logits(storm);
-
-                id = gpt_sample_top_k_top_p(vocab, refined_logits, top_k, top_p, temp, rng);
-
-                ggml_cdlss_storm_free(storm);
-                t_sample_us += ggml_time_us() - t_start_sample_us;
-            }
+    // size the context's storm once per call, so the token loop does not allocate
+    if (!ctx.storm) {
+        ctx.storm = ggml_cdlss_storm_new(n_vocab, cdlss_p.num_trajectories);
+    }
+    if (!ctx.storm || !ggml_cdlss_storm_resize(ctx.storm, cdlss_p.num_trajectories)) {
+        fprintf(stderr, "%s: failed to allocate a storm of %d trajectories\n", __func__, cdlss_p.num_trajectories);
+        return false;
+    }
 
-            // add it to the context
-            embd.push_back(id);
-        } else {
-            // if here, it means we are still processing the input prompt
-            for (size_t k = i; k < embd_inp.size(); k++) {
-                embd.push_back(embd_inp[k]);
-                if (int32_t(embd.size()) >= params.n_batch) {
-                    break;
-                }
-            }
-            i += embd.size() - 1;
+    for (int k = 0; k < n_predict; k++) {
+        if (params.cancel && *params.cancel) {
+            break;
         }
 
-        // display text
-        for (auto id : embd) {
-            printf("%s", vocab.id_to_token[id].c_str());
-            g_result_buffer += vocab.id_to_token[id];
+        // sample next token from the storm-refined logits
+        gpt_vocab::id id = 0;
+        {
+            const int64_t t_start_sample_us = ggml_time_us();
+
+            ggml_cdlss_storm_t storm = ctx.storm;
+            ggml_cdlss_storm_set_seed(storm, ((uint64_t) rng() << 32) | rng());
+            ggml_cdlss_storm_generate(storm, ctx.logits.data(), cdlss_p);
+            ggml_cdlss_storm_collapse(storm);
+            float * refined_logits = ggml_cdlss_storm_get_refined_logits(storm);
+
+            id = gpt_sample_top_k_top_p(vocab, refined_logits, params.top_k, params.top_p, params.temp, rng);
+
+            ctx.t_sample_us += ggml_time_us() - t_start_sample_us;
         }
-        fflush(stdout);
 
         // end of text token
-        if (!params.ignore_eos && embd.back() == 50256) {
+        if (!params.ignore_eos && id == CDLSS_TOKEN_EOS) {
             break;
         }
-    }
 
-    // report timing
-    {
-        const int64_t t_main_end_us = ggml_time_us();
+        const std::string & token = vocab.id_to_token[id];
+        ctx.result += token;
 
-        printf("\n\n");
-        printf("%s:     load time = %8.2f ms\n", __func__, t_load_us/1000.0f);
-        printf("%s:   sample time = %8.2f ms\n", __func__, t_sample_us/1000.0f);
-        printf("%s:  predict time = %8.2f ms / %.2f ms per token\n", __func__, t_predict_us/1000.0f, t_predict_us/1000.0f/n_past);
-        printf("%s:    total time = %8.2f ms\n", __func__, (t_main_end_us - t_main_start_us)/1000.0f);
+        if (params.on_token && !params.on_token(token.c_str(), params.on_token_data)) {
+            break;
+        }
+
+        if (k + 1 == n_predict) {
+            break; // the last token's logits are never used
+        }
+
+        embd.assign(1, id);
+
+        if (!cdlss_eval(ctx, params.n_threads, (int) n_past, embd)) {
+            ctx.kv_tokens.clear();
+            return false;
+        }
+
+        n_past += 1;
+        ctx.kv_tokens.push_back(id);
     }
 
-    ggml_free(model.ctx_w);
+    return true;
+}
 
-    ggml_gallocr_free(allocr);
-    ggml_backend_buffer_free(model.buffer_w);
-    ggml_backend_buffer_free(model.buffer_kv);
-    ggml_backend_free(model.backend);
+extern "C" CDLSS_API const char * cdlss_generate(struct cdlss_context * ctx, const char * prompt, const struct cdlss_gen_params * params) {
+    if (!ctx || !prompt) {
+        return NULL;
+    }
 
-    return 0;
+    const cdlss_gen_params defaults = cdlss_default_gen_params();
+    if (!cdlss_generate_impl(*ctx, prompt, params ? *params : defaults)) {
+        return NULL;
+    }
+
+    return ctx->result.c_str();
 }
 
+// legacy one-shot API: models load once per path and stay for the process lifetime;
+// each call borrows an idle context of its model (or creates one), so calls run in parallel
+struct cdlss_cached_model {
+    cdlss_model * model = NULL;
+    std::vector<cdlss_context *> idle;
+};
+
+static std::map<std::string, cdlss_cached_model> g_models;
+static std::mutex g_models_mutex;
+
 extern "C" CDLSS_API const char* run_cdlss_inference(
     const char* model_path, 
     const char* prompt, 
@@ -981,29 +1130,140 @@ extern "C" CDLSS_API const char* run_cdlss_inference(
     float temp, 
     int n_predict) 
 {
-    g_cdlss_trajectories = num_trajectories > 0 ? num_trajectories : 1;
-    g_cdlss_dcx = dcx_threshold;
-    
-    std::string n_predict_str = std::to_string(n_predict);
-    std::string temp_str = std::to_string(temp);
-    
-    // Construct fake argv
-    std::vector<const char*> args;
-    args.push_back("cdlss_engine");
-    args.push_back("-m");
-    args.push_back(model_path);
-    args.push_back("-p");
-    args.push_back(prompt);
-    args.push_back("-n");
-    args.push_back(n_predict_str.c_str());
-    args.push_back("--temp");
-    args.push_back(temp_str.c_str());
-    
-    main_inner((int)args.size(), (char**)args.data());
-    
-    return g_result_buffer.c_str();
+    // valid until the next call on the same thread
+    static thread_local std::string result;
+    result.clear();
+
+    cdlss_model * model = NULL;
+    cdlss_context * ctx = NULL;
+    {
+        std::lock_guard<std::mutex> lock(g_models_mutex);
+
+        cdlss_cached_model & entry = g_models[model_path];
+        if (!entry.model) {
+            entry.model = cdlss_model_load(model_path, 0, 0);
+            if (!entry.model) {
+                g_models.erase(model_path);
+                return result.c_str();
+            }
+        }
+        model = entry.model;
+
+        if (!entry.idle.empty()) {
+            ctx = entry.idle.back();
+            entry.idle.pop_back();
+        }
+    }
+
+    if (!ctx) {
+        ctx = cdlss_context_new(model, 0);
+        if (!ctx) {
+            return result.c_str();
+        }
+    }
+
+    cdlss_gen_params params = cdlss_default_gen_params();
+    params.num_trajectories = num_trajectories > 0 ? num_trajectories : 1;
+    params.dcx_threshold    = dcx_threshold;
+    params.temp             = temp;
+    params.n_predict        = n_predict;
+
+    // the one-shot API has always returned the prompt followed by its continuation
+    const char * text = cdlss_generate(ctx, prompt, &params);
+    result = prompt;
+    if (text) {
+        result += text;
+    }
+
+    {
+        std::lock_guard<std::mutex> lock(g_models_mutex);
+        g_models[model_path].idle.push_back(ctx);
+    }
+
+    return result.c_str();
 }
 
 int main(int argc, char ** argv) {
-    return main_inner(argc, argv);
+    ggml_time_init();
+
+    const int64_t t_main_start_us = ggml_time_us();
+
+    gpt_params params;
+    params.model = "models/gpt-2-117M/ggml-model.bin";
+
+    if (gpt_params_parse(argc, argv, params) == false) {
+        return 1;
+    }
+
+    if (params.seed < 0) {
+        params.seed = time(NULL);
+    }
+
+    printf("%s: seed = %d\n", __func__, params.seed);
+
+    std::mt19937 rng(params.seed);
+    if (params.prompt.empty()) {
+        params.prompt = gpt_random_prompt(rng);
+    }
+
+    int64_t t_load_us = 0;
+
+    // load the model
+    cdlss_model * model = NULL;
+    cdlss_context * ctx = NULL;
+    {
+        const int64_t t_start_us = ggml_time_us();
+
+        model = cdlss_model_load(params.model.c_str(), params.n_ctx, params.n_gpu_layers);
+        if (!model) {
+            return 1;
+        }
+
+        ctx = cdlss_context_new(model, 0);
+        if (!ctx) {
+            cdlss_model_free(model);
+            return 1;
+        }
+
+        t_load_us = ggml_time_us() - t_start_us;
+
+        test_gpt_tokenizer(model->vocab, params.token_test);
+    }
+
+    cdlss_gen_params gen = cdlss_default_gen_params();
+    gen.temp       = params.temp;
+    gen.top_k      = params.top_k;
+    gen.top_p      = params.top_p;
+    gen.n_predict  = params.n_predict;
+    gen.seed       = params.seed;
+    gen.n_threads  = params.n_threads;
+    gen.ignore_eos = params.ignore_eos;
+
+    printf("%s: prompt: '%s'\n\n", __func__, params.prompt.c_str());
+
+    const char * text = cdlss_generate(ctx, params.prompt.c_str(), &gen);
+    if (!text) {
+        printf("Failed to predict\n");
+        cdlss_context_free(ctx);
+        cdlss_model_free(model);
+        return 1;
+    }
+
+    printf("%s%s", params.prompt.c_str(), text);
+
+    // report timing
+    {
+        const int64_t t_main_end_us = ggml_time_us();
+
+        printf("\n\n");
+        printf("%s:     load time = %8.2f ms\n", __func__, t_load_us/1000.0f);
+        printf("%s:   sample time = %8.2f ms\n", __func__, ctx->t_sample_us/1000.0f);
+        printf("%s:  predict time = %8.2f ms / %.2f ms per token\n", __func__, ctx->t_predict_us/1000.0f, ctx->t_predict_us/1000.0f/std::max(1, ctx->n_eval));
+        printf("%s:    total time = %8.2f ms\n", __func__, (t_main_end_us - t_main_start_us)/1000.0f);
+    }
+
+    cdlss_context_free(ctx);
+    cdlss_model_free(model);
+
+    return 0;
 }
@@ -0,0 +1,97 @@
+#pragma once
+
+#include <stdint.h>
+#include <stdbool.h>
+
+#if defined(_WIN32)
+#define CDLSS_API __declspec(dllexport)
+#else
+#define CDLSS_API __attribute__((visibility("default")))
+#endif
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// CDLSS engine: GPT-2 generation with CDLSS storm sampling, as a shared library
+//
+// A model holds the weights; a context holds everything one generation mutates (K/V cache,
+// compute buffers, sampling storm, result text). A storm of N trajectories loads the model once and runs
+// them on as many contexts as it wants in parallel:
+//
+//   struct cdlss_model   * model = cdlss_model_load("models/gpt-2-117M/ggml-model.bin", 0, 0);
+//   struct cdlss_context * ctx   = cdlss_context_new(model, 0);   // one per worker thread
+//   struct cdlss_gen_params params = cdlss_default_gen_params();
+//   params.n_predict = 64;
+//   const char * text = cdlss_generate(ctx, "Once upon a time", &params);
+//   ...
+//   cdlss_context_free(ctx);
+//   cdlss_model_free(model);
+//
+// Threading contract:
+//   - a model is read-only after cdlss_model_load and may be shared by any number of contexts on
+//     any threads; free it only after all of its contexts are freed
+//   - a context is not locked internally: use it from one thread at a time. Different contexts
+//     run concurrently (on the CPU each has its own backend; on a GPU backend their evaluations
+//     take turns on the model's backend)
+//   - text returned by cdlss_generate belongs to the context and stays valid until the next
+//     cdlss_generate or cdlss_context_free on it
+//   - run_cdlss_inference is safe to call from any thread
+//   - on_token runs on the thread that called cdlss_generate; *cancel may be set from any thread
+//
+// Consecutive calls on one context keep the K/V of the prompt prefix they share,
+// so repeating a prompt only evaluates its last token.
+
+struct cdlss_model;
+struct cdlss_context;
+
+// called with the text of every generated token; return false to stop generating
+typedef bool (*cdlss_token_callback)(const char * token, void * user_data);
+
+// per-call generation parameters
+struct cdlss_gen_params {
+    int32_t num_trajectories;   // CDLSS storm size per sampled token
+    float   dcx_threshold;      // DCX pruning threshold [0.0-1.0]
+    float   temp;               // sampling temperature
+    int32_t top_k;
+    float   top_p;
+    int32_t n_predict;          // max new tokens
+    int32_t seed;               // RNG seed (< 0: random)
+    int32_t n_threads;          // CPU threads per evaluation
+    bool    ignore_eos;         // keep generating past the end-of-text token
+
+    cdlss_token_callback on_token;      // optional token stream
+    void *               on_token_data; // passed to on_token
+    const volatile int32_t * cancel;    // optional: stop once *cancel != 0 (checked before every token)
+};
+
+CDLSS_API struct cdlss_gen_params cdlss_default_gen_params(void);
+
+// loads the weights once; n_ctx <= 0 keeps the model's training context. Returns NULL on failure
+CDLSS_API struct cdlss_model * cdlss_model_load(const char * model_path, int32_t n_ctx, int32_t n_gpu_layers);
+
+CDLSS_API void cdlss_model_free(struct cdlss_model * model);
+
+// K/V cache and compute buffers for n_ctx positions (<= 0 or more than the model's: the model's)
+CDLSS_API struct cdlss_context * cdlss_context_new(struct cdlss_model * model, int32_t n_ctx);
+
+CDLSS_API void cdlss_context_free(struct cdlss_context * ctx);
+
+// generates a continuation of prompt (the prompt itself is not included).
+// Returns NULL on failure. A stopped generation (on_token returned false or *cancel was set)
+// returns the text produced so far. params may be NULL for the defaults
+CDLSS_API const char * cdlss_generate(struct cdlss_context * ctx, const char * prompt, const struct cdlss_gen_params * params);
+
+// legacy one-shot call: prompt + continuation. The model is loaded once per path and kept;
+// the text stays valid until the next call on the same thread
+CDLSS_API const char * run_cdlss_inference(
+    const char * model_path,
+    const char * prompt,
+    int num_trajectories,
+    float dcx_threshold,
+    float temp,
+    int n_predict);
+
+#ifdef __cplusplus
+}
+#endif
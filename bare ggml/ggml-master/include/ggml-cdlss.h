@@ -40,12 +40,23 @@ struct ggml_cdlss_result {
 
 // Create a new storm engine
 // vocab_size: vocabulary size (e.g., 50256 for GPT-2)
-// num_trajectories: initial trajectory count (can be modified per call)
+// num_trajectories: initial trajectory capacity (can be modified per call)
+// returns NULL if the buffers cannot be allocated
 GGML_API ggml_cdlss_storm_t ggml_cdlss_storm_new(int32_t vocab_size, int32_t num_trajectories);
 
 // Free storm engine and all buffers
 GGML_API void ggml_cdlss_storm_free(ggml_cdlss_storm_t storm);
 
+// Set the number of active trajectories. The buffers only grow (to exactly num_trajectories),
+// so a storm kept for a whole session stops allocating once it has seen its largest call.
+// ggml_cdlss_storm_generate resizes to params.num_trajectories itself.
+// returns false (storm unchanged) if num_trajectories < 1 or the buffers cannot be allocated
+GGML_API bool ggml_cdlss_storm_resize(ggml_cdlss_storm_t storm, int32_t num_trajectories);
+
+// Seed the storm's trajectory noise. Each storm owns its RNG (time seeded by default),
+// so separate storms can be used from separate threads.
+GGML_API void ggml_cdlss_storm_set_seed(ggml_cdlss_storm_t storm, uint64_t seed);
+
 // Generate hallucination storm from base logits
 // base_logits: quantized model output logits [vocab_size]
 // params: storm configuration
@@ -61,7 +72,7 @@ GGML_API void ggml_cdlss_storm_collapse(ggml_cdlss_storm_t storm);
 GGML_API float * ggml_cdlss_storm_get_refined_logits(ggml_cdlss_storm_t storm);
 
 // Retrieve trajectory metadata (for analysis/visualization)
-// returns pointer to array of n_trajectories
+// returns pointer to array of the active trajectories (*out_count of them)
 GGML_API struct ggml_cdlss_trajectory * ggml_cdlss_storm_get_trajectories(ggml_cdlss_storm_t storm,
                                                                           int32_t * out_count);
 
@@ -7,8 +7,10 @@
 // Internal storm state (opaque to user)
 struct ggml_cdlss_storm {
     int32_t vocab_size;
-    int32_t max_trajectories;
+    int32_t max_trajectories;          // Capacity of the trajectory buffers
+    int32_t n_active;                  // Trajectories of the last generate (<= max_trajectories)
     struct ggml_cdlss_trajectory * trajectories;
+    float * trajectory_logits;         // One [max_trajectories x vocab_size] slab, trajectories[t].logits point into it
 
     float * base_logits;               // Original quantized output
     float * refined_logits;            // Collapsed result
@@ -17,64 +19,177 @@ struct ggml_cdlss_storm {
     struct ggml_cdlss_result result;
 
     // Scratch buffers for computation
-    float * softmax_buf;               // For softmax computation
-    float * dcx_scores;                // DCX scores for each trajectory
     float * trajectory_embeddings;     // 2D embeddings for clustering
+    float * exp_sums;                  // Softmax normalizer of each trajectory
+
+    uint64_t rng_state;                // Per-storm RNG, so concurrent storms do not share rand()
 };
 
 // ============================================================================
 // Utility: Math functions
 // ============================================================================
+//
+// Every per-vocab loop is a plain pass over contiguous arrays without calls or branches, so
+// compilers vectorize it: exp/log use the approximations below instead of libm, and
+// reductions keep CDLSS_LANES independent partial sums (no reassociation needed).
+
+#define CDLSS_LANES 8
+
+static inline uint32_t cdlss_f32_bits(float f) {
+    uint32_t u;
+    memcpy(&u, &f, sizeof(u));
+    return u;
+}
+
+static inline float cdlss_bits_f32(uint32_t u) {
+    float f;
+    memcpy(&f, &u, sizeof(f));
+    return f;
+}
+
+// exp(x) for x <= 0 (callers subtract the max logit), clamped at -87 to stay normal.
+// Cody-Waite reduction by ln2 and a degree-5 polynomial; relative error ~1e-7
+static inline float cdlss_expf(float x) {
+    x = x < -87.0f ? -87.0f : x;
+    const float n = (x * 1.44269504f + 12582912.0f) - 12582912.0f;  // round(x / ln2)
+    const float r = x - n * 0.693359375f + n * 2.12194440e-4f;
+
+    float p = 1.9875691500e-4f;
+    p = p * r + 1.3981999507e-3f;
+    p = p * r + 8.3334519073e-3f;
+    p = p * r + 4.1665795894e-2f;
+    p = p * r + 1.6666665459e-1f;
+    p = p * r + 5.0000001201e-1f;
+    p = p * r * r + r + 1.0f;
+
+    return cdlss_bits_f32(cdlss_f32_bits(p) + ((uint32_t)(int32_t)n << 23));
+}
+
+// log(x) for normal x > 0: split off the exponent with the mantissa in [sqrt(1/2), sqrt(2)),
+// then log(m) = 2 atanh((m - 1) / (m + 1)) as an odd series; absolute error ~1e-7
+static inline float cdlss_logf(float x) {
+    uint32_t u = cdlss_f32_bits(x) + (0x3f800000 - 0x3f3504f3);
+    const float e = (float)((int32_t)(u >> 23) - 127);
+    u = (u & 0x007fffff) + 0x3f3504f3;
 
-static float softmax_scaled(const float * logits, int32_t idx, float temperature, int32_t vocab_size) {
-    float max_logit = logits[0];
-    for (int32_t i = 1; i < vocab_size; i++) {
-        if (logits[i] > max_logit) max_logit = logits[i];
+    const float m  = cdlss_bits_f32(u);
+    const float s  = (m - 1.0f) / (m + 1.0f);
+    const float s2 = s * s;
+
+    float p = 2.0f / 9.0f;
+    p = p * s2 + 2.0f / 7.0f;
+    p = p * s2 + 2.0f / 5.0f;
+    p = p * s2 + 2.0f / 3.0f;
+    p = p * s2 + 2.0f;
+
+    return e * 0.693147181f + s * p;
+}
+
+static inline float cdlss_hsum(const float * v) {
+    float sum = 0.0f;
+    for (int32_t j = 0; j < CDLSS_LANES; j++) {
+        sum += v[j];
     }
+    return sum;
+}
 
-    float exp_sum = 0.0f;
-    for (int32_t i = 0; i < vocab_size; i++) {
-        exp_sum += expf((logits[i] - max_logit) / temperature);
+static float cdlss_max(const float * GGML_RESTRICT x, int32_t n) {
+    float lanes[CDLSS_LANES];
+    for (int32_t j = 0; j < CDLSS_LANES; j++) {
+        lanes[j] = x[0];
     }
 
-    return expf((logits[idx] - max_logit) / temperature) / (exp_sum + 1e-10f);
+    int32_t i = 0;
+    for (; i + CDLSS_LANES <= n; i += CDLSS_LANES) {
+        for (int32_t j = 0; j < CDLSS_LANES; j++) {
+            lanes[j] = x[i + j] > lanes[j] ? x[i + j] : lanes[j];
+        }
+    }
+
+    float max = lanes[0];
+    for (int32_t j = 1; j < CDLSS_LANES; j++) {
+        max = lanes[j] > max ? lanes[j] : max;
+    }
+    for (; i < n; i++) {
+        max = x[i] > max ? x[i] : max;
+    }
+    return max;
 }
 
-static float cosine_similarity(const float * a, const float * b, int32_t dim) {
-    float dot = 0.0f, norm_a = 0.0f, norm_b = 0.0f;
-    for (int32_t i = 0; i < dim; i++) {
-        dot += a[i] * b[i];
-        norm_a += a[i] * a[i];
-        norm_b += b[i] * b[i];
+static float cosine_similarity(const float * GGML_RESTRICT a, const float * GGML_RESTRICT b, int32_t dim) {
+    float dot[CDLSS_LANES] = {0}, norm_a[CDLSS_LANES] = {0}, norm_b[CDLSS_LANES] = {0};
+
+    int32_t i = 0;
+    for (; i + CDLSS_LANES <= dim; i += CDLSS_LANES) {
+        for (int32_t j = 0; j < CDLSS_LANES; j++) {
+            dot[j]    += a[i + j] * b[i + j];
+            norm_a[j] += a[i + j] * a[i + j];
+            norm_b[j] += b[i + j] * b[i + j];
+        }
+    }
+
+    float d = cdlss_hsum(dot), na = cdlss_hsum(norm_a), nb = cdlss_hsum(norm_b);
+    for (; i < dim; i++) {
+        d  += a[i] * b[i];
+        na += a[i] * a[i];
+        nb += b[i] * b[i];
     }
-    float denom = sqrtf(norm_a) * sqrtf(norm_b);
-    return denom > 1e-10f ? dot / denom : 0.0f;
+
+    float denom = sqrtf(na) * sqrtf(nb);
+    return denom > 1e-10f ? d / denom : 0.0f;
+}
+
+// splitmix64: next value of the storm's sequential RNG (one draw per trajectory)
+static uint64_t cdlss_next_u64(uint64_t * state) {
+    uint64_t z = (*state += 0x9E3779B97F4A7C15ULL);
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
 }
 
-static float frand() {
-    return (float)rand() / (float)RAND_MAX;
+// lowbias32 integer hash: counter-based noise, element i of a stream is hash(key + i),
+// so the noise loop has no serial RNG state and vectorizes
+static inline uint32_t cdlss_hash32(uint32_t x) {
+    x ^= x >> 16;
+    x *= 0x7feb352dU;
+    x ^= x >> 15;
+    x *= 0x846ca68bU;
+    x ^= x >> 16;
+    return x;
+}
+
+// uniform float in [0, 1) from the top 24 bits
+static inline float cdlss_uniform(uint32_t h) {
+    return (float)(int32_t)(h >> 8) * (1.0f / 16777216.0f);
 }
 
 // ============================================================================
 // Trajectory generation
 // ============================================================================
 
-// Sample one trajectory from base logits using temperature-scaled sampling
-static void generate_trajectory(struct ggml_cdlss_storm * storm,
-                               float * trajectory_logits,
-                               float temperature) {
-    const float * base = storm->base_logits;
-    int32_t vocab = storm->vocab_size;
+// Upper bound of the logistic noise below: u1 <= 1 - 2^-24 and u2 >= 0 give
+// log((1 + 1e-10) / (2^-24 + 1e-10)) ~= 16.64
+#define CDLSS_NOISE_MAX 16.7f
 
-    // Copy base logits as starting point
-    memcpy(trajectory_logits, base, vocab * sizeof(float));
+// Sample one trajectory: base logits perturbed by temperature-scaled logistic noise.
+// key selects the trajectory's two uniform streams.
+static void generate_trajectory(const struct ggml_cdlss_storm * storm,
+                               float * GGML_RESTRICT trajectory_logits,
+                               float temperature,
+                               uint64_t key) {
+    const float * GGML_RESTRICT base = storm->base_logits;
+    const int32_t vocab = storm->vocab_size;
+
+    const uint32_t k1 = (uint32_t)key;
+    const uint32_t k2 = (uint32_t)(key >> 32);
+    const float scale = temperature * 0.1f;  // Scale noise appropriately
 
-    // Add noise sampled from temperature-scaled distribution
     for (int32_t i = 0; i < vocab; i++) {
-        float prob = softmax_scaled(base, i, temperature, vocab);
-        // Perturbation: sample from logistic distribution scaled by temperature
-        float noise = logf(frand() + 1e-10f) - logf(1.0f - frand() + 1e-10f);
-        trajectory_logits[i] += temperature * noise * 0.1f;  // Scale noise appropriately
+        const float u1 = cdlss_uniform(cdlss_hash32(k1 + (uint32_t)i));
+        const float u2 = cdlss_uniform(cdlss_hash32(k2 + (uint32_t)i));
+        // Logistic noise log(u1) - log(1 - u2), as a single log
+        const float noise = cdlss_logf((u1 + 1e-10f) / (1.0f - u2 + 1e-10f));
+        trajectory_logits[i] = base[i] + scale * noise;
     }
 }
 
@@ -82,22 +197,47 @@ static void generate_trajectory(struct ggml_cdlss_storm * storm,
 // DCX (Divergence-Correlation) scoring
 // ============================================================================
 
-// Compute embedding from logits (use softmax as embedding)
-static void logits_to_embedding(const float * logits, float * embedding, int32_t vocab_size, float temperature) {
-    float max_logit = logits[0];
-    for (int32_t i = 1; i < vocab_size; i++) {
-        if (logits[i] > max_logit) max_logit = logits[i];
+// Compute embedding from logits (use softmax as embedding).
+// max_logit only has to bound the logits from above (softmax is shift invariant), so every
+// trajectory of a step shares one bound instead of each scanning for its own maximum.
+// Returns the softmax normalizer relative to the trajectory's own peak, sum(exp((x - max) / T)),
+// so the consensus can reuse the embedding instead of exponentiating the trajectory again.
+static float logits_to_embedding(const float * GGML_RESTRICT logits, float * GGML_RESTRICT embedding, int32_t vocab_size,
+                                 float temperature, float max_logit) {
+    const float inv_temp = 1.0f / temperature;
+
+    // the peak is tracked on the exps' bit patterns: non-negative floats order like unsigned
+    // integers, and an integer max reduction vectorizes where a float one does not
+    float    sums[CDLSS_LANES] = {0};
+    uint32_t peak[CDLSS_LANES] = {0};
+    int32_t i = 0;
+    for (; i + CDLSS_LANES <= vocab_size; i += CDLSS_LANES) {
+        for (int32_t j = 0; j < CDLSS_LANES; j++) {
+            const float e = cdlss_expf((logits[i + j] - max_logit) * inv_temp);
+            const uint32_t b = cdlss_f32_bits(e);
+            embedding[i + j] = e;
+            sums[j] += e;
+            peak[j] = b > peak[j] ? b : peak[j];
+        }
     }
 
-    float exp_sum = 0.0f;
-    for (int32_t i = 0; i < vocab_size; i++) {
-        embedding[i] = expf((logits[i] - max_logit) / temperature);
+    float exp_sum = cdlss_hsum(sums);
+    uint32_t peak_bits = 0;
+    for (int32_t j = 0; j < CDLSS_LANES; j++) {
+        peak_bits = peak[j] > peak_bits ? peak[j] : peak_bits;
+    }
+    for (; i < vocab_size; i++) {
+        embedding[i] = cdlss_expf((logits[i] - max_logit) * inv_temp);
         exp_sum += embedding[i];
+        peak_bits = cdlss_f32_bits(embedding[i]) > peak_bits ? cdlss_f32_bits(embedding[i]) : peak_bits;
     }
 
-    for (int32_t i = 0; i < vocab_size; i++) {
-        embedding[i] /= (exp_sum + 1e-10f);
+    const float norm = 1.0f / (exp_sum + 1e-10f);
+    for (i = 0; i < vocab_size; i++) {
+        embedding[i] *= norm;
     }
+
+    return exp_sum / cdlss_bits_f32(peak_bits);
 }
 
 // Compute DCX score between trajectory and consensus
@@ -123,30 +263,21 @@ static float compute_dcx_score(const float * traj_embedding,
 // Wave collapse (ensemble)
 // ============================================================================
 
-// Compute mean embedding (consensus)
+// Compute mean embedding (consensus): the average of the trajectories' unnormalized
+// softmax, rebuilt from their embeddings (embedding * normalizer) instead of new exps
 static void compute_consensus(struct ggml_cdlss_storm * storm,
-                             float * consensus,
-                             float temperature) {
+                             float * GGML_RESTRICT consensus,
+                             int32_t n_trajectories) {
     int32_t vocab = storm->vocab_size;
     memset(consensus, 0, vocab * sizeof(float));
 
-    // Average softmax of all trajectories
-    for (int32_t t = 0; t < storm->max_trajectories; t++) {
-        float * traj = storm->trajectories[t].logits;
-        float max_logit = traj[0];
-        for (int32_t i = 1; i < vocab; i++) {
-            if (traj[i] > max_logit) max_logit = traj[i];
-        }
-
+    for (int32_t t = 0; t < n_trajectories; t++) {
+        const float * GGML_RESTRICT emb = storm->trajectory_embeddings + (size_t)t * vocab;
+        const float w = (storm->exp_sums[t] + 1e-10f) / (n_trajectories + 1e-10f);
         for (int32_t i = 0; i < vocab; i++) {
-            consensus[i] += expf((traj[i] - max_logit) / temperature);
+            consensus[i] += w * emb[i];
         }
     }
-
-    // Normalize
-    for (int32_t i = 0; i < vocab; i++) {
-        consensus[i] /= (storm->max_trajectories + 1e-10f);
-    }
 }
 
 // Ensemble high-coherence trajectories into refined logits
@@ -158,7 +289,7 @@ static void ensemble_trajectories(struct ggml_cdlss_storm * storm,
     float weight_sum = 0.0f;
     int32_t kept_count = 0;
 
-    for (int32_t t = 0; t < storm->max_trajectories; t++) {
+    for (int32_t t = 0; t < storm->n_active; t++) {
         if (storm->trajectories[t].dcx_score < dcx_threshold) {
             // This trajectory is coherent enough to keep
             float weight = 1.0f - storm->trajectories[t].dcx_score;
@@ -182,11 +313,11 @@ static void ensemble_trajectories(struct ggml_cdlss_storm * storm,
     }
 
     // Update result metadata
-    storm->result.n_trajectories_pruned = storm->max_trajectories - kept_count;
+    storm->result.n_trajectories_pruned = storm->n_active - kept_count;
 
     // Compute average DCX of kept trajectories
     float dcx_sum = 0.0f;
-    for (int32_t t = 0; t < storm->max_trajectories; t++) {
+    for (int32_t t = 0; t < storm->n_active; t++) {
         if (storm->trajectories[t].dcx_score < dcx_threshold) {
             dcx_sum += storm->trajectories[t].dcx_score;
         }
@@ -199,52 +330,94 @@ static void ensemble_trajectories(struct ggml_cdlss_storm * storm,
 // ============================================================================
 
 GGML_API ggml_cdlss_storm_t ggml_cdlss_storm_new(int32_t vocab_size, int32_t num_trajectories) {
-    struct ggml_cdlss_storm * storm = malloc(sizeof(struct ggml_cdlss_storm));
+    struct ggml_cdlss_storm * storm = calloc(1, sizeof(struct ggml_cdlss_storm));
+    if (!storm) {
+        return NULL;
+    }
 
     storm->vocab_size = vocab_size;
-    storm->max_trajectories = num_trajectories;
-
-    // Allocate trajectory array
-    storm->trajectories = calloc(num_trajectories, sizeof(struct ggml_cdlss_trajectory));
-
-    // Allocate logits for each trajectory
-    for (int32_t i = 0; i < num_trajectories; i++) {
-        storm->trajectories[i].logits = malloc(vocab_size * sizeof(float));
-        storm->trajectories[i].cluster_id = 0;
-        storm->trajectories[i].dcx_score = 0.0f;
-    }
 
     // Allocate buffers
     storm->base_logits = malloc(vocab_size * sizeof(float));
     storm->refined_logits = malloc(vocab_size * sizeof(float));
-    storm->softmax_buf = malloc(vocab_size * sizeof(float));
-    storm->dcx_scores = malloc(num_trajectories * sizeof(float));
-    storm->trajectory_embeddings = malloc(num_trajectories * vocab_size * sizeof(float));
     storm->consensus_embedding = malloc(vocab_size * sizeof(float));
 
     // Initialize result
     memset(&storm->result, 0, sizeof(struct ggml_cdlss_result));
-    storm->result.n_trajectories_generated = num_trajectories;
+
+    storm->rng_state = (uint64_t)time(NULL) ^ (uint64_t)(uintptr_t)storm;
+
+    if (!storm->base_logits || !storm->refined_logits || !storm->consensus_embedding ||
+        !ggml_cdlss_storm_resize(storm, num_trajectories > 0 ? num_trajectories : 1)) {
+        ggml_cdlss_storm_free(storm);
+        return NULL;
+    }
 
     return storm;
 }
 
 GGML_API void ggml_cdlss_storm_free(ggml_cdlss_storm_t storm_ptr) {
     struct ggml_cdlss_storm * storm = (struct ggml_cdlss_storm *)storm_ptr;
-
-    for (int32_t i = 0; i < storm->max_trajectories; i++) {
-        free(storm->trajectories[i].logits);
+    if (!storm) {
+        return;
     }
+
     free(storm->trajectories);
+    free(storm->trajectory_logits);
     free(storm->base_logits);
     free(storm->refined_logits);
-    free(storm->softmax_buf);
-    free(storm->dcx_scores);
     free(storm->trajectory_embeddings);
+    free(storm->exp_sums);
     free(storm->consensus_embedding);
     free(storm);
 }
 
+GGML_API bool ggml_cdlss_storm_resize(ggml_cdlss_storm_t storm_ptr, int32_t num_trajectories) {
+    struct ggml_cdlss_storm * storm = (struct ggml_cdlss_storm *)storm_ptr;
+
+    if (num_trajectories < 1) {
+        return false;
+    }
+
+    if (num_trajectories > storm->max_trajectories) {
+        // Grow only; the old contents are scratch, so fresh buffers instead of realloc copies
+        const size_t slab_size = (size_t)num_trajectories * storm->vocab_size * sizeof(float);
+
+        struct ggml_cdlss_trajectory * trajectories = calloc(num_trajectories, sizeof(struct ggml_cdlss_trajectory));
+        float * trajectory_logits = malloc(slab_size);
+        float * trajectory_embeddings = malloc(slab_size);
+        float * exp_sums = malloc(num_trajectories * sizeof(float));
+
+        if (!trajectories || !trajectory_logits || !trajectory_embeddings || !exp_sums) {
+            free(trajectories);
+            free(trajectory_logits);
+            free(trajectory_embeddings);
+            free(exp_sums);
+            return false;
+        }
+
+        free(storm->trajectories);
+        free(storm->trajectory_logits);
+        free(storm->trajectory_embeddings);
+        free(storm->exp_sums);
+
+        storm->trajectories = trajectories;
+        storm->trajectory_logits = trajectory_logits;
+        storm->trajectory_embeddings = trajectory_embeddings;
+        storm->exp_sums = exp_sums;
+        storm->max_trajectories = num_trajectories;
+
+        for (int32_t t = 0; t < num_trajectories; t++) {
+            storm->trajectories[t].logits = storm->trajectory_logits + (size_t)t * storm->vocab_size;
+        }
+    }
+
+    storm->n_active = num_trajectories;
+    storm->result.n_trajectories_generated = num_trajectories;
+
+    return true;
+}
+
 GGML_API void ggml_cdlss_storm_generate(ggml_cdlss_storm_t storm_ptr,
                                         const float * base_logits,
                                         struct ggml_cdlss_params params) {
@@ -253,33 +426,32 @@ GGML_API void ggml_cdlss_storm_generate(ggml_cdlss_storm_t storm_ptr,
     // Store base logits
     memcpy(storm->base_logits, base_logits, storm->vocab_size * sizeof(float));
 
-    // Update trajectory count if needed
-    if (params.num_trajectories != storm->max_trajectories) {
-        // For now, just cap at current max
-        params.num_trajectories = (params.num_trajectories < storm->max_trajectories)
-            ? params.num_trajectories : storm->max_trajectories;
+    // Size the storm for this call; buffers are only reallocated when it outgrows them
+    if (!ggml_cdlss_storm_resize(storm, params.num_trajectories)) {
+        params.num_trajectories = storm->n_active;
     }
 
-    // Generate hallucination storm
-    srand(time(NULL));  // Seed RNG
-    for (int32_t t = 0; t < params.num_trajectories; t++) {
-        generate_trajectory(storm, storm->trajectories[t].logits, params.temperature);
-    }
+    // Every trajectory is base + noise with noise <= CDLSS_NOISE_MAX * 0.1 * temperature
+    const float max_logit = cdlss_max(storm->base_logits, storm->vocab_size) + CDLSS_NOISE_MAX * 0.1f * params.temperature;
 
-    // Compute embeddings for all trajectories
+    // Generate hallucination storm, embedding each trajectory while its logits are still in cache
     for (int32_t t = 0; t < params.num_trajectories; t++) {
-        logits_to_embedding(storm->trajectories[t].logits,
-                           storm->trajectory_embeddings + t * storm->vocab_size,
-                           storm->vocab_size,
-                           params.temperature);
+        storm->trajectories[t].cluster_id = 0;
+        generate_trajectory(storm, storm->trajectories[t].logits, params.temperature,
+                            cdlss_next_u64(&storm->rng_state));
+        storm->exp_sums[t] = logits_to_embedding(storm->trajectories[t].logits,
+                                                 storm->trajectory_embeddings + (size_t)t * storm->vocab_size,
+                                                 storm->vocab_size,
+                                                 params.temperature,
+                                                 max_logit);
     }
 
     // Compute consensus embedding
-    compute_consensus(storm, storm->consensus_embedding, params.temperature);
+    compute_consensus(storm, storm->consensus_embedding, params.num_trajectories);
 
     // Score each trajectory with DCX
     for (int32_t t = 0; t < params.num_trajectories; t++) {
-        float * traj_emb = storm->trajectory_embeddings + t * storm->vocab_size;
+        float * traj_emb = storm->trajectory_embeddings + (size_t)t * storm->vocab_size;
         storm->trajectories[t].dcx_score = compute_dcx_score(
             traj_emb,
             storm->consensus_embedding,
@@ -291,6 +463,11 @@ GGML_API void ggml_cdlss_storm_generate(ggml_cdlss_storm_t storm_ptr,
     }
 }
 
+GGML_API void ggml_cdlss_storm_set_seed(ggml_cdlss_storm_t storm_ptr, uint64_t seed) {
+    struct ggml_cdlss_storm * storm = (struct ggml_cdlss_storm *)storm_ptr;
+    storm->rng_state = seed;
+}
+
 GGML_API void ggml_cdlss_storm_collapse(ggml_cdlss_storm_t storm_ptr) {
     struct ggml_cdlss_storm * storm = (struct ggml_cdlss_storm *)storm_ptr;
 
@@ -307,7 +484,7 @@ GGML_API float * ggml_cdlss_storm_get_refined_logits(ggml_cdlss_storm_t storm_pt
 GGML_API struct ggml_cdlss_trajectory * ggml_cdlss_storm_get_trajectories(ggml_cdlss_storm_t storm_ptr,
                                                                           int32_t * out_count) {
     struct ggml_cdlss_storm * storm = (struct ggml_cdlss_storm *)storm_ptr;
-    if (out_count) *out_count = storm->max_trajectories;
+    if (out_count) *out_count = storm->n_active;
     return storm->trajectories;
 }
 
@@ -329,14 +506,14 @@ GGML_API void ggml_cdlss_assign_clusters(ggml_cdlss_storm_t storm_ptr, int32_t n
     // Simple k-means-like clustering based on DCX scores
     // Group trajectories into num_clusters based on DCX score ranges
     float min_dcx = 1e10f, max_dcx = -1e10f;
-    for (int32_t t = 0; t < storm->max_trajectories; t++) {
+    for (int32_t t = 0; t < storm->n_active; t++) {
         float dcx = storm->trajectories[t].dcx_score;
         if (dcx < min_dcx) min_dcx = dcx;
         if (dcx > max_dcx) max_dcx = dcx;
     }
 
     float dcx_range = max_dcx - min_dcx + 1e-10f;
-    for (int32_t t = 0; t < storm->max_trajectories; t++) {
+    for (int32_t t = 0; t < storm->n_active; t++) {
         float normalized_dcx = (storm->trajectories[t].dcx_score - min_dcx) / dcx_range;
         storm->trajectories[t].cluster_id = (int32_t)(normalized_dcx * (num_clusters - 1));
     }
@@ -0,0 +1,188 @@
+// Benchmark CDLSS storm generation (trajectories/sec on CPU) and check the DCX scores
+// against a straightforward libm implementation. Also compares one storm reused across
+// steps of varying size against a new storm per step (the old per-token pattern).
+//
+// usage: test-cdlss-perf [vocab_size] [iterations]
+
+#include "ggml.h"
+#include "ggml-cdlss.h"
+
+#undef NDEBUG
+#include <assert.h>
+#include <math.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#define TEMPERATURE 0.8f
+#define DCX_LAMBDA 0.015f
+
+static void fill_logits(float * logits, int32_t vocab_size) {
+    // GPT-2-like spread: most logits far below a handful of likely tokens
+    srand(42);
+    for (int32_t i = 0; i < vocab_size; i++) {
+        logits[i] = -10.0f + 12.0f * (float)rand() / (float)RAND_MAX;
+    }
+    for (int32_t i = 0; i < 8; i++) {
+        logits[rand() % vocab_size] = 8.0f + i;
+    }
+}
+
+// reference DCX of every trajectory, from the trajectories' own logits
+static float max_dcx_error(ggml_cdlss_storm_t storm, int32_t vocab_size, int32_t n) {
+    int32_t count = 0;
+    struct ggml_cdlss_trajectory * trajs = ggml_cdlss_storm_get_trajectories(storm, &count);
+    assert(count >= n);
+
+    float  * emb       = malloc((size_t)n * vocab_size * sizeof(float));
+    double * consensus = calloc(vocab_size, sizeof(double));
+
+    for (int32_t t = 0; t < n; t++) {
+        const float * logits = trajs[t].logits;
+        float max_logit = logits[0];
+        for (int32_t i = 1; i < vocab_size; i++) {
+            max_logit = fmaxf(max_logit, logits[i]);
+        }
+        double sum = 0.0;
+        for (int32_t i = 0; i < vocab_size; i++) {
+            const double e = exp((logits[i] - max_logit) / TEMPERATURE);
+            emb[(size_t)t * vocab_size + i] = (float)e;
+            consensus[i] += e / n;
+            sum += e;
+        }
+        for (int32_t i = 0; i < vocab_size; i++) {
+            emb[(size_t)t * vocab_size + i] /= (float)sum;
+        }
+    }
+
+    float max_err = 0.0f;
+    for (int32_t t = 0; t < n; t++) {
+        double dot = 0.0, na = 0.0, nb = 0.0;
+        for (int32_t i = 0; i < vocab_size; i++) {
+            const double a = emb[(size_t)t * vocab_size + i];
+            dot += a * consensus[i];
+            na  += a * a;
+            nb  += consensus[i] * consensus[i];
+        }
+        const double sim   = dot / (sqrt(na) * sqrt(nb));
+        const double decay = exp(-DCX_LAMBDA * fabs((double)t - n / 2.0) / n);
+        const float  dcx   = (float)((1.0 - fabs(sim)) * decay);
+        max_err = fmaxf(max_err, fabsf(dcx - trajs[t].dcx_score));
+    }
+
+    free(emb);
+    free(consensus);
+    return max_err;
+}
+
+int main(int argc, char ** argv) {
+    const int32_t vocab_size = argc > 1 ? atoi(argv[1]) : 50257;
+    const int     iterations = argc > 2 ? atoi(argv[2]) : 10;
+
+    const int32_t storm_sizes[] = { 1, 10, 100 };
+
+    ggml_time_init();
+
+    float * base_logits = malloc(vocab_size * sizeof(float));
+    fill_logits(base_logits, vocab_size);
+
+    printf("vocab size %d, temperature %.2f, %d iterations\n", vocab_size, TEMPERATURE, iterations);
+
+    for (size_t s = 0; s < sizeof(storm_sizes)/sizeof(storm_sizes[0]); s++) {
+        const int32_t n = storm_sizes[s];
+
+        ggml_cdlss_storm_t storm = ggml_cdlss_storm_new(vocab_size, n);
+        ggml_cdlss_storm_set_seed(storm, 1234);
+
+        struct ggml_cdlss_params params = {
+            /*.num_trajectories      =*/ n,
+            /*.temperature           =*/ TEMPERATURE,
+            /*.dcx_threshold         =*/ 0.85f,
+            /*.temporal_decay_lambda =*/ DCX_LAMBDA,
+            /*.cache_aware           =*/ false,
+        };
+
+        // warmup + correctness
+        ggml_cdlss_storm_generate(storm, base_logits, params);
+        ggml_cdlss_storm_collapse(storm);
+        const float err = max_dcx_error(storm, vocab_size, n);
+
+        int64_t t_generate_us = 0;
+        int64_t t_collapse_us = 0;
+        for (int it = 0; it < iterations; it++) {
+            const int64_t t0 = ggml_time_us();
+            ggml_cdlss_storm_generate(storm, base_logits, params);
+            const int64_t t1 = ggml_time_us();
+            ggml_cdlss_storm_collapse(storm);
+            const int64_t t2 = ggml_time_us();
+
+            t_generate_us += t1 - t0;
+            t_collapse_us += t2 - t1;
+        }
+
+        const float * refined = ggml_cdlss_storm_get_refined_logits(storm);
+        for (int32_t i = 0; i < vocab_size; i++) {
+            assert(isfinite(refined[i]));
+        }
+
+        const double step_ms = (t_generate_us + t_collapse_us) / 1000.0 / iterations;
+        printf("  %4d trajectories: generate %8.3f ms, collapse %7.3f ms, %9.1f trajectories/s, max |DCX - ref| = %.2e\n",
+               n, t_generate_us / 1000.0 / iterations, t_collapse_us / 1000.0 / iterations,
+               n * 1000.0 / step_ms, err);
+
+        assert(err < 1e-4f);
+
+        ggml_cdlss_storm_free(storm);
+    }
+
+    // arena reuse: the trajectory count changes from step to step
+    {
+        const int     n_sizes = (int) (sizeof(storm_sizes)/sizeof(storm_sizes[0]));
+        const int32_t max_n   = storm_sizes[n_sizes - 1];
+
+        struct ggml_cdlss_params params = {
+            /*.num_trajectories      =*/ 1,
+            /*.temperature           =*/ TEMPERATURE,
+            /*.dcx_threshold         =*/ 0.85f,
+            /*.temporal_decay_lambda =*/ DCX_LAMBDA,
+            /*.cache_aware           =*/ false,
+        };
+
+        int64_t t_reuse_us = 0;
+        int64_t t_fresh_us = 0;
+
+        ggml_cdlss_storm_t arena = ggml_cdlss_storm_new(vocab_size, 1);
+        for (int it = 0; it < iterations; it++) {
+            for (int s = 0; s < n_sizes; s++) {
+                // alternate between growing and shrinking
+                const int32_t n = storm_sizes[it % 2 ? n_sizes - 1 - s : s];
+                params.num_trajectories = n;
+
+                int64_t t0 = ggml_time_us();
+                ggml_cdlss_storm_generate(arena, base_logits, params);
+                ggml_cdlss_storm_collapse(arena);
+                t_reuse_us += ggml_time_us() - t0;
+
+                // only the active trajectories are reported and scored
+                int32_t count = 0;
+                ggml_cdlss_storm_get_trajectories(arena, &count);
+                assert(count == n);
+                assert(ggml_cdlss_storm_get_result(arena)->n_trajectories_pruned <= n);
+
+                t0 = ggml_time_us();
+                ggml_cdlss_storm_t fresh = ggml_cdlss_storm_new(vocab_size, n);
+                ggml_cdlss_storm_generate(fresh, base_logits, params);
+                ggml_cdlss_storm_collapse(fresh);
+                ggml_cdlss_storm_free(fresh);
+                t_fresh_us += ggml_time_us() - t0;
+            }
+        }
+        ggml_cdlss_storm_free(arena);
+
+        printf("  varying 1..%d trajectories: reused storm %8.3f ms/step, new storm per step %8.3f ms/step\n",
+               max_n, t_reuse_us / 1000.0 / (iterations * n_sizes), t_fresh_us / 1000.0 / (iterations * n_sizes));
+    }
+
+    free(base_logits);
+
+    return 0;
+}
@@ -7,10 +7,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 import umap
 from sentence_transformers import SentenceTransformer
-import ollama
+
+try:
+    from research.embedding_cache import encode_cached, get_shared_cache
+    from research.engine_protocol import get_engine
+except ImportError:  # Run directly from the research folder
+    from embedding_cache import encode_cached, get_shared_cache
+    from engine_protocol import get_engine
 
 MODEL_NAME = "qwen3-coder:480b-cloud"
 EMBED_MODEL = "all-MiniLM-L6-v2"
+USE_GENERATION_CACHE = True  # Seeded trajectories replay from research.generation_cache
 SEED_1 = 42
 SEED_2 = 1337
 
@@ -42,16 +49,17 @@ def run_ollama_storm(prompts, num_trajectories, seed):
             traj_seed = seed + i + (prompt_idx * 100)
             
             try:
-                response = ollama.generate(
-                    model=MODEL_NAME, 
-                    prompt=prompt,
+                response = get_engine("ollama").generate_response(
+                    prompt,
+                    model=MODEL_NAME,
                     options={
                         "seed": traj_seed,
                         "temperature": 0.8,
                         "top_k": 50,
                         "top_p": 0.95,
                         "num_predict": 50
-                    }
+                    },
+                    use_cache=USE_GENERATION_CACHE
                 )
                 
                 gen_text = response.get('response', '')
@@ -87,8 +95,10 @@ def map_and_plot_side_by_side(texts1, labels1, texts2, labels2, embedder):
     unique2 = list(set(texts2))
     
     print("\n--- Embedding Unique Trajectories (SentenceTransformers) ---")
-    emb1_unique = embedder.encode(unique1, convert_to_numpy=True)
-    emb2_unique = embedder.encode(unique2, convert_to_numpy=True)
+    emb1_unique = encode_cached(embedder, unique1, EMBED_MODEL)
+    emb2_unique = encode_cached(embedder, unique2, EMBED_MODEL)
+    stats = get_shared_cache().stats()
+    print(f"Embedding cache: {stats['hits']} hits / {stats['misses']} misses")
     
     print("--- Projecting mathematically perfectly without jitter ---")
     n_neigh1 = min(15, len(unique1) - 1) if len(unique1) > 2 else 2
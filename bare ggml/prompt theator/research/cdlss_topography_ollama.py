@@ -7,9 +7,16 @@ import numpy as np
 import matplotlib.pyplot as plt
 import umap
 from sentence_transformers import SentenceTransformer
-import ollama
+
+try:
+    from research.embedding_cache import encode_cached, get_shared_cache
+    from research.engine_protocol import get_engine
+except ImportError:  # Run directly from the research folder
+    from embedding_cache import encode_cached, get_shared_cache
+    from engine_protocol import get_engine
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
+USE_GENERATION_CACHE = True  # Seeded trajectories replay from research.generation_cache
 SEED_BASE = 42
 
 PROMPTS = [
@@ -55,9 +62,9 @@ def run_ollama_storm(model_name, prompts, num_trajectories, seed, log_callback=N
             traj_seed = seed + i + (prompt_idx * 1000)
             
             try:
-                response = ollama.generate(
-                    model=model_name, 
-                    prompt=prompt,
+                response = get_engine("ollama").generate_response(
+                    prompt,
+                    model=model_name,
                     options={
                         "seed": traj_seed,
                         "temperature": 0.8,
@@ -65,7 +72,8 @@ def run_ollama_storm(model_name, prompts, num_trajectories, seed, log_callback=N
                         "top_p": 0.95,
                         "num_predict": 50,
                         "num_thread": num_thread
-                    }
+                    },
+                    use_cache=USE_GENERATION_CACHE
                 )
                 
                 gen_text = response.get('response', '')
@@ -108,7 +116,9 @@ def map_and_plot(model_name, texts, labels, embedder, save_dir, show_plot=True):
         return None
 
     print("\n--- Embedding Unique Trajectories ---")
-    unique_embeddings = embedder.encode(unique_texts, convert_to_numpy=True)
+    unique_embeddings = encode_cached(embedder, unique_texts, EMBED_MODEL)
+    stats = get_shared_cache().stats()
+    print(f"Embedding cache: {stats['hits']} hits / {stats['misses']} misses")
     
     print("--- Projecting mathematically perfectly without jitter ---")
     n_neigh = min(15, len(unique_texts) - 1) if len(unique_texts) > 2 else 2
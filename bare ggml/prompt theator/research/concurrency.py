@@ -0,0 +1,226 @@
+import math
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key, max_limit=16):
+    """
+    Shared limiter per (engine, server, model) key, so later storms start from the
+    concurrency the previous ones converged on. max_limit is refreshed on every call.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(max_limit=max_limit)
+            _limiters[key] = limiter
+        limiter.max_limit = max(1, int(max_limit))
+        return limiter
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for trajectory requests.
+    Each finished request reports its latency and the work it produced (e.g. output
+    characters); seconds-per-unit-of-work compared against the best recent value is
+    the congestion signal, because a server that is out of parallel slots queues
+    requests and the per-unit latency jumps instead of throughput rising.
+      - slow start: +1 per uncongested sample until the first congestion event
+      - then additive increase: +1/limit per uncongested sample while the limit is in use
+      - multiplicative decrease: x decrease_factor on congestion, x0.5 on failures,
+        at most once per `limit` completions so one burst is not punished repeatedly
+    Usable from threads (acquire/release or slot()) and from asyncio (acquire_async).
+    """
+    def __init__(self, initial_limit=1, min_limit=1, max_limit=16, tolerance=2.0,
+                 decrease_factor=0.75, window=64):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._slow_start = True
+        self._since_decrease = 0
+        self._rates = deque(maxlen=window)           # Seconds per unit of work
+        self._completions = deque(maxlen=window)     # Completion timestamps
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self.peak_limit = float(initial_limit)
+        self.samples = 0
+
+    @property
+    def limit(self):
+        return max(self.min_limit, min(self.max_limit, int(self._limit)))
+
+    def _try_acquire(self):
+        if self._in_flight < self.limit:
+            self._in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._cond:
+            while not self._try_acquire():
+                self._cond.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return
+                fut = loop.create_future()
+                self._async_waiters.append((loop, fut))
+            await fut
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def release(self, latency=None, work=1, ok=True):
+        """Returns a slot; latency (seconds) and work feed the controller unless None."""
+        with self._cond:
+            self._in_flight -= 1
+            if latency is not None:
+                self._update(latency, work, ok)
+            self._wake()
+
+    def _update(self, latency, work, ok):
+        self.samples += 1
+        self._since_decrease += 1
+        now = time.perf_counter()
+        self._completions.append(now)
+        can_decrease = self._since_decrease >= self.limit
+        if not ok:
+            if can_decrease:
+                self._decrease(0.5)
+            return
+        rate = latency / max(1, work)
+        self._rates.append(rate)
+        congested = len(self._rates) > 1 and rate > min(self._rates) * self.tolerance
+        if congested:
+            if can_decrease:
+                self._decrease(self.decrease_factor)
+        elif self._slow_start:
+            self._limit += 1
+        elif self._in_flight + 1 >= self.limit:
+            self._limit += 1.0 / self._limit  # Only grow while the current limit is actually used
+        self._limit = min(self._limit, float(self.max_limit))
+        self.peak_limit = max(self.peak_limit, self._limit)
+
+    def _decrease(self, factor):
+        self._slow_start = False
+        self._since_decrease = 0
+        self._limit = max(float(self.min_limit), self._limit * factor)
+
+    def slot(self):
+        """
+        Context manager: `with limiter.slot() as s: ...; s.work = len(text)`.
+        Set s.ok = False for failed requests, s.record = False for skipped ones.
+        """
+        return _Slot(self)
+
+    def throughput(self):
+        """Completions per second over the recent window."""
+        with self._cond:
+            if len(self._completions) < 2:
+                return 0.0
+            span = self._completions[-1] - self._completions[0]
+            return (len(self._completions) - 1) / span if span > 0 else 0.0
+
+    def describe(self):
+        return f"limit={self.limit} (peak {int(self.peak_limit)}, cap {self.max_limit}), {self.throughput():.2f} traj/s"
+
+
+class _Slot:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.work = 1
+        self.ok = True
+        self.record = True
+
+    def __enter__(self):
+        self.limiter.acquire()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.record:
+            self.limiter.release()
+            return
+        ok = self.ok and exc_type is None
+        self.limiter.release(time.perf_counter() - self._started, self.work, ok)
+
+
+class Hedger:
+    """
+    Straggler hedging policy and statistics for one storm.
+    Once after_fraction of the n trajectories have completed, any trajectory running
+    longer than slack x the given percentile of completed latencies gets one duplicate
+    with a fresh seed; whichever finishes first wins and the other is cancelled. At most
+    max_fraction * n (at least 1) duplicates are launched per storm. The slack keeps the
+    budget from going to ordinary trajectories that are only just past the percentile.
+    """
+    def __init__(self, after_fraction=0.75, percentile=0.9, slack=1.5, max_fraction=0.2, check_interval=0.05):
+        self.after_fraction = after_fraction
+        self.percentile = percentile
+        self.slack = slack
+        self.max_fraction = max_fraction
+        self.check_interval = check_interval
+        self._latencies = []
+        self._rng = random.Random()
+        self.launched = 0
+        self.hedge_wins = 0         # The duplicate finished first
+        self.primary_wins = 0       # The original finished first after all
+        self.threshold = None       # Latency (s) that last triggered a hedge
+
+    def record(self, latency):
+        """Latency of a completed (winning) trajectory."""
+        self._latencies.append(latency)
+
+    def active(self, completed, n):
+        return n > 1 and completed >= max(1, math.ceil(self.after_fraction * n))
+
+    def cutoff(self):
+        """Straggler threshold: slack x the percentile of completed latencies."""
+        q = _quantile(self._latencies, self.percentile)
+        return None if q is None else q * self.slack
+
+    def can_hedge(self, n):
+        return self.launched < max(1, int(self.max_fraction * n))
+
+    def hedge_options(self, options):
+        """Copy of options with a fresh seed, so the duplicate is a new sample rather than a replay."""
+        opts = dict(options or {})
+        opts["seed"] = self._rng.randrange(2**31)
+        return opts
+
+    def as_dict(self):
+        return {
+            "launched": self.launched,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "threshold_s": self.threshold,
+            "p50_s": _quantile(self._latencies, 0.5),
+            "p99_s": _quantile(self._latencies, 0.99),
+        }
+
+    def describe(self):
+        if not self.launched:
+            return "no hedges"
+        return (f"{self.launched} hedged past {self.threshold:.2f}s, "
+                f"{self.hedge_wins} won by the duplicate, {self.primary_wins} by the original")
+
+
+def _quantile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
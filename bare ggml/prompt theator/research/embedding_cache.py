@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embed_cache")
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Process-wide cache used by StormLogic, the engines and the topography scripts."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def encode_cached(embedder, texts, embed_model, digest="sentence-transformers", cache=None):
+    """
+    SentenceTransformer encode through an embedding cache (the shared one by default);
+    only texts not seen before hit the model. Returns an (n, d) float32 matrix.
+    """
+    cache = cache or get_shared_cache()
+    vecs = cache.get_or_compute(
+        embed_model, digest, texts,
+        lambda missing: embedder.encode(missing, convert_to_numpy=True)
+    )
+    return np.vstack(vecs)
+
+
+class _DiskShard:
+    """
+    One (embed model, digest) pair on disk.
+    Vectors live in an append-only float32 matrix (<name>.f32, read via np.memmap)
+    and rows are located through an append-only NDJSON key index (<name>.idx.ndjson).
+    """
+    def __init__(self, base_path):
+        self.vec_path = base_path + ".f32"
+        self.idx_path = base_path + ".idx.ndjson"
+        self.dim = None
+        self.index = {}
+        self.rows = 0
+        self._mm = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.idx_path):
+            return
+        with open(self.idx_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write from a crash
+                if "dim" in rec:
+                    self.dim = int(rec["dim"])
+                elif "k" in rec:
+                    self.index[rec["k"]] = int(rec["r"])
+        if self.dim and os.path.exists(self.vec_path):
+            size = os.path.getsize(self.vec_path)
+            self.rows = size // (4 * self.dim)
+            if size != self.rows * 4 * self.dim:
+                # Torn trailing vector: cut it off so the next append starts on a row boundary
+                with open(self.vec_path, "r+b") as f:
+                    f.truncate(self.rows * 4 * self.dim)
+        # Drop index entries whose vector never fully hit the disk
+        self.index = {k: r for k, r in self.index.items() if r < self.rows}
+
+    def get(self, key):
+        row = self.index.get(key)
+        if row is None:
+            return None
+        if self._mm is None or self._mm.shape[0] <= row:
+            self._mm = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        return np.array(self._mm[row])
+
+    def put(self, key, vec):
+        if key in self.index:
+            return
+        if self.dim is None:
+            self.dim = int(vec.shape[0])
+            os.makedirs(os.path.dirname(self.idx_path), exist_ok=True)
+            with open(self.idx_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"dim": self.dim}) + "\n")
+        if vec.shape[0] != self.dim:
+            return
+        # Vector first, then index line: a crash in between only loses the entry
+        with open(self.vec_path, "ab") as f:
+            f.write(np.ascontiguousarray(vec, dtype=np.float32).tobytes())
+        row = self.rows
+        self.rows += 1
+        with open(self.idx_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"k": key, "r": row}) + "\n")
+        self.index[key] = row
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (embed model, model digest, sha256 of text).
+    Tier 1: bounded in-memory LRU.
+    Tier 2: persistent on-disk shards (memory-mapped float32 matrix + key index).
+    Thread-safe within a process; the disk tier is not meant to be shared by concurrent processes.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=8192, persist=True):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.persist = persist and bool(cache_dir)
+        self._lru = OrderedDict()
+        self._shards = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def _shard(self, embed_model, digest):
+        name = re.sub(r"[^a-zA-Z0-9._-]+", "_", f"{embed_model}_{(digest or 'nodigest')[:16]}")
+        shard = self._shards.get(name)
+        if shard is None:
+            shard = _DiskShard(os.path.join(self.cache_dir, name))
+            self._shards[name] = shard
+        return shard
+
+    def _remember(self, key, vec):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_items:
+            self._lru.popitem(last=False)
+
+    def get(self, embed_model, digest, text):
+        sha = text_sha256(text)
+        key = (embed_model, digest or "", sha)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return vec
+            if self.persist:
+                vec = self._shard(embed_model, digest).get(sha)
+                if vec is not None:
+                    self._remember(key, vec)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vec
+            self.misses += 1
+            return None
+
+    def put(self, embed_model, digest, text, vec):
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        sha = text_sha256(text)
+        with self._lock:
+            self._remember((embed_model, digest or "", sha), vec)
+            if self.persist:
+                try:
+                    self._shard(embed_model, digest).put(sha, vec)
+                except OSError as e:
+                    print(f"[embed-cache] Disk tier disabled: {e}")
+                    self.persist = False
+
+    def get_or_compute(self, embed_model, digest, texts, compute_fn):
+        """
+        Returns one float32 vector per text, calling compute_fn(missing_texts) only
+        for cache misses (each distinct text once). Returns None if compute_fn fails.
+        """
+        texts = list(texts)
+        out = [self.get(embed_model, digest, t) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, out) if v is None))
+        if missing:
+            fresh = compute_fn(missing)
+            if fresh is None or len(fresh) != len(missing):
+                return None
+            by_text = {}
+            for t, v in zip(missing, fresh):
+                v = np.asarray(v, dtype=np.float32).reshape(-1)
+                self.put(embed_model, digest, t, v)
+                by_text[t] = v
+            out = [v if v is not None else by_text[t] for t, v in zip(texts, out)]
+        return out
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "memory_items": len(self._lru),
+                "disk_items": sum(len(s.index) for s in self._shards.values()),
+            }
@@ -1,10 +1,16 @@
 import os
 from research.ggml_bridge import GGMLBridge
+from research.engine_protocol import Engine, EngineCapabilities
 
-class GGMLEngineV1:
+class GGMLEngineV1(Engine):
     """
     Engine mimicking SimpleEngineV1 but routes to the C-level GGML CDLSS implementation.
     """
+    name = "ggml"
+    # Each cdlss_engine context keeps the K/V of its last prompt; the next call on that context reuses the
+    # shared prefix. Concurrent calls run on separate contexts and do not share it (see prefill)
+    capabilities = EngineCapabilities(seeded=True, streaming=True, cancellable=True, prefix_cache=True)
+
     def __init__(self):
         self.bridge = GGMLBridge()
         self.current_model = "gpt-2-117M/ggml-model.bin"  # Default generic model path
@@ -27,30 +33,59 @@ class GGMLEngineV1:
             models = ["gpt-2-117M/ggml-model.bin (Mock)", "llama-2-7b.gguf (Mock)"]
         return models
 
+    def _model_path(self, model_name):
+        # If it's a mock, just pass the name
+        if "Mock" in model_name:
+            return "mock_path"
+        return os.path.join(self.models_dir, model_name)
+
+    def prefill(self, prompt, model=None, num_thread=4, **options):
+        """
+        Evaluates the prompt once (one sampled token): loads the weights and leaves the
+        prompt's K/V in one idle context. Only a call that borrows that context skips
+        the prefix, so this helps sequential calls (and the first concurrent one).
+        Concurrent storm workers beyond it get their own contexts (cdlss_context_new)
+        and each evaluates the prefix again: the C API cannot copy K/V between
+        contexts, so warming every context would cost exactly what the paths pay.
+        """
+        if not self.bridge.lib:
+            return False  # Mock results have no KV state
+        res = self.bridge.generate(
+            self._model_path(model or self.current_model),
+            prompt,
+            num_trajectories=1,
+            n_predict=1,
+            n_threads=num_thread
+        )
+        return not res.startswith("ERROR in GGML C-Call")
+
     def get_embedding(self, text, embed_model="nomic-embed-text"):
         # For simplicity, returning None forces the UI to use hash-based embeddings.
         # Alternatively, we could hook into a ggml embedding model here.
         return None
 
-    def generate(self, prompt, temperature=0.7, num_predict=256, num_thread=4, cdlss_trajectories=10, cdlss_dcx=0.85):
+    def get_embeddings(self, texts, embed_model="nomic-embed-text", batch_size=32):
+        return None
+
+    def generate(self, prompt, model=None, temperature=0.7, num_predict=256, num_thread=4, cdlss_trajectories=10,
+                 cdlss_dcx=0.85, seed=None, on_token=None, cancel=None):
         """
-        In the real system, parameters like trajectories and dcx should be passed dynamically.
-        For now, we pass them down via the bridge.
+        Continuation of prompt. The model is loaded once per path and kept by the bridge,
+        so repeated storm paths only pay for evaluating their prompt and tokens.
+        Thread-safe: concurrent calls run in parallel on separate bridge contexts.
+        on_token(text) streams tokens as they are sampled; setting cancel (a
+        threading.Event or ggml_bridge.CancelFlag) stops within one token and returns
+        the partial text (see GGMLBridge.generate).
         """
-        model_path = os.path.join(self.models_dir, self.current_model)
-        
-        # If it's a mock, just pass the name
-        if "Mock" in self.current_model:
-            model_path = "mock_path"
-
-        # Note: cdlss_trajectories and dcx could be added to kwargs or class state 
-        # based on how UI passes them. For now we use the bridge defaults or kwargs if provided.
-        res = self.bridge.run_inference(
-            model_path=model_path,
-            prompt=prompt,
+        return self.bridge.generate(
+            self._model_path(model or self.current_model),
+            prompt,
             num_trajectories=cdlss_trajectories,
             dcx_threshold=cdlss_dcx,
             temp=temperature,
-            n_predict=num_predict
+            n_predict=num_predict,
+            n_threads=num_thread,
+            seed=seed,
+            on_token=on_token,
+            cancel=cancel
         )
-        return res
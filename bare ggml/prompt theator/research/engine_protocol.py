@@ -0,0 +1,193 @@
+import os
+import threading
+import importlib
+import urllib.parse
+from dataclasses import dataclass
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+
+def ollama_base_url(default=DEFAULT_OLLAMA_URL):
+    """
+    Ollama server URL from OLLAMA_HOST (as the ollama package and CLI read it:
+    "host", "host:port" or a full URL), else default.
+    """
+    host = os.environ.get("OLLAMA_HOST", "").strip()
+    if not host:
+        return default
+    if "://" not in host:
+        host = "http://" + host
+    parts = urllib.parse.urlsplit(host)
+    port = parts.port or (443 if parts.scheme == "https" else 11434)
+    return f"{parts.scheme}://{parts.hostname or 'localhost'}:{port}{parts.path.rstrip('/')}"
+
+
+@dataclass(frozen=True)
+class EngineCapabilities:
+    """What an engine can do beyond plain generate(); callers branch on these, never on class names."""
+    embed: bool = False          # get_embedding()/get_embeddings() return model vectors (else None)
+    batch_embed: bool = False    # get_embeddings() embeds many texts per request
+    seeded: bool = False         # options["seed"] makes generation reproducible
+    streaming: bool = False      # tokens can be consumed while they are generated
+    cancellable: bool = False    # in-flight generations can be aborted
+    prefix_cache: bool = False   # a shared prompt prefix is evaluated once and reused
+
+
+NO_CAPABILITIES = EngineCapabilities()
+
+
+class Engine:
+    """
+    Common interface of every model backend (Ollama REST, Ollama async, Ollama CLI, GGML).
+    Subclasses override what they support and advertise it through `capabilities`;
+    the defaults below are the "not supported" answers StormLogic already falls back on.
+    generate()/prefill() take an explicit model; without one they use the mutable
+    `model` attribute, which concurrent callers should not rely on (see bind()).
+    """
+    name = "engine"
+    capabilities = NO_CAPABILITIES
+
+    def set_model(self, model_name):
+        self.model = model_name
+
+    def get_models(self):
+        return []
+
+    def get_model_digest(self, model_name):
+        return ""
+
+    def generate(self, prompt, model=None, **options):
+        raise NotImplementedError
+
+    def prefill(self, prompt, model=None, **options):
+        """
+        Evaluates prompt once so the N storm calls that follow reuse its KV state
+        instead of each re-reading it. Returns True if the prefix is now cached.
+        """
+        return False
+
+    def get_embedding(self, text, embed_model="nomic-embed-text"):
+        return None
+
+    def get_embeddings(self, texts, embed_model="nomic-embed-text", batch_size=32):
+        return None
+
+    def bind(self, model, max_concurrency=None):
+        """Per-stage handle with an immutable model and its own concurrency lane (see BoundEngine)."""
+        return BoundEngine(self, model, max_concurrency)
+
+
+class BoundEngine:
+    """
+    An engine with its model fixed at construction. The UI holds one per pipeline stage
+    (storm, mascot, embedding) instead of calling set_model() on a shared engine, so the
+    stages can overlap without clobbering each other's model. max_concurrency (None =
+    unlimited) bounds this handle's own lane of in-flight calls. Embedding calls that
+    name a model explicitly (StormLogic's multi-embedder channels) use that model.
+    Everything else (pool, base_url, ...) is read through from the underlying engine.
+    """
+    def __init__(self, engine, model, max_concurrency=None):
+        self._engine = engine
+        self._model = model
+        self._lane = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def engine(self):
+        return self._engine
+
+    def __getattr__(self, name):
+        return getattr(self._engine, name)
+
+    def __repr__(self):
+        return f"<{self._engine.name} bound to {self._model}>"
+
+    def _call(self, fn, *args, **kwargs):
+        if self._lane is None:
+            return fn(*args, **kwargs)
+        with self._lane:
+            return fn(*args, **kwargs)
+
+    def set_model(self, model_name):
+        raise AttributeError(f"{self!r} is immutable; bind() a new handle for {model_name}")
+
+    def bind(self, model, max_concurrency=None):
+        return BoundEngine(self._engine, model, max_concurrency)
+
+    def generate(self, prompt, **options):
+        return self._call(self._engine.generate, prompt, model=self._model, **options)
+
+    def prefill(self, prompt, **options):
+        return self._call(self._engine.prefill, prompt, model=self._model, **options)
+
+    def get_embedding(self, text, embed_model=None):
+        return self._call(self._engine.get_embedding, text, embed_model or self._model)
+
+    def get_embeddings(self, texts, embed_model=None, batch_size=32):
+        return self._call(self._engine.get_embeddings, texts, embed_model or self._model, batch_size=batch_size)
+
+
+def capabilities_of(engine):
+    """Capabilities of any engine-like object (duck-typed engines get none)."""
+    if engine is None:
+        return NO_CAPABILITIES
+    return getattr(engine, "capabilities", NO_CAPABILITIES)
+
+
+# name -> "module:Class"; imported lazily so e.g. the GGML bridge only loads when asked for
+_REGISTRY = {
+    "ollama": "research.engine_v1:SimpleEngineV1",
+    "ollama-async": "research.engine_v3:AsyncEngineV3",
+    "ollama-cli": "research.engine_v2:ThreadedEngineV2",
+    "ggml": "research.engine_ggml:GGMLEngineV1",
+}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register_engine(name, factory):
+    """Registers a factory (callable or "module:Class" path) under name."""
+    with _lock:
+        _REGISTRY[name] = factory
+
+
+def available_engines():
+    return sorted(_REGISTRY)
+
+
+def _resolve(factory):
+    if callable(factory):
+        return factory
+    module_name, _, attr = factory.partition(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:  # Run directly from the research folder
+        module = importlib.import_module(module_name.split(".", 1)[-1])
+    return getattr(module, attr)
+
+
+def create_engine(name, **kwargs):
+    """A new, unshared engine instance."""
+    try:
+        factory = _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown engine '{name}'. Available: {', '.join(available_engines())}")
+    return _resolve(factory)(**kwargs)
+
+
+def get_engine(name, **kwargs):
+    """
+    Process-wide engine instance for (name, kwargs), so the UI, StormLogic and
+    the research scripts share pools and caches instead of building their own.
+    """
+    key = (name, tuple(sorted(kwargs.items())))
+    with _lock:
+        engine = _instances.get(key)
+    if engine is None:
+        engine = create_engine(name, **kwargs)
+        with _lock:
+            engine = _instances.setdefault(key, engine)
+    return engine
@@ -1,15 +1,35 @@
 import json
-import urllib.request
 import urllib.error
+try:
+    from research.embedding_cache import get_shared_cache
+    from research.http_pool import get_pool
+    from research.engine_protocol import Engine, EngineCapabilities, ollama_base_url
+    from research.generation_cache import get_shared_generation_cache, generation_key, is_cacheable
+    from research.residency import keep_alive_for
+except ImportError:  # Run directly from the research folder
+    from embedding_cache import get_shared_cache
+    from http_pool import get_pool
+    from engine_protocol import Engine, EngineCapabilities, ollama_base_url
+    from generation_cache import get_shared_generation_cache, generation_key, is_cacheable
+    from residency import keep_alive_for
 
-class SimpleEngineV1:
+class SimpleEngineV1(Engine):
     """
     Iteration 2: REST API Wrapper.
     Focus: Near-zero overhead and model persistence via direct API calls.
     """
-    def __init__(self, base_url="http://localhost:11434"):
+    name = "ollama"
+    capabilities = EngineCapabilities(embed=True, batch_embed=True, seeded=True, prefix_cache=True)
+
+    def __init__(self, base_url=None, use_generation_cache=True):
         self.model = "qwen2.5:0.5b"
+        base_url = base_url or ollama_base_url()  # OLLAMA_HOST, like the ollama package
         self.base_url = base_url
+        self.pool = get_pool(base_url)  # Shared keep-alive connections (research.http_pool)
+        self.embed_cache = get_shared_cache()
+        # Seeded calls replay from research.generation_cache; None disables it
+        self.generation_cache = get_shared_generation_cache() if use_generation_cache else None
+        self._digests = {}
 
     def set_model(self, model_name):
         self.model = model_name
@@ -18,65 +38,179 @@ class SimpleEngineV1:
         """Query Ollama API for available models."""
         print("[v2] Querying API for models...")
         try:
-            url = f"{self.base_url}/api/tags"
-            with urllib.request.urlopen(url) as response:
-                data = json.loads(response.read().decode())
-                models = [m['name'] for m in data.get('models', [])]
-                return sorted(models)
+            data = self.pool.get_json("/api/tags")
+            models = [m['name'] for m in data.get('models', [])]
+            return sorted(models)
         except Exception as e:
             print(f"[v2] API Model scan error: {e}")
             return ["No models found / Server down"]
 
+    def get_model_digest(self, model_name):
+        """Digest of an installed model from /api/tags (cached). Empty string if unknown."""
+        if model_name in self._digests:
+            return self._digests[model_name]
+        digest = ""
+        try:
+            data = self.pool.get_json("/api/tags")
+            for m in data.get('models', []):
+                if m.get('name') in (model_name, f"{model_name}:latest"):
+                    digest = m.get('digest', "")
+                    break
+        except Exception:
+            return ""  # Don't pin an empty digest while the server is down
+        self._digests[model_name] = digest
+        return digest
+
     def get_embedding(self, text, embed_model="nomic-embed-text"):
+        """Cached single-text embedding (see research.embedding_cache)."""
+        digest = self.get_model_digest(embed_model)
+        vec = self.embed_cache.get(embed_model, digest, text)
+        if vec is not None:
+            return vec.tolist()
+        emb = self._fetch_embedding(text, embed_model)
+        if emb is not None:
+            self.embed_cache.put(embed_model, digest, text, emb)
+        return emb
+
+    def _fetch_embedding(self, text, embed_model):
         """Direct API call to /api/embeddings for true semantic vectors."""
         payload = {
             "model": embed_model,
             "prompt": text,
-            "keep_alive": "5m"
+            "keep_alive": keep_alive_for(embed_model)
         }
         try:
-            url = f"{self.base_url}/api/embeddings"
-            req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), 
-                                         headers={'Content-Type': 'application/json'})
-            with urllib.request.urlopen(req) as response:
-                res_data = json.loads(response.read().decode())
-                return res_data.get("embedding", None)
+            res_data = self.pool.post_json("/api/embeddings", payload)
+            return res_data.get("embedding", None)
         except Exception:
             return None
 
-    def generate(self, prompt, **kwargs):
+    def get_embeddings(self, texts, embed_model="nomic-embed-text", batch_size=32):
+        """
+        Batched API call to /api/embed (list input). Uncached: callers such as
+        StormLogic look up research.embedding_cache first and send only misses.
+        Returns one vector per text, or None if any batch fails.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        batch_size = max(1, int(batch_size))
+        out = []
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            payload = {
+                "model": embed_model,
+                "input": chunk,
+                "keep_alive": keep_alive_for(embed_model)
+            }
+            try:
+                res_data = self.pool.post_json("/api/embed", payload)
+                vecs = res_data.get("embeddings", None)
+                if not vecs or len(vecs) != len(chunk):
+                    return None
+            except urllib.error.HTTPError as e:
+                if e.code != 404:
+                    return None
+                # Older Ollama without /api/embed: fall back to one call per text
+                vecs = [self._fetch_embedding(t, embed_model) for t in chunk]
+                if any(v is None for v in vecs):
+                    return None
+            except Exception:
+                return None
+            out.extend(vecs)
+        return out
+
+    def _generation_key(self, model, prompt, options, use_cache):
+        """Generation-cache key for a seeded call, or None when it must hit the model."""
+        if not use_cache or self.generation_cache is None or not is_cacheable(options):
+            return None
+        return generation_key(model, self.get_model_digest(model), prompt, options)
+
+    def generate_response(self, prompt, model=None, options=None, timeout=None, use_cache=True):
+        """
+        Non-streamed /api/generate returning Ollama's full response dict
+        (response, done_reason, durations). Errors propagate as URLError/HTTPError.
+        Seeded calls are served from the generation cache when possible; a replayed
+        dict carries "cached": True and the durations of the original generation.
+        """
+        model = model or self.model
+        key = self._generation_key(model, prompt, options, use_cache)
+        if key is not None:
+            cached = self.generation_cache.get(key)
+            if cached is not None:
+                return dict(cached, cached=True)
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": keep_alive_for(model)
+        }
+        if options:
+            payload["options"] = options
+        res = self.pool.post_json("/api/generate", payload, timeout=timeout)
+        if key is not None and res.get("done"):
+            # The KV "context" token list is large and useless for replay
+            self.generation_cache.put(key, model, {k: v for k, v in res.items() if k != "context"})
+        return res
+
+    def prefill(self, prompt, model=None, **options):
+        """
+        One-token, uncached generation of the storm prompt. Ollama's runner keeps the
+        evaluated prompt in a slot's KV cache and copies the longest matching prefix
+        into the slot of every later request, so the storm's N requests only prefill
+        what differs. options should match the storm's (num_thread/num_ctx changes
+        reload the model); sampling options are irrelevant here.
+        """
+        opts = {k: v for k, v in options.items() if k != "seed"}
+        opts["num_predict"] = 1
+        try:
+            self.generate_response(prompt, model=model, options=opts, use_cache=False)
+            return True
+        except Exception as e:
+            print(f"[v2] Prefill failed: {e}")
+            return False
+
+    def generate(self, prompt, model=None, **kwargs):
         """Direct API call to /api/generate."""
         import re
         
+        model = model or self.model
+        key = self._generation_key(model, prompt, kwargs, True)
+        cached = self.generation_cache.get(key) if key is not None else None
+        if cached is not None:
+            print(f"[v2] Generation cache hit for {model} (seed {kwargs.get('seed')}).")
+            text = cached.get("response", "").strip()
+            return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+
         payload = {
-            "model": self.model,
+            "model": model,
             "prompt": prompt,
             "stream": True,  # Changed to True for live feedback
-            "keep_alive": "5m"
+            "keep_alive": keep_alive_for(model)
         }
         
         if kwargs:
             payload["options"] = kwargs
         
         import sys
-        print(f"[v2] API Generating with {self.model} (Opts: {kwargs})...")
+        print(f"[v2] API Generating with {model} (Opts: {kwargs})...")
         try:
-            url = f"{self.base_url}/api/generate"
-            req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), 
-                                         headers={'Content-Type': 'application/json'})
-            
             full_response = []
-            with urllib.request.urlopen(req) as response:
+            done = False
+            with self.pool.stream("/api/generate", payload) as response:
                 for line in response:
                     if line:
                         chunk = json.loads(line.decode('utf-8'))
                         text_chunk = chunk.get("response", "")
                         full_response.append(text_chunk)
+                        done = done or bool(chunk.get("done"))
                         # Echo to the console so the user sees live progress
                         print(text_chunk, end="", flush=True)
             print() # Clear the line after the generation finishes
             
             text = "".join(full_response).strip()
+            if key is not None and done:
+                self.generation_cache.put(key, model, {"response": "".join(full_response), "done": True})
             # Strip DeepSeek <think> tags to avoid blowing out context/DCX
             text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
             return text
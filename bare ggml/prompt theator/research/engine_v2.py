@@ -2,12 +2,18 @@ import subprocess
 import threading
 import queue
 import time
+try:
+    from research.engine_protocol import Engine
+except ImportError:  # Run directly from the research folder
+    from engine_protocol import Engine
 
-class ThreadedEngineV2:
+class ThreadedEngineV2(Engine):
     """
     Iteration 2: State-Managed Threaded Class.
     Focus: Reliability and Non-blocking (from UI perspective).
     """
+    name = "ollama-cli"
+
     def __init__(self):
         self.current_model = None
         self.is_busy = False
@@ -22,6 +28,17 @@ class ThreadedEngineV2:
             except: return []
         return ["local-cli-only"]
 
+    def set_model(self, model_name):
+        self.current_model = model_name
+
+    def get_models(self):
+        return self.list_models()
+
+    def generate(self, prompt, model=None, **options):
+        """Blocking CLI generation (options are not expressible through 'ollama run')."""
+        res = subprocess.run(["ollama", "run", model or self.current_model, prompt], capture_output=True, text=True, encoding="utf-8")
+        return res.stdout.strip() if res.returncode == 0 else f"Error: {res.stderr}"
+
     def generate_async(self, prompt, model):
         """Spawns a thread to run the generation."""
         if self.is_busy:
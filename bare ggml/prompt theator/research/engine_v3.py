@@ -1,47 +1,336 @@
 import asyncio
-import os
+import json
+import queue
+import re
+import threading
+import time
+import urllib.parse
+try:
+    from research.engine_protocol import Engine, EngineCapabilities, ollama_base_url
+    from research.residency import keep_alive_for
+except ImportError:  # Run directly from the research folder
+    from engine_protocol import Engine, EngineCapabilities, ollama_base_url
+    from residency import keep_alive_for
 
-class AsyncEngineV3:
+
+class StreamError(Exception):
+    """HTTP-level failure of one Ollama stream (bad status or malformed response)."""
+
+
+class AsyncEngineV3(Engine):
     """
     Iteration 3: Async/Event-Driven Core.
     Focus: Responsiveness and Token Streaming.
+    Speaks the Ollama streaming HTTP protocol over asyncio streams, so one event
+    loop drives hundreds of concurrent trajectory streams. Each stream is its own
+    task: cancelling it closes the socket, which makes Ollama stop generating.
+    The blocking Engine methods (get_models, generate) run a private event loop
+    and must not be called from inside a running loop.
     """
-    def __init__(self):
+    name = "ollama-async"
+    capabilities = EngineCapabilities(seeded=True, streaming=True, cancellable=True, prefix_cache=True)
+
+    def __init__(self, base_url=None, timeout=300.0):
         self.model = "qwen2.5:0.5b"
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")  # OLLAMA_HOST, like the ollama package
+        self.timeout = timeout      # Max seconds of silence per stream (first token included)
+        parts = urllib.parse.urlsplit(self.base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self.path_prefix = parts.path.rstrip("/")
 
-    async def list_models(self):
-        """Async model listing."""
-        print("[v3] Scanning models (async)...")
-        proc = await asyncio.create_subprocess_exec(
-            "ollama", "list",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+    async def _open(self, method, path, payload=None, timeout=None):
+        """Sends one request; returns (reader, writer, headers) once the status line is 200."""
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl or None), timeout or self.timeout
         )
-        stdout, _ = await proc.communicate()
-        if proc.returncode == 0:
-            return [l.split()[0] for l in stdout.decode().splitlines()[1:] if l.strip()]
-        return []
-
-    async def generate_stream(self, prompt, model=None):
-        """Streams output from the inference engine."""
-        target_model = model or self.model
-        print(f"[v3] Opening stream: {target_model}")
-        
-        # Agnostic: In Phase 2, this would be a lookup for the specific CLI pattern
-        proc = await asyncio.create_subprocess_exec(
-            "ollama", "run", target_model, prompt,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+        head = (
+            f"{method} {self.path_prefix}{path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
         )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        try:
+            status = await asyncio.wait_for(reader.readline(), timeout or self.timeout)
+            parts = status.decode("latin-1").split(" ", 2)
+            if len(parts) < 2 or not parts[1].isdigit():
+                raise StreamError(f"Malformed status line: {status!r}")
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout or self.timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if int(parts[1]) != 200:
+                raise StreamError(f"HTTP {parts[1]} from {path}")
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer, headers
+
+    @staticmethod
+    async def _read_exactly(reader, n, timeout):
+        try:
+            return await asyncio.wait_for(reader.readexactly(n), timeout)
+        except asyncio.IncompleteReadError:
+            raise StreamError("Connection closed mid-stream")
+
+    async def _iter_body(self, reader, headers, timeout):
+        """Yields raw body pieces, decoding chunked transfer encoding."""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await asyncio.wait_for(reader.readline(), timeout)
+                if not size_line:
+                    raise StreamError("Connection closed mid-stream")
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    return
+                data = await self._read_exactly(reader, size + 2, timeout)  # + CRLF
+                yield data[:-2]
+        elif "content-length" in headers:
+            yield await self._read_exactly(reader, int(headers["content-length"]), timeout)
+        else:
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), timeout)
+                if not data:
+                    return
+                yield data
+
+    async def _request_json(self, method, path, payload=None, timeout=None):
+        reader, writer, headers = await self._open(method, path, payload, timeout)
+        try:
+            body = b"".join([piece async for piece in self._iter_body(reader, headers, timeout or self.timeout)])
+            return json.loads(body.decode("utf-8"))
+        finally:
+            writer.close()
+
+    async def list_models(self):
+        """Async model listing via /api/tags."""
+        print("[v3] Scanning models (async)...")
+        try:
+            data = await self._request_json("GET", "/api/tags", timeout=30)
+            return sorted(m["name"] for m in data.get("models", []))
+        except Exception as e:
+            print(f"[v3] API Model scan error: {e}")
+            return []
+
+    async def generate_stream(self, prompt, model=None, options=None, timeout=None):
+        """
+        Streams response tokens from /api/generate as they arrive.
+        options is the Ollama options dict (seed, temperature, num_predict, ...).
+        Raises asyncio.TimeoutError if the server is silent for longer than timeout.
+        """
+        model = model or self.model
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": keep_alive_for(model)
+        }
+        if options:
+            payload["options"] = options
+        timeout = timeout or self.timeout
+        reader, writer, headers = await self._open("POST", "/api/generate", payload, timeout)
+        try:
+            pending = b""
+            async for piece in self._iter_body(reader, headers, timeout):
+                pending += piece
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line.decode("utf-8"))
+                    if "error" in chunk:
+                        raise StreamError(chunk["error"])
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        return
+        finally:
+            writer.close()  # Also runs on cancellation: closing the socket aborts generation server-side
+
+    async def agenerate(self, prompt, model=None, options=None, timeout=None):
+        """Full (non-streamed) text of one trajectory, <think> blocks stripped."""
+        tokens = [t async for t in self.generate_stream(prompt, model=model, options=options, timeout=timeout)]
+        text = "".join(tokens).strip()
+        return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+
+    async def aprefill(self, prompt, model=None, options=None, timeout=None):
+        """One-token generation of prompt so the storm's streams reuse its KV prefix (see SimpleEngineV1.prefill)."""
+        opts = {k: v for k, v in (options or {}).items() if k != "seed"}
+        opts["num_predict"] = 1
+        try:
+            await self.agenerate(prompt, model=model, options=opts, timeout=timeout)
+            return True
+        except (asyncio.TimeoutError, OSError, StreamError, ValueError) as e:
+            print(f"[v3] Prefill failed: {e}")
+            return False
+
+    async def storm(self, prompt, n, model=None, options=None, max_concurrency=8, timeout=None, limiter=None,
+                    hedger=None):
+        """
+        Async generator over (index, text) as trajectories finish, at most
+        max_concurrency streams in flight, or as many as an AdaptiveLimiter
+        (research.concurrency) allows when one is given. options may be a dict or a
+        callable index -> dict (e.g. per-trajectory seeds). Failed streams yield an
+        "<API ERROR: ...>" text like SimpleEngineV1. Closing the generator
+        cancels every stream still running.
+        With a Hedger (research.concurrency), a straggler gets one duplicate stream with
+        a fresh seed; the first to finish wins and the other is cancelled. Duplicates
+        bypass the concurrency gate (they only start once most of the storm is done).
+        """
+        gate = asyncio.Semaphore(max(1, max_concurrency))
+        completed = 0
+
+        async def attempt(idx, opts):
+            try:
+                return await self.agenerate(prompt, model=model, options=opts, timeout=timeout)
+            except asyncio.TimeoutError:
+                return "<API ERROR: stream timed out>"
+            except (OSError, StreamError, ValueError) as e:
+                return f"<API ERROR: {e}>"
 
+        async def run(idx):
+            """One trajectory (plus its hedge, if any); returns (text, seconds)."""
+            started = time.perf_counter()
+            opts = options(idx) if callable(options) else options
+            primary = asyncio.ensure_future(attempt(idx, opts))
+            contenders = {primary}
+            hedged = False
+            try:
+                while True:
+                    poll = hedger.check_interval if hedger is not None and not hedged else None
+                    done, _ = await asyncio.wait(contenders, timeout=poll, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        contenders.discard(finished)
+                        text = finished.result()
+                        if text.startswith("<API ERROR") and contenders:
+                            continue  # The other contender may still succeed
+                        if hedged:
+                            if finished is primary:
+                                hedger.primary_wins += 1
+                            else:
+                                hedger.hedge_wins += 1
+                        return text, time.perf_counter() - started
+                    if done or hedged or not hedger.active(completed, n) or not hedger.can_hedge(n):
+                        continue
+                    cutoff = hedger.cutoff()
+                    if cutoff is not None and time.perf_counter() - started > cutoff:
+                        hedged = True
+                        hedger.launched += 1
+                        hedger.threshold = cutoff
+                        contenders.add(asyncio.ensure_future(attempt(idx, hedger.hedge_options(opts))))
+            finally:
+                for loser in contenders:
+                    loser.cancel()  # Closes the losing stream
+                await asyncio.gather(*contenders, return_exceptions=True)
+
+        async def one(idx):
+            nonlocal completed
+            if limiter is None:
+                async with gate:
+                    text, latency = await run(idx)
+            else:
+                await limiter.acquire_async()
+                text = None
+                try:
+                    text, latency = await run(idx)
+                finally:
+                    if text is None:
+                        limiter.release()  # Cancelled: no latency sample
+                    else:
+                        limiter.release(latency, len(text), ok=not text.startswith("<API ERROR"))
+            completed += 1
+            if hedger is not None and not text.startswith("<API ERROR"):
+                hedger.record(latency)
+            return idx, text
+
+        tasks = [asyncio.ensure_future(one(i)) for i in range(n)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_models(self):
+        return asyncio.run(self.list_models())
+
+    def generate(self, prompt, model=None, **options):
+        return asyncio.run(self.agenerate(prompt, model=model, options=options or None))
+
+    def prefill(self, prompt, model=None, **options):
+        return asyncio.run(self.aprefill(prompt, model=model, options=options))
+
+    def start_storm(self, prompt, n, model=None, options=None, max_concurrency=8, timeout=None, limiter=None,
+                    hedger=None):
+        """Runs storm() on a private event loop thread; see StormRun."""
+        return StormRun(self, prompt, n, model, options, max_concurrency, timeout, limiter, hedger)
+
+
+class StormRun:
+    """
+    Thread-facing handle for a running async storm (the Tk UI is not asyncio based).
+    Iterating yields (index, text) as trajectories land; cancel() aborts every
+    in-flight stream within one event-loop turn.
+    """
+    _DONE = object()
+
+    def __init__(self, engine, prompt, n, model, options, max_concurrency, timeout, limiter=None, hedger=None):
+        self._results = queue.Queue()
+        self._loop = asyncio.new_event_loop()
+        self._task = None
+        self._ready = threading.Event()
+        self._args = (prompt, n, model, options, max_concurrency, timeout, limiter, hedger)
+        self._engine = engine
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+
+        async def pump():
+            try:
+                async for item in self._engine.storm(*self._args):
+                    self._results.put(item)
+            finally:
+                self._results.put(self._DONE)
+
+        self._task = self._loop.create_task(pump())
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def __iter__(self):
         while True:
-            line = await proc.stdout.readline()
-            if not line:
-                break
-            # Yield tokens/lines as they arrive
-            yield line.decode('utf-8').strip()
+            item = self._results.get()
+            if item is self._DONE:
+                return
+            yield item
+
+    def cancel(self):
+        if not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass  # Loop finished in the meantime
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
 
-        await proc.wait()
 
 async def main():
     eng = AsyncEngineV3()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gen_cache", "generations.sqlite"
+)
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_generation_cache():
+    """Process-wide cache used by SimpleEngineV1 (and through it the research scripts)."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = GenerationCache()
+        return _shared_cache
+
+
+def generation_key(model, digest, prompt, options):
+    """sha256 over the full request identity; options must include the seed."""
+    ident = json.dumps(
+        {"model": model, "digest": digest or "", "prompt": prompt, "options": options or {}},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(options):
+    """Only seeded calls are reproducible enough to replay."""
+    return bool(options) and options.get("seed") is not None
+
+
+class GenerationCache:
+    """
+    Persistent cache of seeded generation results keyed by (model, model digest,
+    prompt, full options). Stored in one SQLite file; once the stored responses
+    exceed max_bytes the least recently used entries are evicted down to 90%.
+    Thread-safe within a process.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=256 * 1024 * 1024, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled and bool(path)
+        self._lock = threading.Lock()
+        self._db = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS generations_lru ON generations(last_used)")
+            self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+        return self._db
+
+    def get(self, key):
+        """The cached response dict, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                db = self._conn()
+                row = db.execute("SELECT response FROM generations WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                db.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"[gen-cache] Disabled: {e}")
+                self.enabled = False
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, model, response):
+        if not self.enabled:
+            return
+        blob = json.dumps(response, ensure_ascii=False)
+        size = len(blob.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._conn()
+                old = db.execute("SELECT size FROM generations WHERE key = ?", (key,)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO generations (key, model, response, size, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, model, blob, size, now, now)
+                )
+                self._bytes += size - (old[0] if old else 0)
+                if self._bytes > self.max_bytes:
+                    self._evict(db, int(self.max_bytes * 0.9))
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"[gen-cache] Disabled: {e}")
+                self.enabled = False
+
+    def _evict(self, db, target):
+        rows = db.execute("SELECT key, size FROM generations ORDER BY last_used ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._bytes <= target:
+                break
+            doomed.append((key,))
+            self._bytes -= size
+        db.executemany("DELETE FROM generations WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            entries = 0
+            if self.enabled and self._db is not None:
+                entries = self._db.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": entries,
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,8 +1,71 @@
+import codecs
 import ctypes
 import os
 import sys
+import threading
+
+# bool (*cdlss_token_callback)(const char * token, void * user_data)
+TOKEN_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_bool, ctypes.c_char_p, ctypes.c_void_p)
+
+
+class CancelFlag:
+    """
+    threading.Event-like stop flag whose memory the C engine polls before every token,
+    so set() stops a running generation even between Python callbacks.
+    """
+    def __init__(self):
+        self._value = ctypes.c_int32(0)
+
+    def set(self):
+        self._value.value = 1
+
+    def clear(self):
+        self._value.value = 0
+
+    def is_set(self):
+        return self._value.value != 0
+
+    @property
+    def pointer(self):
+        return ctypes.pointer(self._value)
+
+
+class CDLSSGenParams(ctypes.Structure):
+    """Mirror of struct cdlss_gen_params (cdlss_engine.h)."""
+    _fields_ = [
+        ("num_trajectories", ctypes.c_int32),
+        ("dcx_threshold", ctypes.c_float),
+        ("temp", ctypes.c_float),
+        ("top_k", ctypes.c_int32),
+        ("top_p", ctypes.c_float),
+        ("n_predict", ctypes.c_int32),
+        ("seed", ctypes.c_int32),
+        ("n_threads", ctypes.c_int32),
+        ("ignore_eos", ctypes.c_bool),
+        ("on_token", TOKEN_CALLBACK),
+        ("on_token_data", ctypes.c_void_p),
+        ("cancel", ctypes.POINTER(ctypes.c_int32)),
+    ]
+
+
+class _LoadedModel:
+    """A cdlss_model handle and its idle generation contexts."""
+    def __init__(self, handle):
+        self.handle = handle
+        self.idle = []          # cdlss_context handles not in use by any thread
+        self.contexts = 0       # All contexts created for this model
+
 
 class GGMLBridge:
+    """
+    ctypes wrapper around the cdlss_engine shared library.
+    Models are loaded once through the handle API (cdlss_model_load) and kept per
+    model path. Each generate() call borrows a context (K/V cache and compute
+    buffers) of its own, so threads generate in parallel on one set of weights:
+    ctypes releases the GIL for the duration of the C call. Contexts are reused,
+    and a reused context keeps the K/V of the prompt prefix it last saw.
+    Libraries built before the handle API only offer run_inference().
+    """
     def __init__(self, lib_path=None):
         if lib_path is None:
             # Try to auto-detect based on platform
@@ -23,6 +86,9 @@ class GGMLBridge:
         
         self.lib_path = lib_path
         self.lib = None
+        self.has_handles = False
+        self._models = {}               # model_path -> _LoadedModel
+        self._models_lock = threading.Lock()
         
         if self.lib_path and os.path.exists(self.lib_path):
             try:
@@ -42,11 +108,153 @@ class GGMLBridge:
                     ctypes.c_int     # n_predict
                 ]
                 self.lib.run_cdlss_inference.restype = ctypes.c_char_p
+                self._bind_handle_api()
             except Exception as e:
                 print(f"Error loading GGML CDLSS library: {e}")
         else:
             print("Warning: GGML CDLSS library not found. It must be built via CMake first.")
 
+    def _bind_handle_api(self):
+        try:
+            self.lib.cdlss_default_gen_params.argtypes = []
+            self.lib.cdlss_default_gen_params.restype = CDLSSGenParams
+            self.lib.cdlss_model_load.argtypes = [ctypes.c_char_p, ctypes.c_int32, ctypes.c_int32]
+            self.lib.cdlss_model_load.restype = ctypes.c_void_p
+            self.lib.cdlss_model_free.argtypes = [ctypes.c_void_p]
+            self.lib.cdlss_model_free.restype = None
+            self.lib.cdlss_context_new.argtypes = [ctypes.c_void_p, ctypes.c_int32]
+            self.lib.cdlss_context_new.restype = ctypes.c_void_p
+            self.lib.cdlss_context_free.argtypes = [ctypes.c_void_p]
+            self.lib.cdlss_context_free.restype = None
+            self.lib.cdlss_generate.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(CDLSSGenParams)]
+            self.lib.cdlss_generate.restype = ctypes.c_char_p  # Copied to bytes before the context is handed back
+        except AttributeError:
+            return  # Older build: one-shot run_cdlss_inference only
+        self.has_handles = True
+
+    def load_model(self, model_path, n_ctx=0, n_gpu_layers=0):
+        """Opaque model handle (an int), or None if the model could not be loaded."""
+        return self.lib.cdlss_model_load(model_path.encode('utf-8'), n_ctx, n_gpu_layers)
+
+    def free_model(self, handle):
+        self.lib.cdlss_model_free(handle)
+
+    def get_model(self, model_path):
+        """_LoadedModel for model_path, loading the weights on first use."""
+        with self._models_lock:
+            entry = self._models.get(model_path)
+            if entry is None:
+                handle = self.load_model(model_path)
+                if not handle:
+                    raise RuntimeError(f"failed to load {model_path}")
+                entry = self._models[model_path] = _LoadedModel(handle)
+            return entry
+
+    def _acquire_context(self, entry):
+        with self._models_lock:
+            if entry.idle:
+                return entry.idle.pop()
+        ctx = self.lib.cdlss_context_new(entry.handle, 0)
+        if not ctx:
+            raise RuntimeError("failed to create a generation context")
+        with self._models_lock:
+            entry.contexts += 1
+        return ctx
+
+    def _release_context(self, entry, ctx):
+        with self._models_lock:
+            entry.idle.append(ctx)
+
+    def gen_params(self, num_trajectories=10, dcx_threshold=0.85, temp=0.7, n_predict=256, seed=-1, n_threads=None,
+                   top_k=None, top_p=None):
+        params = self.lib.cdlss_default_gen_params()
+        params.num_trajectories = num_trajectories
+        params.dcx_threshold = dcx_threshold
+        params.temp = temp
+        params.n_predict = n_predict
+        params.seed = -1 if seed is None else seed
+        if n_threads:
+            params.n_threads = n_threads
+        if top_k is not None:
+            params.top_k = top_k
+        if top_p is not None:
+            params.top_p = top_p
+        return params
+
+    def _stream_callback(self, on_token, cancel, errors):
+        """C token callback: decodes UTF-8 across token boundaries, forwards text, reports stops."""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def callback(token_b, _):
+            try:
+                if on_token is not None:
+                    text = decoder.decode(token_b)
+                    if text and on_token(text) is False:
+                        return False
+                return cancel is None or not cancel.is_set()
+            except BaseException as e:  # Never unwind through the C frames
+                errors.append(e)
+                return False
+
+        return TOKEN_CALLBACK(callback)
+
+    def generate(self, model_path, prompt, on_token=None, cancel=None, **params):
+        """
+        Continuation of prompt (without the prompt) from the cached handle of model_path.
+        params are gen_params() keywords.
+        on_token(text) is called from the generating thread for every token; returning
+        False stops the generation. cancel is a CancelFlag (polled by the engine itself)
+        or any object with is_set(), e.g. a threading.Event (checked after every token).
+        A stopped generation returns the text produced so far.
+        Falls back to run_inference() when the library is missing or predates the handle
+        API; that path cannot stream, so on_token then receives the whole text at once.
+        """
+        if not self.lib or not self.has_handles:
+            if cancel is not None and cancel.is_set():
+                return ""
+            text = self.run_inference(
+                model_path, prompt,
+                num_trajectories=params.get("num_trajectories", 10),
+                dcx_threshold=params.get("dcx_threshold", 0.85),
+                temp=params.get("temp", 0.7),
+                n_predict=params.get("n_predict", 256)
+            )
+            if self.lib and text.startswith(prompt):
+                text = text[len(prompt):]  # run_cdlss_inference echoes the prompt
+            if on_token is not None and text:
+                on_token(text)
+            return text
+
+        try:
+            entry = self.get_model(model_path)
+            gen = self.gen_params(**params)
+            errors = []
+            if isinstance(cancel, CancelFlag):
+                gen.cancel = cancel.pointer
+            if on_token is not None or (cancel is not None and not isinstance(cancel, CancelFlag)):
+                gen.on_token = self._stream_callback(on_token, cancel, errors)  # Kept alive by gen
+            ctx = self._acquire_context(entry)
+            try:
+                result_b = self.lib.cdlss_generate(ctx, prompt.encode('utf-8'), ctypes.byref(gen))
+            finally:
+                self._release_context(entry, ctx)
+            if errors:
+                raise errors[0]
+            if result_b is None:
+                return "ERROR in GGML C-Call: generation failed"
+            return result_b.decode('utf-8', errors='replace')
+        except Exception as e:
+            return f"ERROR in GGML C-Call: {e}"
+
+    def close(self):
+        """Frees every cached model and its contexts; no generate() may be running."""
+        with self._models_lock:
+            models, self._models = self._models, {}
+        for entry in models.values():
+            for ctx in entry.idle:
+                self.lib.cdlss_context_free(ctx)
+            self.free_model(entry.handle)
+
     def run_inference(self, model_path, prompt, num_trajectories=10, dcx_threshold=0.85, temp=0.7, n_predict=256):
         if not self.lib:
             # Fallback mock for UI testing if lib isn't built yet
@@ -74,5 +282,5 @@ class GGMLBridge:
 if __name__ == "__main__":
     # Test
     bridge = GGMLBridge()
-    res = bridge.run_inference("dummy_model.gguf", "Hello world")
+    res = bridge.generate("dummy_model.gguf", "Hello world")
     print("Result:", res)
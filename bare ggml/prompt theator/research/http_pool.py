@@ -0,0 +1,173 @@
+import io
+import json
+import time
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Raised when a kept-alive socket was closed by the server while idle; safe to resend once
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+
+def get_pool(base_url, max_size=16, idle_timeout=30.0, timeout=120.0):
+    """
+    Process-wide pool for one base URL (shared by SimpleEngineV1 and the idle runner).
+    Sizing arguments only apply when the pool is first created.
+    """
+    key = base_url.rstrip("/")
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key, max_size=max_size, idle_timeout=idle_timeout, timeout=timeout)
+            _pools[key] = pool
+        return pool
+
+
+class PooledResponse:
+    """
+    A response that hands its connection back to the pool once fully read.
+    Chunked bodies are decoded by http.client, so iterating yields NDJSON lines
+    as they stream in. Closing early discards the connection instead.
+    """
+    def __init__(self, pool, conn, resp):
+        self.pool = pool
+        self.status = resp.status
+        self.headers = resp.headers
+        self._conn = conn
+        self._resp = resp
+
+    def read(self):
+        try:
+            return self._resp.read()
+        finally:
+            self.close()
+
+    def json(self):
+        return json.loads(self.read().decode("utf-8"))
+
+    def __iter__(self):
+        try:
+            while True:
+                line = self._resp.readline()
+                if not line:
+                    break
+                yield line
+        finally:
+            self.close()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        reusable = self._resp.isclosed() and not self._resp.will_close
+        if not reusable:
+            self._resp.close()
+        self.pool._release(conn, reusable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded keep-alive pool of http.client connections to one Ollama server.
+    At most max_size connections are open at once (callers block for a free slot);
+    idle connections older than idle_timeout seconds are closed instead of reused.
+    Errors surface as urllib.error.HTTPError / URLError so existing handlers keep working.
+    """
+    def __init__(self, base_url, max_size=16, idle_timeout=30.0, timeout=120.0):
+        parts = urllib.parse.urlsplit(base_url)
+        self.base_url = base_url.rstrip("/")
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.path_prefix = parts.path.rstrip("/")
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []                 # (conn, released_at), most recent last
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _new_conn(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self.created += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        self._slots.acquire()
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, released_at = self._idle.pop()
+                if now - released_at <= self.idle_timeout:
+                    self.reused += 1
+                    return conn, True
+                conn.close()
+            return self._new_conn(), False
+
+    def _release(self, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            conn.close()
+        self._slots.release()
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """Sends one request and returns a PooledResponse (status < 400)."""
+        url = self.base_url + path
+        hdrs = {"Connection": "keep-alive"}
+        if body is not None:
+            hdrs["Content-Type"] = "application/json"
+        hdrs.update(headers or {})
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.timeout = timeout or self.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                conn.request(method, self.path_prefix + path, body=body, headers=hdrs)
+                resp = conn.getresponse()
+            except _STALE_ERRORS as e:
+                self._release(conn, False)
+                if reused and attempt == 0:
+                    continue
+                raise urllib.error.URLError(e)
+            except (OSError, http.client.HTTPException) as e:  # Timeouts included, as urlopen wraps them
+                self._release(conn, False)
+                raise urllib.error.URLError(e)
+            pooled = PooledResponse(self, conn, resp)
+            if resp.status >= 400:
+                err_body = pooled.read()
+                raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(err_body))
+            return pooled
+
+    def get_json(self, path, timeout=None):
+        return self.request("GET", path, timeout=timeout).json()
+
+    def post_json(self, path, payload, timeout=None):
+        return self.request("POST", path, body=json.dumps(payload).encode("utf-8"), timeout=timeout).json()
+
+    def stream(self, path, payload, timeout=None):
+        """POST with a streamed (chunked NDJSON) body; iterate the result for raw lines."""
+        return self.request("POST", path, body=json.dumps(payload).encode("utf-8"), timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "idle": len(self._idle)}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
@@ -26,10 +26,13 @@ import signal
 import sys
 import time
 import urllib.error
-import urllib.request
 from dataclasses import dataclass
 from typing import Any
 import numpy as np
+try:
+    from research.engine_protocol import get_engine, ollama_base_url
+except ImportError:  # Run directly from the research folder
+    from engine_protocol import get_engine, ollama_base_url
 
 PROMPTS: list[str] = [
     "The capital of France is",
@@ -59,25 +62,14 @@ class StopRequested(Exception):
     """Raised when user requests shutdown (Ctrl+C / SIGTERM)."""
 
 class OllamaClient:
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, use_cache: bool = True) -> None:
         self.base_url = base_url.rstrip("/")
-
-    def _post_json(self, endpoint: str, payload: dict[str, Any]) -> dict[str, Any]:
-        url = f"{self.base_url}{endpoint}"
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            url,
-            data=data,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=120) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        self.use_cache = use_cache  # Replay seeded trajectories from research.generation_cache
+        # Shared "ollama" engine: same keep-alive pool as the UI and research scripts
+        self.engine = get_engine("ollama", base_url=self.base_url)
 
     def _get_json(self, endpoint: str) -> dict[str, Any]:
-        url = f"{self.base_url}{endpoint}"
-        with urllib.request.urlopen(url, timeout=30) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        return self.engine.pool.get_json(endpoint, timeout=30)
 
     def list_models(self) -> list[ModelInfo]:
         payload = self._get_json("/api/tags")
@@ -104,20 +96,15 @@ class OllamaClient:
         num_predict: int,
         num_thread: int = 14,
     ) -> dict[str, Any]:
-        payload = {
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "seed": seed,
-                "temperature": temperature,
-                "top_k": top_k,
-                "top_p": top_p,
-                "num_predict": num_predict,
-                "num_thread": num_thread,
-            },
+        options = {
+            "seed": seed,
+            "temperature": temperature,
+            "top_k": top_k,
+            "top_p": top_p,
+            "num_predict": num_predict,
+            "num_thread": num_thread,
         }
-        return self._post_json("/api/generate", payload)
+        return self.engine.generate_response(prompt, model=model, options=options, timeout=120, use_cache=self.use_cache)
 
 def utc_now() -> str:
     return dt.datetime.now(dt.timezone.utc).isoformat()
@@ -232,7 +219,7 @@ def generate_map_artifacts(
 class Runner:
     def __init__(self, args: argparse.Namespace) -> None:
         self.args = args
-        self.client = OllamaClient(args.ollama_url)
+        self.client = OllamaClient(args.ollama_url, use_cache=not args.no_gen_cache)
         self.stop_requested = False
         self.run_id = dt.datetime.now(dt.timezone.utc).strftime("run_%Y%m%dT%H%M%SZ")
         self.run_dir = pathlib.Path(args.output_dir) / self.run_id
@@ -321,6 +308,7 @@ class Runner:
             prompt_idx, prompt = self._select_prompt(i)
             seed = self._next_seed()
             started = time.time()
+            cached = False
             try:
                 resp = self.client.generate(
                     model=model_info.name,
@@ -335,11 +323,16 @@ class Runner:
                 response_text = resp.get("response", "")
                 done_reason = resp.get("done_reason", "")
                 total_duration = int(resp.get("total_duration", 0) or 0)
+                cached = bool(resp.get("cached"))
             except (urllib.error.URLError, TimeoutError) as e:
                 response_text = ""
                 done_reason = f"error:{type(e).__name__}"
                 total_duration = 0
             elapsed_ms = int((time.time() - started) * 1000)
+            if cached:
+                # A replayed row has no timing of its own; the cached durations belong
+                # to the run that generated it.
+                elapsed_ms = total_duration = None
             rec = {
                 "run_id": self.run_id,
                 "timestamp_utc": utc_now(),
@@ -354,6 +347,7 @@ class Runner:
                 "done_reason": done_reason,
                 "elapsed_ms": elapsed_ms,
                 "ollama_total_duration_ns": total_duration,
+                "cached": cached,
             }
             append_ndjson(raw_path, rec)
             records.append(rec)
@@ -407,7 +401,7 @@ class Runner:
 
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Idle topography runner for Ollama models.")
-    p.add_argument("--ollama-url", default="http://localhost:11434", help="Base URL.")
+    p.add_argument("--ollama-url", default=ollama_base_url(), help="Base URL (default: OLLAMA_HOST or localhost).")
     p.add_argument("--output-dir", default="prompt theator/research/idle_runs", help="Directory for artifacts.")
     p.add_argument("--models", default="", help="Allowlist of model names.")
     p.add_argument("--trajectories-per-model", type=int, default=1000, help="Trajectories per model.")
@@ -419,6 +413,7 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--seed-base", type=int, default=42, help="base seed.")
     p.add_argument("--sleep-ms", type=int, default=0, help="delay.")
     p.add_argument("--progress-every", type=int, default=25, help="log every N.")
+    p.add_argument("--no-gen-cache", action="store_true", help="Always call the model (skip the seeded generation cache).")
     return p
 
 def main() -> int:
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Mock Ollama Server
+Goal:
+- Stand in for a live Ollama when load/latency testing storms (CI, laptops, benchmark boxes).
+- Implements /api/tags, /api/ps, /api/generate (streaming + non-streaming), /api/embeddings, /api/embed.
+- Simulates model residency: cold loads, keep_alive expiry and eviction beyond max_loaded_models.
+- Configurable time-to-first-token, token rate, concurrency limit and failure injection.
+Design notes:
+- Standard-library only.
+- Deterministic: text is a pure function of (model, prompt, seed); embeddings of (model, text).
+- Unseeded calls draw from a per-server counter so repeated calls still differ, like a real model.
+
+    python "prompt theator/research/mock_ollama.py" --port 11435 --ttft-ms 150 --tokens-per-sec 40
+"""
+
+from __future__ import annotations
+import argparse
+import functools
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+VOCAB: list[str] = (
+    "the a of and to in is that it for on with as by at from this be are was "
+    "storm signal river city light quantum field wave state model memory mirror "
+    "satellite tree protocol kernel toaster cake sunset planet proof constant "
+    "rogue hacker data currency network particle entangled recursive moebius "
+    "strip chicken duct tape time machine architecture plant speech lonely"
+).split()
+PUNCT: list[str] = [".", ",", ";", "!", "?"]
+
+
+@dataclass
+class MockConfig:
+    models: list[str] = field(default_factory=lambda: ["qwen2.5:0.5b", "llama3:latest", "nomic-embed-text:latest"])
+    ttft_ms: float = 0.0            # Delay before the first token
+    tokens_per_sec: float = 0.0     # 0 = unthrottled
+    default_num_predict: int = 64
+    embed_dim: int = 768
+    embed_ms: float = 0.0           # Latency per embedding request
+    parallel: int = 4               # Requests served at once (OLLAMA_NUM_PARALLEL)
+    max_queue: int = 512            # Waiting requests beyond parallel before 503
+    fail_rate: float = 0.0          # Fraction of requests answered with HTTP 500
+    drop_rate: float = 0.0          # Fraction of streams cut off mid-generation
+    drop_mid_chunk: bool = False    # Cut dropped streams inside a chunk instead of between chunks
+    slow_rate: float = 0.0          # Fraction of generations that straggle (stuck behind another client)
+    slow_ms: float = 0.0            # Extra delay before the first token of a straggler
+    failure_seed: int = 0
+    load_ms: float = 0.0            # Cold load time of a model that is not resident
+    max_loaded_models: int = 0      # Resident models before the least recently used is evicted (0 = unlimited)
+    model_size: int = 1 << 28       # Reported size (bytes) of every model
+
+
+def _digest(name: str) -> str:
+    return hashlib.sha256(f"mock:{name}".encode("utf-8")).hexdigest()
+
+
+def _keep_alive_seconds(value: Any) -> float | None:
+    """Ollama keep_alive ("5m", "30s", "1h", seconds, negative = forever) -> seconds, None = forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, str):
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        for suffix in ("ms", "s", "m", "h"):
+            if value.endswith(suffix) and value[:-len(suffix)].lstrip("-").replace(".", "", 1).isdigit():
+                seconds = float(value[:-len(suffix)]) * units[suffix]
+                break
+        else:
+            try:
+                seconds = float(value)
+            except ValueError:
+                return 300.0  # Compound Go durations ("1h30m"): default expiry
+    else:
+        seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+def _seeded_rng(*parts: Any) -> random.Random:
+    h = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(h[:8], "little"))
+
+
+def mock_tokens(model: str, prompt: str, seed: Any, n: int) -> list[str]:
+    """Deterministic pseudo-text: words biased towards the prompt's own vocabulary."""
+    rng = _seeded_rng(model, prompt, seed)
+    prompt_words = [w.strip(".,;!?").lower() for w in prompt.split() if w.strip(".,;!?")]
+    out: list[str] = []
+    for i in range(n):
+        pool = prompt_words if prompt_words and rng.random() < 0.3 else VOCAB
+        word = rng.choice(pool)
+        if rng.random() < 0.08:
+            word += rng.choice(PUNCT)
+        out.append(word if i == 0 else " " + word)
+    return out
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_vector(model: str, word: str, dim: int) -> tuple[float, ...]:
+    rng = _seeded_rng(model, word)
+    return tuple(rng.gauss(0.0, 1.0) for _ in range(dim))
+
+
+def mock_embedding(model: str, text: str, dim: int) -> list[float]:
+    """Sum of per-word seeded Gaussian vectors, L2-normalised (shared words -> similar vectors)."""
+    vec = [0.0] * dim
+    words = [w.strip(".,;!?").lower() for w in text.split()] or [""]
+    for w in words:
+        for j, v in enumerate(_word_vector(model, w, dim)):
+            vec[j] += v
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures = 0
+        self.drops = 0
+        self.rejected = 0
+        self.loads = 0
+        self.evictions = 0
+        self.stragglers = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "failures": self.failures,
+                "drops": self.drops,
+                "rejected": self.rejected,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "stragglers": self.stragglers,
+            }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024   # listen() backlog; must be set before the socket is bound
+
+
+class MockOllamaServer:
+    """
+    Threaded mock server. start() serves in a background thread and returns the base URL;
+    use port=0 for an ephemeral port. /mock/stats reports request counts and peak concurrency.
+    """
+    def __init__(self, config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or MockConfig()
+        self.stats = _Stats()
+        self._slots = threading.BoundedSemaphore(max(1, self.config.parallel))
+        self._waiting = 0
+        self._unseeded = 0
+        self._fail_rng = random.Random(self.config.failure_seed)
+        self._lock = threading.Lock()
+        self._loaded: dict[str, float | None] = {}   # model -> expiry (None = pinned), LRU order
+        self._res_lock = threading.Lock()
+        handler = type("MockHandler", (_Handler,), {"mock": self})
+        self.httpd = _Server((host, port), handler)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def next_unseeded(self) -> int:
+        with self._lock:
+            self._unseeded += 1
+            return self._unseeded
+
+    def roll_failure(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._fail_rng.random() < rate
+
+    def canonical(self, model: str) -> str | None:
+        if model in self.config.models:
+            return model
+        if f"{model}:latest" in self.config.models:
+            return f"{model}:latest"
+        return None
+
+    def _expire(self) -> None:
+        now = time.time()
+        for name, expires in list(self._loaded.items()):
+            if expires is not None and expires <= now:
+                del self._loaded[name]
+
+    def touch(self, model: str, keep_alive: Any) -> int:
+        """Marks model as used, loading it (and evicting the LRU model) if cold; returns load_duration ns."""
+        keep = _keep_alive_seconds(keep_alive)
+        with self._res_lock:
+            self._expire()
+            cold = model not in self._loaded
+        started = time.perf_counter()
+        if cold and self.config.load_ms > 0:
+            time.sleep(self.config.load_ms / 1000.0)
+        with self._res_lock:
+            if model not in self._loaded:
+                limit = self.config.max_loaded_models
+                while limit > 0 and len(self._loaded) >= limit:
+                    del self._loaded[next(iter(self._loaded))]
+                    with self.stats.lock:
+                        self.stats.evictions += 1
+                with self.stats.lock:
+                    self.stats.loads += 1
+            self._loaded.pop(model, None)
+            if keep != 0:
+                self._loaded[model] = None if keep is None else time.time() + keep
+        return int((time.perf_counter() - started) * 1e9) if cold else 0
+
+    def running(self) -> list[dict[str, Any]]:
+        """/api/ps entries, most recently used first."""
+        with self._res_lock:
+            self._expire()
+            loaded = list(self._loaded.items())[::-1]
+        return [
+            {
+                "name": name, "model": name, "digest": _digest(name),
+                "size": self.config.model_size, "size_vram": self.config.model_size,
+                "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                            time.gmtime(expires if expires is not None else 2**31 - 1)),
+            }
+            for name, expires in loaded
+        ]
+
+    def acquire(self) -> bool:
+        """Waits for a serving slot; False when the queue is full (HTTP 503)."""
+        with self._lock:
+            if self._waiting >= self.config.max_queue:
+                return False
+            self._waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+        with self.stats.lock:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        return True
+
+    def release(self) -> None:
+        with self.stats.lock:
+            self.stats.in_flight -= 1
+        self._slots.release()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock: MockOllamaServer
+    load_ns: int = 0
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass
+
+    def _count(self) -> None:
+        with self.mock.stats.lock:
+            self.mock.stats.requests[self.path] = self.mock.stats.requests.get(self.path, 0) + 1
+
+    def _send_json(self, code: int, obj: dict[str, Any]) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, obj: dict[str, Any]) -> None:
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        self._count()
+        if self.path == "/api/tags":
+            models = [
+                {"name": m, "model": m, "digest": _digest(m), "size": self.mock.config.model_size,
+                 "modified_at": "2024-01-01T00:00:00Z"}
+                for m in self.mock.config.models
+            ]
+            self._send_json(200, {"models": models})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": self.mock.running()})
+        elif self.path == "/mock/stats":
+            self._send_json(200, self.mock.stats.snapshot())
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self) -> None:
+        self._count()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        routes = {
+            "/api/generate": self._generate,
+            "/api/embeddings": self._embeddings,
+            "/api/embed": self._embed,
+        }
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        model = self.mock.canonical(str(req.get("model")))
+        if model is None:
+            self._send_json(404, {"error": f"model '{req.get('model')}' not found"})
+            return
+        if not self.mock.acquire():
+            with self.mock.stats.lock:
+                self.mock.stats.rejected += 1
+            self._send_json(503, {"error": "server busy, please try again. maximum pending requests exceeded"})
+            return
+        try:
+            if self.mock.roll_failure(self.mock.config.fail_rate):
+                with self.mock.stats.lock:
+                    self.mock.stats.failures += 1
+                self._send_json(500, {"error": "injected failure"})
+                return
+            self.load_ns = self.mock.touch(model, req.get("keep_alive"))
+            route(req)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client cancelled the stream
+        finally:
+            self.mock.release()
+
+    def _generate(self, req: dict[str, Any]) -> None:
+        cfg = self.mock.config
+        if not req.get("prompt"):
+            # Empty prompt: load (or unload with keep_alive 0) without generating, like Ollama
+            reason = "unload" if _keep_alive_seconds(req.get("keep_alive")) == 0 else "load"
+            self._send_json(200, {"model": req["model"], "response": "", "done": True,
+                                  "done_reason": reason, "load_duration": self.load_ns})
+            return
+        options = req.get("options") or {}
+        seed = options.get("seed")
+        if seed is None:
+            seed = f"unseeded-{self.mock.next_unseeded()}"
+        n = int(options.get("num_predict") or cfg.default_num_predict)
+        if n < 0:
+            n = cfg.default_num_predict
+        tokens = mock_tokens(req["model"], req.get("prompt", ""), seed, n)
+        started = time.perf_counter()
+        interval = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+        drop_at = -1
+        if self.mock.roll_failure(cfg.drop_rate):
+            drop_at = len(tokens) // 2
+
+        def final(text: str) -> dict[str, Any]:
+            total_ns = int((time.perf_counter() - started) * 1e9)
+            prompt_tokens = len(req.get("prompt", "").split())
+            return {
+                "model": req["model"],
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "response": text,
+                "done": True,
+                "done_reason": "length",
+                "context": list(range(prompt_tokens + len(tokens))),
+                "total_duration": total_ns + self.load_ns,
+                "load_duration": self.load_ns,
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": len(tokens),
+            }
+
+        if cfg.ttft_ms > 0:
+            time.sleep(cfg.ttft_ms / 1000.0)
+        if self.mock.roll_failure(cfg.slow_rate):
+            with self.mock.stats.lock:
+                self.mock.stats.stragglers += 1
+            time.sleep(cfg.slow_ms / 1000.0)
+        if not req.get("stream", True):
+            if interval:
+                time.sleep(interval * max(0, len(tokens) - 1))
+            self._send_json(200, final("".join(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, tok in enumerate(tokens):
+            if i == drop_at:
+                with self.mock.stats.lock:
+                    self.mock.stats.drops += 1
+                self.close_connection = True
+                if cfg.drop_mid_chunk:
+                    data = (json.dumps({"model": req["model"], "response": tok, "done": False}) + "\n").encode("utf-8")
+                    self.wfile.write(b"%x\r\n%s" % (len(data), data[:len(data) // 2]))
+                    self.wfile.flush()
+                return  # Connection closes without the terminating chunk
+            if i and interval:
+                time.sleep(interval)
+            self._write_chunk({"model": req["model"], "response": tok, "done": False})
+        self._write_chunk(final(""))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _embed_latency(self) -> None:
+        if self.mock.config.embed_ms > 0:
+            time.sleep(self.mock.config.embed_ms / 1000.0)
+
+    def _embeddings(self, req: dict[str, Any]) -> None:
+        self._embed_latency()
+        self._send_json(200, {"load_duration": self.load_ns, "embedding": mock_embedding(req["model"], req.get("prompt", ""), self.mock.config.embed_dim)})
+
+    def _embed(self, req: dict[str, Any]) -> None:
+        inputs = req.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self._embed_latency()
+        dim = self.mock.config.embed_dim
+        self._send_json(200, {"model": req["model"], "load_duration": self.load_ns, "embeddings": [mock_embedding(req["model"], t, dim) for t in inputs]})
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Mock Ollama server for load and latency testing.")
+    p.add_argument("--host", default="127.0.0.1", help="Bind address.")
+    p.add_argument("--port", type=int, default=11435, help="Port (11434 to impersonate Ollama).")
+    p.add_argument("--models", default="", help="Comma-separated model names to advertise.")
+    p.add_argument("--ttft-ms", type=float, default=0.0, help="Time to first token.")
+    p.add_argument("--tokens-per-sec", type=float, default=0.0, help="Token rate per stream (0 = unthrottled).")
+    p.add_argument("--num-predict", type=int, default=64, help="Tokens when the request sets none.")
+    p.add_argument("--embed-dim", type=int, default=768, help="Embedding dimension.")
+    p.add_argument("--embed-ms", type=float, default=0.0, help="Latency per embedding request.")
+    p.add_argument("--parallel", type=int, default=4, help="Requests served concurrently.")
+    p.add_argument("--max-queue", type=int, default=512, help="Waiting requests before 503.")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests failing with 500.")
+    p.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of streams cut mid-generation.")
+    p.add_argument("--drop-mid-chunk", action="store_true", help="Cut dropped streams inside a chunk.")
+    p.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of generations that straggle.")
+    p.add_argument("--slow-ms", type=float, default=0.0, help="Extra first-token delay of a straggler.")
+    p.add_argument("--load-ms", type=float, default=0.0, help="Cold load time per model.")
+    p.add_argument("--max-loaded-models", type=int, default=0, help="Resident models before LRU eviction (0 = unlimited).")
+    p.add_argument("--failure-seed", type=int, default=0, help="Seed for failure injection.")
+    return p
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    config = MockConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        default_num_predict=args.num_predict,
+        embed_dim=args.embed_dim,
+        embed_ms=args.embed_ms,
+        parallel=args.parallel,
+        max_queue=args.max_queue,
+        fail_rate=args.fail_rate,
+        drop_rate=args.drop_rate,
+        drop_mid_chunk=args.drop_mid_chunk,
+        failure_seed=args.failure_seed,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        load_ms=args.load_ms,
+        max_loaded_models=args.max_loaded_models,
+    )
+    if args.models:
+        config.models = [m.strip() for m in args.models.split(",") if m.strip()]
+    server = MockOllamaServer(config, host=args.host, port=args.port)
+    print(f"[mock-ollama] serving {', '.join(config.models)} on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
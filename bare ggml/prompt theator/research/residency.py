@@ -0,0 +1,163 @@
+import time
+import threading
+import concurrent.futures
+
+DEFAULT_KEEP_ALIVE = "5m"
+SESSION_KEEP_ALIVE = -1     # Ollama: negative keeps the model loaded until told otherwise
+
+_pins = {}
+_pins_lock = threading.Lock()
+
+
+def canonical_model_name(model):
+    """Ollama reports untagged models as name:latest (/api/ps, /api/tags)."""
+    return model if ":" in model else f"{model}:latest"
+
+
+def keep_alive_for(model, default=DEFAULT_KEEP_ALIVE):
+    """
+    keep_alive to send with any request for model. Every Ollama request resets the
+    model's expiry to its own keep_alive, so the engines must repeat the session pin
+    or a plain "5m" request would silently unpin a model mid-session.
+    """
+    with _pins_lock:
+        return _pins.get(canonical_model_name(model), default)
+
+
+class ModelResidencyManager:
+    """
+    Keeps the models a storm touches (main, mascot, embedding) loaded on one Ollama server.
+      - warm(): loads them concurrently and pins them with keep_alive for the session
+      - check(): compares /api/ps against the pinned set; a pinned model that is no longer
+        resident was evicted because the combined footprint does not fit, so the next
+        storm pays its cold load (load_duration) again
+      - release(): hands the models back to the default keep_alive
+    engine is a SimpleEngineV1 (its keep-alive pool is reused). memory_budget (bytes) is
+    optional; when set, warm() also warns before loading a set that cannot fit.
+    """
+    def __init__(self, engine, keep_alive=SESSION_KEEP_ALIVE, memory_budget=None, load_timeout=300):
+        self.pool = engine.pool
+        self.keep_alive = keep_alive
+        self.memory_budget = memory_budget
+        self.load_timeout = load_timeout
+        self.roles = {}             # role -> model
+        self.embed_models = set()   # Loaded through /api/embed (they reject /api/generate)
+        self.load_seconds = {}      # model -> wall time of the last warm-up request
+        self._lock = threading.Lock()
+
+    def resident(self):
+        """{model: /api/ps entry} of loaded models, or None if the server has no /api/ps."""
+        try:
+            data = self.pool.get_json("/api/ps", timeout=10)
+        except Exception:
+            return None
+        return {m.get("name", m.get("model", "")): m for m in data.get("models", [])}
+
+    def _sizes(self):
+        """Model sizes: resident size (weights + KV) where loaded, on-disk size otherwise."""
+        sizes = {}
+        try:
+            for m in self.pool.get_json("/api/tags", timeout=10).get("models", []):
+                sizes[m["name"]] = m.get("size", 0)
+        except Exception:
+            pass
+        for name, entry in (self.resident() or {}).items():
+            sizes[name] = entry.get("size", sizes.get(name, 0))
+        return sizes
+
+    def footprint(self, models):
+        """Estimated combined memory of models in bytes."""
+        sizes = self._sizes()
+        return sum(sizes.get(canonical_model_name(m), 0) for m in set(models))
+
+    def _load(self, model, embed, keep_alive, timeout=None):
+        """Empty request: Ollama loads the model (or refreshes its expiry) without generating."""
+        if embed:
+            path, payload = "/api/embed", {"model": model, "input": [], "keep_alive": keep_alive}
+        else:
+            path, payload = "/api/generate", {"model": model, "keep_alive": keep_alive}
+        return self.pool.post_json(path, payload, timeout=timeout or self.load_timeout)
+
+    def warm(self, roles, embed_roles=("embed",)):
+        """
+        Loads and pins roles ({role: model}) concurrently. Models dropped from the
+        previous selection are unpinned. Returns {"loaded": {model: seconds},
+        "failed": {model: error}, "warnings": [...]}.
+        """
+        roles = {role: model for role, model in roles.items() if model}
+        embed_models = {m for r, m in roles.items() if r in embed_roles or r.startswith("embed")}
+        report = {"loaded": {}, "failed": {}, "warnings": []}
+
+        if self.memory_budget:
+            total = self.footprint(roles.values())
+            if total > self.memory_budget:
+                report["warnings"].append(
+                    f"Selected models need ~{total / 2**30:.1f} GiB but the budget is "
+                    f"{self.memory_budget / 2**30:.1f} GiB; the server will evict one of them mid-storm."
+                )
+
+        with self._lock:
+            dropped = set(self.roles.values()) - set(roles.values())
+            was_embed = self.embed_models
+            self.roles = dict(roles)
+            self.embed_models = embed_models
+        with _pins_lock:
+            for model in dropped:
+                _pins.pop(canonical_model_name(model), None)
+            for model in roles.values():
+                _pins[canonical_model_name(model)] = self.keep_alive
+
+        def load(model):
+            started = time.perf_counter()
+            self._load(model, model in embed_models, self.keep_alive)
+            return time.perf_counter() - started
+
+        models = sorted(set(roles.values()))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(models) + len(dropped))) as executor:
+            futures = {executor.submit(load, m): m for m in models}
+            for model in dropped:  # Let unselected models expire normally instead of staying pinned
+                executor.submit(self._load, model, model in was_embed, DEFAULT_KEEP_ALIVE)
+            for f in concurrent.futures.as_completed(futures):
+                model = futures[f]
+                try:
+                    report["loaded"][model] = self.load_seconds[model] = f.result()
+                except Exception as e:
+                    report["failed"][model] = str(e)
+
+        report["warnings"].extend(self.check())
+        return report
+
+    def check(self):
+        """Warnings for pinned models that are no longer (fully) resident."""
+        ps = self.resident()
+        if ps is None:
+            return []  # Older server without /api/ps: residency cannot be tracked
+        warnings = []
+        with self._lock:
+            roles = dict(self.roles)
+        for role, model in sorted(roles.items()):
+            entry = ps.get(canonical_model_name(model))
+            if entry is None:
+                others = ", ".join(sorted(ps)) or "nothing"
+                warnings.append(
+                    f"{role} model {model} is not resident (server holds: {others}). The combined "
+                    f"footprint does not fit, so it will be cold-loaded and evict another model mid-storm."
+                )
+            elif 0 < entry.get("size_vram", 0) < entry.get("size", 0):  # size_vram 0: CPU-only server
+                share = entry["size_vram"] / entry["size"]
+                warnings.append(f"{role} model {model} is only {share:.0%} in VRAM; the rest runs on CPU.")
+        return warnings
+
+    def release(self, timeout=5):
+        """Unpins every model (they expire after the default keep_alive like any other)."""
+        with self._lock:
+            models, self.roles = set(self.roles.values()), {}
+            embed_models, self.embed_models = self.embed_models, set()
+        with _pins_lock:
+            for model in models:
+                _pins.pop(canonical_model_name(model), None)
+        for model in models:
+            try:
+                self._load(model, model in embed_models, DEFAULT_KEEP_ALIVE, timeout=timeout)
+            except Exception:
+                pass
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+StormLogic micro-benchmark.
+Times every collapse stage on deterministic synthetic storms at several N,
+against a fake embedding engine with configurable dimension and latency,
+and writes machine-readable JSON so runs can be diffed across versions.
+
+    python storm_benchmark.py --sizes 10,100,1000 --dim 768 --latency-ms 5
+"""
+
+from __future__ import annotations
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import numpy as np
+
+from storm_logic import StormLogic
+from research.embedding_cache import EmbeddingCache
+from research.engine_protocol import Engine, EngineCapabilities
+
+BASIN_VOCAB: list[list[str]] = [
+    ["paris", "capital", "france", "seine", "city", "museum", "light", "river"],
+    ["hacker", "data", "currency", "network", "rogue", "signal", "cipher", "grid"],
+    ["quantum", "entangled", "particles", "state", "measurement", "spin", "wave", "field"],
+    ["toaster", "legal", "liability", "court", "rights", "appliance", "statute", "aware"],
+]
+FILLER = ["the", "a", "of", "and", "is", "in", "that", "with", "because", "which"]
+PUNCT = [".", ",", ";", ":", "!", "?", " -"]
+
+
+def synthetic_storm(n: int, seed: int = 42, words: int = 40, dup_rate: float = 0.1) -> list[str]:
+    """Deterministic trajectories drawn from a few topical basins, with some exact repeats."""
+    rng = random.Random(seed)
+    out: list[str] = []
+    for i in range(n):
+        if out and rng.random() < dup_rate:
+            out.append(out[rng.randrange(len(out))])
+            continue
+        basin = BASIN_VOCAB[rng.randrange(len(BASIN_VOCAB))]
+        toks = []
+        for _ in range(words):
+            toks.append(rng.choice(basin) if rng.random() < 0.5 else rng.choice(FILLER))
+            if rng.random() < 0.12:
+                toks[-1] += rng.choice(PUNCT)
+        out.append(" ".join(toks).capitalize() + ".")
+    return out
+
+
+class FakeEmbeddingEngine(Engine):
+    """
+    Stand-in for SimpleEngineV1's embedding surface.
+    Vectors are seeded from sha256(model, text) so results are reproducible;
+    latency = latency_ms per request + per_text_ms per text.
+    """
+    name = "fake-embed"
+    capabilities = EngineCapabilities(embed=True, batch_embed=True)
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0, per_text_ms: float = 0.0) -> None:
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str, embed_model: str) -> list[float]:
+        digest = hashlib.sha256(f"{embed_model}\0{text}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        return rng.standard_normal(self.dim).astype(np.float32).tolist()
+
+    def _sleep(self, n_texts: int) -> None:
+        delay = (self.latency_ms + self.per_text_ms * n_texts) / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_model_digest(self, model_name: str) -> str:
+        return f"fake-{self.dim}"
+
+    def get_embedding(self, text: str, embed_model: str = "nomic-embed-text") -> list[float]:
+        with self._lock:
+            self.requests += 1
+            self.texts += 1
+        self._sleep(1)
+        return self._vector(text, embed_model)
+
+    def get_embeddings(self, texts: list[str], embed_model: str = "nomic-embed-text", batch_size: int = 32) -> list[list[float]]:
+        texts = list(texts)
+        out: list[list[float]] = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            chunk = texts[start:start + batch_size]
+            with self._lock:
+                self.requests += 1
+                self.texts += len(chunk)
+            self._sleep(len(chunk))
+            out.extend(self._vector(t, embed_model) for t in chunk)
+        return out
+
+
+def timed(fn: Callable[[], Any]) -> tuple[Any, float]:
+    """Returns (result, wall seconds). Runs untraced so timings carry no tracemalloc overhead."""
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    """Peak traced bytes of one call, measured in its own pass."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def fresh_logic(args: argparse.Namespace) -> StormLogic:
+    logic = StormLogic(embed_batch_size=args.batch_size, dcx_memory_mb=args.dcx_memory_mb)
+    # Cold, in-memory cache per stage so timings include embedding traffic
+    logic.embed_cache = EmbeddingCache(persist=False)
+    if args.no_fold:
+        logic.folder = None
+    return logic
+
+
+def bench_size(n: int, args: argparse.Namespace) -> list[dict[str, Any]]:
+    trajectories = synthetic_storm(n, seed=args.seed, dup_rate=args.dup_rate)
+    names = ["bench"] * n
+    rows: list[dict[str, Any]] = []
+
+    def run_incremental(logic: StormLogic, engine: FakeEmbeddingEngine) -> dict[str, Any]:
+        storm = logic.new_incremental_storm(engine=engine)
+        for t in trajectories:
+            storm.add(t, "bench")
+        return storm.result()
+
+    stages: list[tuple[str, Callable[[StormLogic, FakeEmbeddingEngine], Any]]] = [
+        ("strip_to_keywords", lambda lg, eng: [lg.strip_to_keywords(t) for t in trajectories]),
+        ("strip_to_structure", lambda lg, eng: [lg.strip_to_structure(t) for t in trajectories]),
+        ("calculate_dcx_scores", lambda lg, eng: lg.calculate_dcx_scores(trajectories, names, eng)),
+        ("analyze_storm", lambda lg, eng: lg.analyze_storm(trajectories, names, engine=eng)),
+        ("incremental_storm", run_incremental),
+        ("verify_synthesis", lambda lg, eng: lg.verify_synthesis(trajectories[0], trajectories[1:4], "bench", engine=eng)),
+    ]
+    if n <= args.dense_max_n:
+        stages.insert(2, ("calculate_multi_metric_dcx", lambda lg, eng: lg.calculate_multi_metric_dcx(trajectories, names, eng)))
+
+    def fresh_pair() -> tuple[StormLogic, FakeEmbeddingEngine]:
+        return fresh_logic(args), FakeEmbeddingEngine(dim=args.dim, latency_ms=args.latency_ms,
+                                                       per_text_ms=args.per_text_ms)
+
+    for stage, fn in stages:
+        # Memory in a separate pass on fresh state; tracing would inflate the timed runs
+        logic, engine = fresh_pair()
+        peak = peak_memory(lambda: fn(logic, engine))
+        for rep in range(args.repeats):
+            logic, engine = fresh_pair()
+            _, elapsed = timed(lambda: fn(logic, engine))
+            row = {
+                "n": n,
+                "stage": stage,
+                "repeat": rep,
+                "seconds": elapsed,
+                "peak_bytes": peak,
+                "embed_requests": engine.requests,
+                "embed_texts": engine.texts,
+            }
+            rows.append(row)
+            print(f"  N={n:<6} {stage:<28} {elapsed * 1000:10.2f} ms  peak={peak / 1e6:8.2f} MB  "
+                  f"requests={engine.requests}")
+    return rows
+
+
+def git_revision() -> str:
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return res.stdout.strip() if res.returncode == 0 else ""
+    except OSError:
+        return ""
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="StormLogic micro-benchmark.")
+    p.add_argument("--sizes", default="10,100,1000", help="Comma-separated storm sizes N.")
+    p.add_argument("--dim", type=int, default=768, help="Fake embedding dimension.")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Fake latency per embedding request.")
+    p.add_argument("--per-text-ms", type=float, default=0.0, help="Fake latency per embedded text.")
+    p.add_argument("--batch-size", type=int, default=32, help="StormLogic.embed_batch_size.")
+    p.add_argument("--dcx-memory-mb", type=float, default=256, help="StormLogic.dcx_memory_mb.")
+    p.add_argument("--dup-rate", type=float, default=0.1, help="Fraction of exact duplicate trajectories.")
+    p.add_argument("--no-fold", action="store_true", help="Disable near-duplicate folding.")
+    p.add_argument("--dense-max-n", type=int, default=2000, help="Skip the dense N x N stage above this N.")
+    p.add_argument("--repeats", type=int, default=1, help="Repeats per stage.")
+    p.add_argument("--seed", type=int, default=42, help="Synthetic storm seed.")
+    p.add_argument("--output", default="", help="JSON results path (default: benchmarks/storm_bench_<utc>.json).")
+    return p
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    started = dt.datetime.now(dt.timezone.utc)
+    results: list[dict[str, Any]] = []
+    for n in sizes:
+        print(f"[bench] N={n}")
+        results.extend(bench_size(n, args))
+
+    payload = {
+        "benchmark": "storm_logic",
+        "started_at_utc": started.isoformat(),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+    }
+    out = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "benchmarks",
+        f"storm_bench_{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[bench] results -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
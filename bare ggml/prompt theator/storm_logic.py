@@ -3,6 +3,13 @@ import json
 import time
 import hashlib
 import re
+import threading
+import concurrent.futures
+from research.embedding_cache import get_shared_cache
+from research.engine_protocol import capabilities_of
+from storm_dedup import TrajectoryFolder
+from storm_ngram import NgramHashEmbedder
+from storm_projection import RandomProjector
 
 class StormLogic:
     """
@@ -10,14 +17,44 @@ class StormLogic:
     Handles DCX scoring across three axes (Consensus, Semantic, Structure)
     to prevent premature collapse and enable high-fidelity synthesis.
     """
-    def __init__(self, lambda_val=0.015):
+    def __init__(self, lambda_val=0.015, embed_batch_size=32, dcx_memory_mb=256):
         self.lambda_val = lambda_val
+        # Embedders that form the DCX ground truth: model names (served by the storm
+        # engine) or (engine, model) pairs. Several embedders avoid a false perfect correlation.
+        self.embed_models = ["nomic-embed-text"]
+        # Texts per /api/embed request (one axis usually fits in a single call)
+        self.embed_batch_size = embed_batch_size
+        # Adaptive storm stopping rule (checked once per wave of arrivals)
+        self.early_stop = {
+            "min_trajectories": 10,
+            "wave_size": 5,
+            "patience": 2,        # Consecutive stable waves required
+            "tolerance": 0.01,    # Max shift of the decay-free divergence mean/std between waves
+            "top_k": 3,           # Leading distinct contents whose set must hold between waves
+            "basin_radius": 0.5,  # Divergence from Path A within which a trajectory shares its basin
+            "min_basin_share": 0.6  # Fraction of the storm that must share Path A's basin
+        }
+        # Near-duplicate folding in front of DCX (None = score every copy)
+        self.folder = TrajectoryFolder()
+        # Scratch ceiling for the tiled DCX kernel (analyze_storm never builds N x N)
+        self.dcx_memory_mb = dcx_memory_mb
+        # Content-addressed (model, digest, sha256) cache shared with the engines
+        self.embed_cache = get_shared_cache()
         # Metric Weights (Phase 3 Spec)
         self.weights = {
             "consensus": 0.6,
             "semantic": 0.3,
             "structure": 0.1
         }
+        # Per-axis embedder: "engine" (embedding model over HTTP) or "ngram" (local hashing)
+        self.axis_embedders = {
+            "consensus": "engine",
+            "semantic": "engine",
+            "structure": "ngram"
+        }
+        self.ngram_embedder = NgramHashEmbedder()
+        # Optional JL projection of engine embeddings (e.g. RandomProjector(k=128)); None = full dim
+        self.projector = None
 
     def get_simple_embedding(self, text):
         """Fallback: Deterministic hashing vectorization."""
@@ -25,9 +62,29 @@ class StormLogic:
         vec = np.frombuffer(h * 2, dtype=np.int8).astype(np.float32)
         return vec / (np.linalg.norm(vec) + 1e-9)
 
-    def get_semantic_embeddings(self, texts, engine=None, embed_model="nomic-embed-text"):
-        """Fetches embeddings from the engine or falls back to hash."""
-        if engine:
+    def get_semantic_embeddings(self, texts, engine=None, embed_model="nomic-embed-text", fallback=True):
+        """
+        Fetches embeddings from the engine or falls back to hash. With fallback=False a
+        failed request of an embedding-capable engine returns None instead; engines
+        without the embed capability always get the (deterministic) hash vectors.
+        """
+        if capabilities_of(engine).batch_embed:
+            digest = engine.get_model_digest(embed_model)
+            fetch = lambda missing: engine.get_embeddings(missing, embed_model, batch_size=self.embed_batch_size)
+            cache_model = embed_model
+            projector = self.projector
+            if projector is not None:
+                # Project before caching so the persisted vectors are k-dim too
+                raw_fetch = fetch
+                def fetch(missing):
+                    raw = raw_fetch(missing)
+                    return None if raw is None else projector.project(embed_model, raw)
+                cache_model = projector.cache_tag(embed_model)
+            embs = self.embed_cache.get_or_compute(cache_model, digest, texts, fetch)
+            if embs is not None and len(embs) == len(texts):
+                mat = np.array(embs, dtype=np.float32).reshape(len(texts), -1)
+                return mat / (np.linalg.norm(mat, axis=1, keepdims=True) + 1e-9)
+        elif engine:
             embs = []
             success = True
             for text in texts:
@@ -40,7 +97,9 @@ class StormLogic:
                 embs.append(vec)
             if success:
                 return np.vstack(embs)
-            
+
+        if not fallback and capabilities_of(engine).embed:
+            return None
         return np.vstack([self.get_simple_embedding(t) for t in texts])
 
     def strip_to_structure(self, text):
@@ -54,6 +113,49 @@ class StormLogic:
         words = re.findall(r'\b\w{5,}\b', text)
         return " ".join(words) if words else text
 
+    def embed_channels(self, trajectories, engine=None, embed_models=None, fallback=True):
+        """
+        Normalised embeddings for the Consensus, Semantic and Structure axes, as a
+        list of (matrix, weight) channels. Axes routed to "ngram" in self.axis_embedders
+        are embedded locally as one channel. The rest are fetched from every embedder in
+        self.embed_models concurrently (one batched call each) and each embedder becomes
+        a channel carrying an equal share of the axis weight, so the fused similarity
+        is the per-axis mean over embedders.
+        With fallback=False a failed embedder returns None instead of hash vectors.
+        """
+        embed_models = embed_models or self.embed_models
+        axis_texts = {
+            # Axis 1: Consensus (Standard)
+            "consensus": list(trajectories),
+            # Axis 2: Semantic (Keyword filtered)
+            "semantic": [self.strip_to_keywords(t) for t in trajectories],
+            # Axis 3: Structure (Punctuation filtered)
+            "structure": [self.strip_to_structure(t) for t in trajectories],
+        }
+        n = len(trajectories)
+        remote = [a for a in ("consensus", "semantic", "structure") if self.axis_embedders.get(a) != "ngram"]
+        channels = []
+        if remote:
+            batch = sum((axis_texts[a] for a in remote), [])
+            embedders = [m if isinstance(m, tuple) else (engine, m) for m in embed_models]
+            if len(embedders) == 1:
+                results = [self.get_semantic_embeddings(batch, *embedders[0], fallback=fallback)]
+            else:
+                # Wall time ~ slowest embedder, not the sum
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(embedders)) as executor:
+                    futures = [executor.submit(self.get_semantic_embeddings, batch, e, m, fallback) for e, m in embedders]
+                    results = [f.result() for f in futures]
+            if any(embs is None for embs in results):
+                return None
+            for k, a in enumerate(remote):
+                share = self.weights[a] / len(results)
+                for embs in results:
+                    channels.append((embs[k * n:(k + 1) * n], share))
+        for a in axis_texts:
+            if a not in remote:
+                channels.append((self.ngram_embedder.embed(axis_texts[a]), self.weights[a]))
+        return channels
+
     def calculate_multi_metric_dcx(self, trajectories, model_names, engine=None):
         """
         Calculates DCX across three axes to build a legitimate topography.
@@ -64,26 +166,10 @@ class StormLogic:
         n = len(trajectories)
         if n == 0: return np.array([])
 
-        # Axis 1: Consensus (Standard)
-        emb_cons = self.get_semantic_embeddings(trajectories, engine)
-        sim_cons = np.abs(emb_cons @ emb_cons.T)
-
-        # Axis 2: Semantic (Keyword filtered)
-        keywords = [self.strip_to_keywords(t) for t in trajectories]
-        emb_sem = self.get_semantic_embeddings(keywords, engine)
-        sim_sem = np.abs(emb_sem @ emb_sem.T)
-
-        # Axis 3: Structure (Punctuation filtered)
-        structures = [self.strip_to_structure(t) for t in trajectories]
-        emb_struct = self.get_semantic_embeddings(structures, engine)
-        sim_struct = np.abs(emb_struct @ emb_struct.T)
-
-        # Merge Metrics
-        weighted_sim = (
-            sim_cons * self.weights["consensus"] +
-            sim_sem * self.weights["semantic"] +
-            sim_struct * self.weights["structure"]
-        )
+        # Merge Metrics (one channel per axis and embedder)
+        weighted_sim = np.zeros((n, n), dtype=np.float32)
+        for emb, weight in self.embed_channels(trajectories, engine):
+            weighted_sim += np.abs(emb @ emb.T) * weight
 
         # DCX = 1.0 - Similarity (with Temporal Decay)
         div = 1.0 - weighted_sim
@@ -93,6 +179,61 @@ class StormLogic:
         
         return div * decay
 
+    def calculate_dcx_scores(self, trajectories, model_names, engine=None):
+        """
+        Row means of calculate_multi_metric_dcx without building any N x N matrix.
+        Rows are streamed in tiles sized to self.dcx_memory_mb.
+        """
+        if not trajectories:
+            return np.array([])
+        return self.dcx_row_means(self.embed_channels(trajectories, engine))
+
+    def dcx_row_means(self, channels, groups=None):
+        """
+        Tiled DCX kernel over pre-embedded (matrix, weight) channels (see embed_channels).
+        Per tile: weighted |sim| accumulated in place, 1 - sim, decay, mean.
+        Peak scratch is two (tile x N) float32 buffers.
+        For folded storms, channel rows are group representatives and `groups` is the
+        group id of every trajectory in arrival order. Each trajectory keeps its own
+        arrival index: its row sums div(group_i, b) * sum over b's members j of
+        exp(-lambda*|i-j|), so exact duplicates score as if they had been embedded.
+        """
+        k = channels[0][0].shape[0]
+        n = k if groups is None else len(groups)
+
+        # exp(-lambda*|i-j|) for row i is a window into one (2N-1) vector: zero-copy views
+        ev = np.exp(-self.lambda_val * np.arange(n, dtype=np.float64)).astype(np.float32)
+        ev_full = np.concatenate([ev[:0:-1], ev])
+        decay_rows = np.lib.stride_tricks.sliding_window_view(ev_full, n)[::-1]
+        if groups is not None:
+            groups = np.asarray(groups, dtype=np.int64)
+            # Columns sorted by group, so per-group decay sums are one reduceat per tile
+            order = np.argsort(groups, kind="stable")
+            starts = np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])
+
+        tile = max(1, int(self.dcx_memory_mb * 1024 * 1024) // (8 * n))
+        scores = np.empty(n, dtype=np.float64)
+        for i0 in range(0, n, tile):
+            i1 = min(n, i0 + tile)
+            rows = slice(i0, i1) if groups is None else groups[i0:i1]
+            acc = None
+            for emb, weight in channels:
+                part = emb[rows] @ emb.T
+                np.abs(part, out=part)
+                part *= weight
+                if acc is None:
+                    acc = part
+                else:
+                    acc += part
+            np.subtract(1.0, acc, out=acc)
+            if groups is None:
+                acc *= decay_rows[i0:i1]
+                scores[i0:i1] = acc.mean(axis=1, dtype=np.float64)
+            else:
+                decay = np.add.reduceat(decay_rows[i0:i1][:, order], starts, axis=1, dtype=np.float64)
+                scores[i0:i1] = np.einsum("ij,ij->i", acc, decay) / n
+        return scores
+
     def analyze_storm(self, trajectories, model_names, engine=None, high_thresh=0.85, immortal_sigma=2.0):
         """
         Phase 3 Analysis: Identifies Path A (Stable) and Path B (Candidates).
@@ -100,8 +241,30 @@ class StormLogic:
         if not trajectories:
             return {"status": "VOID", "best_index": -1, "scores": []}
 
-        dcx = self.calculate_multi_metric_dcx(trajectories, model_names, engine)
-        scores = dcx.mean(axis=1) # Connectivity score
+        scores, groups = self.score_storm(trajectories, engine)
+        return self.analyze_scores(scores, high_thresh, immortal_sigma, groups=groups)
+
+    def score_storm(self, trajectories, engine=None, embed_models=None):
+        """
+        DCX row means of a whole storm in one embedding space, folded when self.folder
+        is set. Returns (scores, groups); groups is None without folding.
+        """
+        if self.folder is None:
+            return self.dcx_row_means(self.embed_channels(trajectories, engine, embed_models)), None  # Connectivity score
+
+        # Embed distinct content only; every copy is scored at its own arrival index
+        reps, member_rep, _ = self.folder.fold(trajectories)
+        channels = self.embed_channels([trajectories[i] for i in reps], engine, embed_models)
+        return self.dcx_row_means(channels, groups=member_rep), member_rep
+
+    def analyze_scores(self, scores, high_thresh=0.85, immortal_sigma=2.0, groups=None):
+        """
+        Path A / Path B / Immortal selection from per-trajectory DCX row means.
+        With `groups` (fold ids), Path B prefers one trajectory per group.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if scores.size == 0:
+            return {"status": "VOID", "best_index": -1, "scores": []}
 
         min_dcx = float(np.min(scores))
         max_dcx = float(np.max(scores))
@@ -129,7 +292,19 @@ class StormLogic:
         c_indices = [i for i in range(len(scores)) if i != immortal_index]
         c_scores = sorted([(i, float(scores[i])) for i in c_indices], key=lambda x: x[1])
         
-        top_3 = [i for i, _ in c_scores[:3]]
+        if groups is None:
+            top_3 = [i for i, _ in c_scores[:3]]
+        else:
+            seen = set()
+            top_3 = []
+            for i, _ in c_scores:
+                if groups[i] not in seen:
+                    seen.add(groups[i])
+                    top_3.append(i)
+                if len(top_3) == 3:
+                    break
+            # Fewer than 3 distinct groups: pad with copies so synthesis still gets 3 texts
+            top_3 += [i for i, _ in c_scores if i not in top_3][:3 - len(top_3)]
 
         return {
             "status": "COLLAPSED",
@@ -138,9 +313,15 @@ class StormLogic:
             "immortal_index": immortal_index,
             "min_dcx": min_dcx,
             "max_dcx": max_dcx,
-            "scores": scores.tolist()
+            "scores": scores.tolist(),
+            "distinct_count": len(set(groups.tolist())) if groups is not None else len(scores),
+            "jl_distortion": self.projector.distortion_bound(len(scores)) if self.projector is not None else 0.0
         }
 
+    def new_incremental_storm(self, engine=None, embed_models=None):
+        """Scoring state that is updated as each trajectory lands (see IncrementalStorm)."""
+        return IncrementalStorm(self, engine=engine, embed_models=embed_models)
+
     def semantic_synthesis(self, mascot_engine, top_3_texts, original_prompt):
         """Mascot Collapse Operator (Ch. 14)."""
         synthesis_prompt = (
@@ -177,6 +358,243 @@ class StormLogic:
         similarities = [np.dot(embs[0], src) for src in embs[1:]]
         return float(np.mean(similarities))
 
+    def embedding_cache_stats(self):
+        """Hit/miss counters of the shared embedding cache."""
+        return self.embed_cache.stats()
+
+class IncrementalStorm:
+    """
+    Running multi-metric DCX for a storm whose trajectories arrive one at a time.
+    Each add() embeds the engine-backed axes of the new trajectory in one request per embedder and
+    folds its row/column into the DCX row sums in O(N*d), so result() is available
+    instantly and matches StormLogic.analyze_storm over the same arrival order.
+    With StormLogic.folder set, duplicates of an earlier trajectory skip embedding and
+    reuse their group's vectors; row sums stay per trajectory, so each copy keeps its
+    own arrival index in the temporal decay.
+    Concurrent add() calls are serialized: arrival order is the order add() is entered.
+    Engines without the embed capability (e.g. GGML) are scored on hash vectors from
+    the first trajectory on, as is the whole storm when a real embedder already fails
+    on the first one. If a later request fails or returns vectors of another
+    dimension, the running state is dropped and scores/result() rescore the whole
+    storm in one batch (StormLogic.score_storm), so hash and model vectors are
+    never mixed.
+    """
+    def __init__(self, logic, engine=None, embed_models=None):
+        self.logic = logic
+        self.engine = engine
+        self.embed_models = embed_models
+        self.trajectories = []
+        self.model_names = []
+        self._lock = threading.Lock()          # Running state vs. readers (scores, result)
+        self._add_lock = threading.Lock()      # One add() at a time: fold, embed and slot in one section
+        self._batch = None                     # (n, scores, groups) once the running state is dropped
+        self._hash_space = False               # Embedder failed on the first trajectory: hash vectors only
+        self._axes = None          # One (capacity, d) matrix per embed_channels channel
+        self._channel_weights = None
+        self._row_sums = np.zeros(0, dtype=np.float64)   # Per trajectory
+        self._plain_sums = np.zeros(0, dtype=np.float64) # Per trajectory, without the temporal decay
+        self._keys = []            # Content key per trajectory: fold group, or the text itself
+        self._groups = 0
+        self._member_group = np.zeros(0, dtype=np.int64)
+        self._fold = logic.folder.new_index() if logic.folder is not None else None
+        self._last_checkpoint = None
+        self._stable_waves = 0
+        self.stopped_early_at = None
+
+    def __len__(self):
+        return len(self.trajectories)
+
+    def _grow(self, dims):
+        k = self._groups
+        if self._axes is None:
+            self._axes = [np.zeros((16, d), dtype=np.float32) for d in dims]
+        elif k >= self._axes[0].shape[0]:
+            cap = self._axes[0].shape[0] * 2
+            self._axes = [np.vstack([a, np.zeros((cap - a.shape[0], a.shape[1]), dtype=np.float32)]) for a in self._axes]
+
+    def _grow_members(self):
+        n = len(self.trajectories)
+        if n >= self._row_sums.shape[0]:
+            cap = max(16, self._row_sums.shape[0] * 2)
+            self._plain_sums = np.concatenate([self._plain_sums, np.zeros(cap - self._row_sums.shape[0])])
+            self._row_sums = np.concatenate([self._row_sums, np.zeros(cap - self._row_sums.shape[0])])
+            self._member_group = np.concatenate([self._member_group, np.zeros(cap - self._member_group.shape[0], dtype=np.int64)])
+
+    def _divergence(self, g):
+        """1 - weighted |sim| of group g against every group, O(K*d)."""
+        k = self._groups
+        weighted_sim = np.zeros(k, dtype=np.float64)
+        for axis, weight in zip(self._axes, self._channel_weights):
+            weighted_sim += np.abs(axis[:k] @ axis[g]) * weight
+        return 1.0 - weighted_sim
+
+    def add(self, text, model_name=None):
+        """Embeds and scores one trajectory. Returns its storm index."""
+        with self._add_lock:
+            if self._batch is None and self._add_running(text, model_name):
+                return len(self.trajectories) - 1
+            with self._lock:
+                self.trajectories.append(text)
+                self.model_names.append(model_name)
+                return len(self.trajectories) - 1
+
+    def _add_running(self, text, model_name):
+        """
+        Folds the next trajectory into the running state (caller holds _add_lock).
+        Returns False if the running state had to be dropped instead.
+        """
+        if self._fold is not None:
+            g, is_new = self._fold.assign(text)
+        else:
+            g, is_new = None, True
+
+        embs = None
+        if is_new:
+            if self._hash_space:
+                channels = self.logic.embed_channels([text], None, self._hash_models())
+            else:
+                channels = self.logic.embed_channels([text], self.engine, self.embed_models, fallback=False)
+            if channels is None and self._axes is None:
+                # Embedder down from the start: the whole storm is scored on hash vectors
+                print("[Storm] Embedder unavailable; scoring this storm on hash vectors.")
+                self._hash_space = True
+                channels = self.logic.embed_channels([text], None, self._hash_models())
+            dims = None if channels is None else [emb.shape[1] for emb, _ in channels]
+            if dims is None or (self._axes is not None and dims != [a.shape[1] for a in self._axes]):
+                self._drop_running_state()
+                return False
+            embs = [emb[0] for emb, _ in channels]
+
+        with self._lock:
+            n = len(self.trajectories)
+            if is_new:
+                self._grow([e.shape[0] for e in embs])
+                self._channel_weights = [w for _, w in channels]
+                g = self._groups
+                for axis, vec in zip(self._axes, embs):
+                    axis[g] = vec
+                self._groups += 1
+            self._grow_members()
+            self._member_group[n] = g
+            div = self._divergence(g)
+
+            # Trajectory n's column adds div * exp(-lambda*(n-j)) to every row j <= n (self included);
+            # its own row is the sum of that column, div being symmetric
+            decay = np.exp(-self.logic.lambda_val * np.arange(n, -1, -1, dtype=np.float64))
+            contrib = div[self._member_group[:n + 1]] * decay
+            self._row_sums[:n + 1] += contrib
+            self._row_sums[n] = contrib.sum()
+            plain = div[self._member_group[:n + 1]]
+            self._plain_sums[:n + 1] += plain
+            self._plain_sums[n] = plain.sum()
+            self._keys.append(g if self._fold is not None else text)
+            self.trajectories.append(text)
+            self.model_names.append(model_name)
+        return True
+
+    def _hash_models(self):
+        """embed_models with their engines stripped, so embed_channels hashes every channel."""
+        return [m[1] if isinstance(m, tuple) else m for m in (self.embed_models or self.logic.embed_models)]
+
+    def _drop_running_state(self):
+        print(f"[Storm] Embedding failed or changed dimension at trajectory {len(self.trajectories)}; "
+              f"rescoring the storm in one batch at collapse.")
+        with self._lock:
+            self._batch = (-1, None, None)
+            self._axes = None
+            self._row_sums = np.zeros(0, dtype=np.float64)
+            self._plain_sums = np.zeros(0, dtype=np.float64)
+            self._keys = []
+            self._member_group = np.zeros(0, dtype=np.int64)
+
+    def _batch_scores(self):
+        """(scores, groups) of the whole storm from StormLogic.score_storm, cached per storm size."""
+        with self._lock:
+            trajectories = list(self.trajectories)
+            cached_n, scores, groups = self._batch
+        if cached_n != len(trajectories):
+            scores, groups = self.logic.score_storm(trajectories, self.engine, self.embed_models)
+            with self._lock:
+                self._batch = (len(trajectories), scores, groups)
+        return scores, groups
+
+    @property
+    def scores(self):
+        if self._batch is not None:
+            if not self.trajectories:
+                return np.array([])
+            return self._batch_scores()[0]
+        with self._lock:
+            n = len(self.trajectories)
+            if not n:
+                return np.array([])
+            return self._row_sums[:n] / n
+
+    def _stability_state(self):
+        """
+        (top-k content keys, mean, std, basin share) of the decay-free divergence row
+        means. The temporal decay favours the newest arrival, so the stopping rule
+        watches scores and a leading set that do not depend on arrival order. The
+        basin share is the fraction of trajectories within basin_radius of Path A.
+        """
+        rule = self.logic.early_stop
+        with self._lock:
+            n = len(self.trajectories)
+            plain = self._plain_sums[:n] / n
+            keys = list(self._keys)
+            order = np.argsort(plain, kind="stable")
+            div = self._divergence(self._member_group[order[0]])
+            share = float(np.mean(div[self._member_group[:n]] < rule["basin_radius"]))
+        leading = []
+        for i in order:
+            if keys[i] not in leading:
+                leading.append(keys[i])
+                if len(leading) == rule["top_k"]:
+                    break
+        return frozenset(leading), float(plain.mean()), float(plain.std()), share
+
+    def checkpoint(self):
+        """
+        Sequential stopping rule, called after each wave. Returns True once the
+        storm agrees on one basin (at least min_basin_share of it within basin_radius
+        of Path A) and the leading top_k distinct contents and the decay-free
+        divergence distribution (mean, std) have held steady for `patience`
+        consecutive waves past `min_trajectories`. Diverse storms run to the end.
+        """
+        rule = self.logic.early_stop
+        if self._batch is not None:
+            return False  # No running scores to watch; the storm runs to the end
+        if not len(self):
+            return False
+        state = self._stability_state()
+        prev, self._last_checkpoint = self._last_checkpoint, state
+        if prev is None:
+            return False
+
+        steady = (
+            state[3] >= rule["min_basin_share"] and
+            state[0] == prev[0] and
+            abs(state[1] - prev[1]) < rule["tolerance"] and
+            abs(state[2] - prev[2]) < rule["tolerance"]
+        )
+        self._stable_waves = self._stable_waves + 1 if steady else 0
+        if self._stable_waves >= rule["patience"] and len(self) >= rule["min_trajectories"]:
+            self.stopped_early_at = len(self)
+            return True
+        return False
+
+    def result(self, high_thresh=0.85, immortal_sigma=2.0):
+        """Same dict as StormLogic.analyze_storm, from the running state."""
+        if self._batch is not None:
+            if not self.trajectories:
+                return self.logic.analyze_scores([], high_thresh, immortal_sigma)
+            scores, groups = self._batch_scores()
+            return self.logic.analyze_scores(scores, high_thresh, immortal_sigma, groups=groups)
+        with self._lock:
+            n = len(self.trajectories)
+            groups = self._member_group[:n].copy() if self._fold is not None else None
+        return self.logic.analyze_scores(self.scores, high_thresh, immortal_sigma, groups=groups)
+
 class NumpyEncoder(json.JSONEncoder):
     """Integrated Numpy-Safe Encoder."""
     def default(self, obj):
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class NgramHashEmbedder:
+    """
+    In-process character n-gram hashing embedder (NumPy only, batched).
+    Used for the Structure axis (punctuation signatures) and optionally the
+    Semantic axis, so those strings never leave the process.
+    All n-grams of a batch are hashed into `dim` buckets in one vectorised pass:
+    codepoints -> rolling polynomial ids -> multiply-shift hash -> bincount.
+    """
+    _PRIME = np.uint64(1000003)
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, dim=256, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._shift = np.uint64(64 - int(np.ceil(np.log2(dim))))
+
+    def embed(self, texts):
+        """Returns an (N, dim) float32 matrix of L2-normalised, sublinear-tf vectors."""
+        n = len(texts)
+        out = np.zeros((n, self.dim), dtype=np.float32)
+        if n == 0:
+            return out
+
+        lengths = np.array([len(t) for t in texts], dtype=np.int64)
+        total = int(lengths.sum())
+        if total == 0:
+            return out
+        codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        offset = np.arange(total, dtype=np.int64) - starts   # Position inside its own text
+
+        counts = np.zeros(n * self.dim, dtype=np.float64)
+        ids = np.zeros(total, dtype=np.uint64)
+        lo, hi = self.ngram_range
+        with np.errstate(over="ignore"):
+            for k in range(1, hi + 1):
+                # ids[i] covers codes[i-k+1 .. i]; only valid where the n-gram stays inside one text
+                if k == 1:
+                    ids[:] = codes
+                else:
+                    ids[k - 1:] = ids[k - 2:-1] * self._PRIME + codes[k - 1:]
+                if k < lo:
+                    continue
+                valid = offset >= (k - 1)
+                buckets = ((ids[valid] + np.uint64(k)) * self._MIX) >> self._shift
+                buckets = (buckets % np.uint64(self.dim)).astype(np.int64)
+                counts += np.bincount(rows[valid] * self.dim + buckets, minlength=n * self.dim)
+
+        out = np.log1p(counts).reshape(n, self.dim).astype(np.float32)
+        return out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-9)
@@ -0,0 +1,61 @@
+import hashlib
+import threading
+import numpy as np
+
+
+class RandomProjector:
+    """
+    Johnson-Lindenstrauss random projection for storm embeddings.
+    Reduces d-dimensional model vectors to k dims before the DCX similarity
+    products. The Gaussian matrix is seeded per (embed model, d, k) and cached,
+    so every storm with the same embed model projects into the same space.
+    """
+    def __init__(self, k=128, seed=1337):
+        self.k = k
+        self.seed = seed
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def cache_tag(self, embed_model):
+        """Embedding-cache model key for projected vectors (they never mix with raw ones)."""
+        return f"{embed_model}|jl{self.k}:{self.seed}"
+
+    def matrix(self, embed_model, dim):
+        key = (embed_model, dim)
+        with self._lock:
+            mat = self._matrices.get(key)
+            if mat is None:
+                digest = hashlib.sha256(f"{self.seed}:{embed_model}:{dim}:{self.k}".encode()).digest()
+                rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+                mat = (rng.standard_normal((dim, self.k)) / np.sqrt(self.k)).astype(np.float32)
+                self._matrices[key] = mat
+            return mat
+
+    def project(self, embed_model, vectors):
+        """(N, d) -> (N, k), unit-normalised. Vectors already at or below k dims pass through."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] <= self.k:
+            return vectors
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9)
+        out = vectors @ self.matrix(embed_model, vectors.shape[1])
+        return out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-9)
+
+    def distortion_bound(self, n_points):
+        """
+        Expected JL distortion eps for n points at k dims (Dasgupta-Gupta bound,
+        k >= 4 ln n / (eps^2/2 - eps^3/3)): pairwise distances and, for unit
+        vectors, cosine similarities are preserved to within about eps.
+        """
+        if n_points < 2:
+            return 0.0
+        target = 4.0 * np.log(n_points) / self.k
+        lo, hi = 0.0, 1.0
+        if hi ** 2 / 2 - hi ** 3 / 3 < target:
+            return 1.0  # k too small for any guarantee below 1
+        for _ in range(50):
+            mid = (lo + hi) / 2
+            if mid ** 2 / 2 - mid ** 3 / 3 < target:
+                lo = mid
+            else:
+                hi = mid
+        return float(hi)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app modules (storm_logic, research.*) from the prompt theator folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from research.mock_ollama import MockConfig, MockOllamaServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**config):
+        server = MockOllamaServer(MockConfig(**config))
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,19 @@
+from research.engine_v1 import SimpleEngineV1
+from research.generation_cache import GenerationCache
+
+
+def test_generate_response_marks_cache_replays(mock_server, tmp_path):
+    server = mock_server()
+    engine = SimpleEngineV1(base_url=server.base_url)
+    engine.generation_cache = GenerationCache(path=str(tmp_path / "generations.sqlite"))
+    options = {"seed": 7, "num_predict": 16}
+
+    first = engine.generate_response("Tell a story.", model="qwen2.5:0.5b", options=options, timeout=10)
+    replay = engine.generate_response("Tell a story.", model="qwen2.5:0.5b", options=options, timeout=10)
+
+    assert "cached" not in first
+    assert replay["cached"] is True
+    assert replay["response"] == first["response"]
+    # Only the returned copy is flagged; the stored entry stays as generated
+    key = engine._generation_key("qwen2.5:0.5b", "Tell a story.", options, True)
+    assert "cached" not in engine.generation_cache.get(key)
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from research.engine_v3 import AsyncEngineV3
+
+
+async def collect(engine, n):
+    return [item async for item in engine.storm("Tell a story.", n, model="qwen2.5:0.5b",
+                                                 options=lambda i: {"seed": i, "num_predict": 16}, timeout=10)]
+
+
+@pytest.mark.parametrize("drop_mid_chunk", [False, True])
+def test_storm_survives_streams_cut_off_mid_response(mock_server, drop_mid_chunk):
+    server = mock_server(drop_rate=1.0, drop_mid_chunk=drop_mid_chunk)
+    engine = AsyncEngineV3(base_url=server.base_url, timeout=10)
+    results = asyncio.run(collect(engine, 5))
+    # Every trajectory lands, each as a stream error rather than silently truncated text
+    assert sorted(i for i, _ in results) == list(range(5))
+    assert all(text == "<API ERROR: Connection closed mid-stream>" for _, text in results)
+
+
+def test_storm_returns_every_trajectory_without_drops(mock_server):
+    server = mock_server()
+    engine = AsyncEngineV3(base_url=server.base_url, timeout=10)
+    results = asyncio.run(collect(engine, 5))
+    assert sorted(i for i, _ in results) == list(range(5))
+    assert not any(text.startswith("<API ERROR") for _, text in results)
@@ -0,0 +1,47 @@
+import random
+
+from storm_dedup import TrajectoryFolder
+
+# Zipf-weighted vocabulary so texts share common words the way same-prompt trajectories do
+VOCAB = [f"w{i}" for i in range(400)]
+WEIGHTS = [1 / (i + 1) for i in range(400)]
+
+
+def words(rng, n):
+    return rng.choices(VOCAB, WEIGHTS, k=n)
+
+
+def single_word_edit(rng, text):
+    edited = list(text)
+    j = rng.randrange(len(edited))
+    op = rng.choice("sid")
+    if op == "s":
+        edited[j] = rng.choice(VOCAB)
+    elif op == "i":
+        edited.insert(j, rng.choice(VOCAB))
+    else:
+        del edited[j]
+    return edited
+
+
+def fold_rate(pairs):
+    folder = TrajectoryFolder()
+    return sum(len(folder.fold([" ".join(a), " ".join(b)])[0]) == 1 for a, b in pairs) / len(pairs)
+
+
+def test_single_word_edits_fold():
+    rng = random.Random(0)
+    pairs = []
+    for _ in range(50):
+        base = words(rng, 60)
+        pairs.append((base, single_word_edit(rng, base)))
+    assert fold_rate(pairs) >= 0.9
+
+
+def test_texts_sharing_only_an_opening_do_not_fold():
+    rng = random.Random(1)
+    pairs = []
+    for _ in range(50):
+        base = words(rng, 60)
+        pairs.append((base, base[:30] + words(rng, 30)))
+    assert fold_rate(pairs) == 0.0
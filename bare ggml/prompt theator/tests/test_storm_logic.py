@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from research.embedding_cache import EmbeddingCache
+from research.engine_protocol import Engine
+from storm_benchmark import FakeEmbeddingEngine, synthetic_storm
+from storm_logic import StormLogic
+
+
+def make_logic(fold=True):
+    logic = StormLogic()
+    logic.embed_cache = EmbeddingCache(persist=False)
+    if not fold:
+        logic.folder = None
+    return logic
+
+
+def stop_point(logic, trajectories, engine):
+    """Trajectory count at which the adaptive rule stops the storm, or None."""
+    storm = logic.new_incremental_storm(engine=engine)
+    wave = logic.early_stop["wave_size"]
+    for i, text in enumerate(trajectories):
+        storm.add(text, "test")
+        if (i + 1) % wave == 0 and storm.checkpoint():
+            return i + 1
+    return None
+
+
+def near_identical_storm(n, seed=0):
+    """~70% copies of one answer, the rest single-word edits of it, shuffled."""
+    rng = random.Random(seed)
+    base = synthetic_storm(1, seed=seed, dup_rate=0.0)[0].split()
+    out = []
+    for _ in range(n):
+        words = list(base)
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words))] = f"edit{rng.randrange(10**6)}"
+        out.append(" ".join(words))
+    return out
+
+
+@pytest.mark.parametrize("fold", [True, False])
+def test_early_stop_fires_on_near_identical_storm(fold):
+    logic = make_logic(fold)
+    stopped = stop_point(logic, near_identical_storm(100), FakeEmbeddingEngine(dim=64))
+    assert stopped is not None
+    assert stopped <= 50  # A fraction of the budget
+
+
+@pytest.mark.parametrize("fold", [True, False])
+def test_early_stop_fires_on_identical_storm(fold):
+    text = synthetic_storm(1, seed=3, dup_rate=0.0)[0]
+    assert stop_point(make_logic(fold), [text] * 100, FakeEmbeddingEngine(dim=64)) is not None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_early_stop_does_not_fire_on_diverse_storm(seed):
+    storm = synthetic_storm(100, seed=seed, dup_rate=0.0)
+    assert stop_point(make_logic(), storm, FakeEmbeddingEngine(dim=64)) is None
+
+
+class FlakyEmbeddingEngine(FakeEmbeddingEngine):
+    """Real embedder whose batch requests start failing after `ok_requests`."""
+    def __init__(self, ok_requests):
+        super().__init__(dim=64)
+        self.ok_requests = ok_requests
+        self.calls = 0
+
+    def get_embeddings(self, texts, embed_model="nomic-embed-text", batch_size=32):
+        self.calls += 1
+        if self.calls > self.ok_requests:
+            return None
+        return super().get_embeddings(texts, embed_model, batch_size)
+
+
+def run_incremental(logic, trajectories, engine):
+    storm = logic.new_incremental_storm(engine=engine)
+    for text in trajectories:
+        storm.add(text, "test")
+    return storm
+
+
+def test_engine_without_embeddings_stays_incremental():
+    # e.g. the GGML backend: get_embeddings() returns None by design
+    trajectories = synthetic_storm(30, seed=4, dup_rate=0.2)
+    logic = make_logic()
+    storm = run_incremental(logic, trajectories, Engine())
+    assert storm._batch is None
+    expected = logic.analyze_storm(trajectories, ["test"] * 30, engine=Engine())["scores"]
+    assert storm.result()["scores"] == pytest.approx(expected, abs=1e-6)
+
+
+def test_embedder_down_from_start_scores_on_hash_vectors():
+    trajectories = synthetic_storm(30, seed=4, dup_rate=0.2)
+    logic = make_logic()
+    storm = run_incremental(logic, trajectories, FlakyEmbeddingEngine(ok_requests=0))
+    assert storm._batch is None
+    expected = logic.analyze_storm(trajectories, ["test"] * 30, engine=Engine())["scores"]
+    assert storm.result()["scores"] == pytest.approx(expected, abs=1e-6)
+
+
+def test_embedder_failing_mid_storm_rescores_in_one_batch():
+    trajectories = synthetic_storm(30, seed=4, dup_rate=0.2)
+    storm = run_incremental(make_logic(), trajectories, FlakyEmbeddingEngine(ok_requests=5))
+    assert storm._batch is not None
+    assert not storm.checkpoint()
+    assert len(storm.result()["scores"]) == 30
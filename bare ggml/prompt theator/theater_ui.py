@@ -8,6 +8,9 @@ import time
 import numpy as np
 import json
 import re
+from research.engine_protocol import get_engine, capabilities_of
+from research.concurrency import get_limiter, Hedger
+from research.residency import ModelResidencyManager
 
 class NumpyEncoder(json.JSONEncoder):
     """Custom encoder to handle NumPy types for JSON serialization."""
@@ -30,9 +33,24 @@ WIN_DARK_GREY = "#808080"
 COMIC_FONT = ("Comic Sans MS", 10, "bold")
 CONSOLE_FONT = ("Consolas", 10)
 
+# Backend menu label -> research.engine_protocol registry name
+ENGINE_CHOICES = {"Ollama (Standard)": "ollama", "GGML Native (CDLSS)": "ggml"}
+
+# Ollama storms at or above this size stream through AsyncEngineV3 instead of a thread pool
+ASYNC_STORM_MIN_N = 16
+
+# In-flight calls per stage lane (the storm lane is governed by its adaptive limiter)
+MASCOT_LANE = 2
+EMBED_LANE = 2
+
+def generation_failed(text):
+    """Engine error strings (SimpleEngineV1 / AsyncEngineV3) carry no trajectory."""
+    return not text or text.startswith(("<API ERROR", "<ERROR"))
+
 class PromptTheatorUI:
     def __init__(self, root):
         self._force_collapse = threading.Event()
+        self.storm_hedger = None  # Hedger of the last async storm, set by iter_storm
         self.root = root
         self.root.title("PROMPT THEATOR v1.0 - [Registered]")
         self.root.geometry("900x700")
@@ -54,7 +72,7 @@ class PromptTheatorUI:
         # Engine Control
         tk.Label(left_panel, text="Backend Engine:", bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w", pady=(10,0))
         self.engine_var = tk.StringVar(value="Ollama (Standard)")
-        self.engine_menu = ttk.Combobox(left_panel, textvariable=self.engine_var, values=["Ollama (Standard)", "GGML Native (CDLSS)"], state="readonly")
+        self.engine_menu = ttk.Combobox(left_panel, textvariable=self.engine_var, values=list(ENGINE_CHOICES), state="readonly")
         self.engine_menu.pack(fill="x", padx=5)
         self.engine_menu.bind("<<ComboboxSelected>>", self.on_engine_change)
 
@@ -68,11 +86,13 @@ class PromptTheatorUI:
         self.model_var = tk.StringVar(value="Scanning...")
         self.model_menu = ttk.Combobox(left_panel, textvariable=self.model_var, state="readonly")
         self.model_menu.pack(fill="x", padx=5)
+        self.model_menu.bind("<<ComboboxSelected>>", self.warm_models)
 
         tk.Label(left_panel, text="Mascot (Collapse):", bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w", pady=(10,0))
         self.mascot_var = tk.StringVar(value="Scanning...")
         self.mascot_menu = ttk.Combobox(left_panel, textvariable=self.mascot_var, state="readonly")
         self.mascot_menu.pack(fill="x", padx=5)
+        self.mascot_menu.bind("<<ComboboxSelected>>", self.warm_models)
         
         # --- Phase 2 Parameters ---
         tk.Label(left_panel, text="Trajectories (N):", bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w", pady=(15,0))
@@ -93,8 +113,9 @@ class PromptTheatorUI:
                                         values=[0,128, 256, 512, 1024, 2048, 4096, 8192,99999], state="readonly")
         self.tokens_menu.pack(fill="x", padx=5)
 
-        tk.Label(left_panel, text="Storm Intensity (Concurrency):", bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w", pady=(10,0))
-        self.workers_var = tk.IntVar(value=1)
+        # Ceiling only: the adaptive limiter (research.concurrency) picks the actual concurrency
+        tk.Label(left_panel, text="Storm Intensity (Max Concurrency):", bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w", pady=(10,0))
+        self.workers_var = tk.IntVar(value=16)
         self.workers_menu = ttk.Combobox(left_panel, textvariable=self.workers_var, 
                                         values=[1, 2, 3, 4, 5, 6, 7, 8, 12, 16], state="readonly")
         self.workers_menu.pack(fill="x", padx=5)
@@ -127,6 +148,12 @@ class PromptTheatorUI:
         self.toggle_synth = tk.BooleanVar(value=True)
         tk.Checkbutton(left_panel, text="Semantic Synthesis", variable=self.toggle_synth, bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w")
 
+        self.toggle_adaptive = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Adaptive Storm (Early Stop)", variable=self.toggle_adaptive, bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w")
+
+        self.toggle_hedge = tk.BooleanVar(value=True)
+        tk.Checkbutton(left_panel, text="Hedge Stragglers", variable=self.toggle_hedge, bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w")
+
         self.toggle_recursive = tk.BooleanVar(value=False)
         tk.Checkbutton(left_panel, text="Recursive Depth (x2)", variable=self.toggle_recursive, bg=WIN_GREY, font=COMIC_FONT).pack(anchor="w")
 
@@ -200,16 +227,16 @@ class PromptTheatorUI:
         
         # Load Phase 1 & 2 modules
         try:
-            from research.engine_v1 import SimpleEngineV1
-            from research.engine_ggml import GGMLEngineV1
             from bio_log_manager import BioLogManager
             from storm_logic import StormLogic
             from persona_manager import PersonaManager
             
-            self.engine_v1 = SimpleEngineV1()
-            self.engine_ggml = GGMLEngineV1()
+            self.engine_v1 = get_engine("ollama")
+            self.engine_ggml = get_engine("ggml")
+            self.engine_v3 = get_engine("ollama-async", base_url=self.engine_v1.base_url)
             self.engine = self.engine_v1
-            self.mascot_engine = self.engine_v1 # Mascot uses its own instance
+            # Main, mascot and embedding models stay pinned on the Ollama server for the session
+            self.residency = ModelResidencyManager(self.engine_v1)
             self.logic = StormLogic()
             base_dir = os.path.dirname(os.path.abspath(__file__))
             self.pm = PersonaManager(characters_dir=os.path.join(base_dir, "characters"))
@@ -225,6 +252,7 @@ class PromptTheatorUI:
             self.log_sys(f"ERROR: {e}")
 
         self.refresh_models()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def add_right_click(self, widget):
         """Adds standard Windows right-click context menu."""
@@ -240,10 +268,7 @@ class PromptTheatorUI:
         widget.bind("<Button-3>", show_menu)
 
     def on_engine_change(self, event=None):
-        if self.engine_var.get() == "GGML Native (CDLSS)":
-            self.engine = self.engine_ggml
-        else:
-            self.engine = self.engine_v1
+        self.engine = get_engine(ENGINE_CHOICES[self.engine_var.get()])
         self.refresh_models()
 
     def clear_context(self):
@@ -347,6 +372,33 @@ class PromptTheatorUI:
         if models and (current_mascot not in models or current_mascot == "Scanning..."):
             self.mascot_var.set(models[0])
 
+        self.warm_models()
+
+    def warm_models(self, event=None):
+        """Preloads and pins the selected main, mascot and embedding models in the background."""
+        if not hasattr(self, 'residency') or self.engine is not self.engine_v1:
+            return
+        roles = {"storm": self.model_var.get(), "mascot": self.mascot_var.get()}
+        for i, embed_model in enumerate(self.logic.embed_models):
+            roles["embed" if i == 0 else f"embed{i + 1}"] = embed_model
+
+        def warm():
+            report = self.residency.warm(roles)
+            if report["loaded"]:
+                loads = ", ".join(f"{m} {t:.1f}s" for m, t in sorted(report["loaded"].items()))
+                self.log_sys(f"Models resident & pinned: {loads}")
+            for model, err in sorted(report["failed"].items()):
+                self.log_sys(f"WARM-UP FAILED for {model}: {err}")
+            for warning in report["warnings"]:
+                self.log_sys(f"RESIDENCY WARNING: {warning}")
+
+        threading.Thread(target=warm, daemon=True).start()
+
+    def on_close(self):
+        if hasattr(self, 'residency'):
+            self.residency.release()
+        self.root.destroy()
+
     def force_collapse(self):
         """Signals the running storm to stop and collapse on what it has."""
         self._force_collapse.set()
@@ -434,6 +486,11 @@ class PromptTheatorUI:
             main_model = self.model_var.get()
             mascot_model = self.mascot_var.get()
             recursive = self.toggle_recursive.get()
+            storm_engine, mascot_engine, embed_engine, audit_engine = self.stage_engines(main_model, mascot_model)
+
+            if self.engine is self.engine_v1:
+                for warning in self.residency.check():
+                    self.log_sys(f"RESIDENCY WARNING: {warning}")
             
             # Construct context
             active_context = self.bio_log.get_context_for_llm()
@@ -447,7 +504,9 @@ class PromptTheatorUI:
                     mem_block = "\n".join([f"[GHOST MEMORY]: Q: {m['prompt'][:60]}... A: {m['response'][:60]}..." for m in ghosts])
                     ghost_context = f"LONG-TERM ARCHIVE (GHOST MEMORIES):\n{mem_block}\n\n"
             
-            context = f"{ghost_context}{active_context}"
+            # Prompt-dependent ghosts go last so persona + rolling context stay a stable,
+            # server-cacheable prefix across storms
+            context = f"{active_context}{ghost_context}"
             
             # --- Persona Wrapping (Phase 5) ---
             current_persona = self.persona_var.get()
@@ -468,7 +527,8 @@ class PromptTheatorUI:
                     "mascot": mascot_model,
                     "trajectories": n,
                     "temp": temp,
-                    "recursive": recursive
+                    "recursive": recursive,
+                    "adaptive": self.toggle_adaptive.get()
                 },
                 "recursive_stage": None,
                 "final_storm": {}
@@ -484,18 +544,22 @@ class PromptTheatorUI:
                 self.progress['maximum'] = n
                 self.log_sys(f"Storming {n} initial thoughts...")
                 
+                limiter = self.storm_limiter(main_model)
+                self.prefill_storm(full_raw_prompt, n, storm_engine)
                 def run_path(p_idx):
-                    self.log_sys(f"- Thought Path {p_idx+1}/{n}...")
-                    return self.engine.generate(full_raw_prompt, temperature=temp, num_predict=tokens)
-
-                concurrency_cap = self.workers_var.get()
-                with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency_cap) as executor:
+                    with limiter.slot() as slot:
+                        self.log_sys(f"- Thought Path {p_idx+1}/{n}...")
+                        res = storm_engine.generate(full_raw_prompt, temperature=temp, num_predict=tokens)
+                        slot.work = len(res or "")
+                        slot.ok = not generation_failed(res)
+                    return res
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=limiter.max_limit) as executor:
                     futures = [executor.submit(run_path, i) for i in range(n)]
                     refine_trajs = [f.result() for f in futures]
                 
                 self.log_sys("Synthesizing Refined Intent via Mascot...")
-                self.mascot_engine.set_model(mascot_model)
-                current_prompt = self.logic.generate_refined_prompt(self.mascot_engine, refine_trajs, prompt)
+                current_prompt = self.logic.generate_refined_prompt(mascot_engine, refine_trajs, prompt)
                 self.log_sys(f"REFINED PROMPT: {current_prompt[:100]}...")
                 
                 audit_data["recursive_stage"] = {
@@ -516,52 +580,53 @@ class PromptTheatorUI:
             model_names = []
             self.progress['maximum'] = n + 2
             
-            self.log_sys(f"Storming {n} trajectories via {main_model} (Con: {self.workers_var.get()})...")
-            self.engine.set_model(main_model)
+            limiter = self.storm_limiter(main_model)
+            self.log_sys(f"Storming {n} trajectories via {main_model} "
+                         f"(Con: adaptive from {limiter.limit}, cap {limiter.max_limit})...")
+            self.prefill_storm(full_prompt, n, storm_engine)
             
-            completed = 0
-            def run_single_path(idx):
-                nonlocal completed
-                self.log_sys(f"- Starting Path {idx+1}/{n}...")
-                if self.engine_var.get() == "GGML Native (CDLSS)":
-                    res = self.engine.generate(
-                        full_prompt, 
-                        temperature=temp, 
-                        num_predict=tokens, 
-                        num_thread=self.threads_var.get(),
-                        cdlss_trajectories=n,
-                        cdlss_dcx=float(self.dcx_high.get())
-                    )
-                else:
-                    res = self.engine.generate(full_prompt, temperature=temp, num_predict=tokens, num_thread=self.threads_var.get())
-                completed += 1
-                self.root.after(0, lambda: self.progress.configure(value=completed))
-                return res
-
-            concurrency_cap = self.workers_var.get()
-            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency_cap) as executor:
-                futures = [executor.submit(run_single_path, i) for i in range(n)]
-                for f in concurrent.futures.as_completed(futures):
-                    result_traj = f.result()
-                    if result_traj:
-                        trajectories.append(result_traj)
-                        model_names.append(main_model)
-                    # Check for manual collapse after each trajectory lands
-                    if self._force_collapse.is_set():
-                        self.log_sys(f"!! Collapse triggered with {len(trajectories)}/{n} trajectories collected.")
-                        # Cancel remaining futures
-                        for pending in futures:
-                            pending.cancel()
-                        break
+            # DCX is scored as trajectories land, overlapping embedding with generation
+            storm = self.logic.new_incremental_storm(engine=embed_engine)
+            adaptive = self.toggle_adaptive.get()
+            wave_size = self.logic.early_stop["wave_size"]
+
+            landed_results = self.iter_storm(storm_engine, full_prompt, n, temp, tokens,
+                                             hedge=self.toggle_hedge.get())
+            landed = 0
+            for result_traj in landed_results:
+                landed += 1
+                if result_traj:
+                    trajectories.append(result_traj)
+                    model_names.append(main_model)
+                    storm.add(result_traj, main_model)
+                # Adaptive mode: test the stopping rule once per wave
+                if adaptive and landed % wave_size == 0 and storm.checkpoint():
+                    self.log_sys(f"Adaptive stop: DCX stable after {len(trajectories)}/{n} trajectories.")
+                    break
+                # Check for manual collapse after each trajectory lands
+                if self._force_collapse.is_set():
+                    self.log_sys(f"!! Collapse triggered with {len(trajectories)}/{n} trajectories collected.")
+                    break
+            landed_results.close()  # Cancels whatever is still pending or streaming
+            hedger = self.storm_hedger
+            self.log_sys(f"Adaptive concurrency for {main_model}: {limiter.describe()}")
+            if hedger is not None and hedger.launched:
+                self.log_sys(f"Straggler hedging: {hedger.describe()}")
 
             # 3. Vectorize & Analyze
             self.log_sys("Collapsing Wave Function (DCX)...")
             self.root.after(0, lambda: self.progress.configure(value=n+1))
             
-            storm_result = self.logic.analyze_storm(
-                trajectories, model_names, engine=self.engine, high_thresh=h_thresh
-            )
+            storm_result = storm.result(high_thresh=h_thresh)
             status = storm_result["status"]
+            distinct = storm_result.get("distinct_count", len(trajectories))
+            if distinct < len(trajectories):
+                self.log_sys(f"Folded {len(trajectories) - distinct} duplicate trajectories ({distinct} distinct).")
+            if storm_result.get("jl_distortion"):
+                self.log_sys(f"JL projection k={self.logic.projector.k}: distortion bound eps={storm_result['jl_distortion']:.3f}")
+            cache_stats = self.logic.embedding_cache_stats()
+            self.log_sys(f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                         f"({cache_stats['hit_rate']:.0%})")
             
             if status == "FROZEN_HIGH_DIVERGENCE":
                 result = ">> SYSTEM FREEZE: Storm Variance exceeded safety limits."
@@ -584,12 +649,17 @@ class PromptTheatorUI:
                 top_3_texts = [trajectories[i] for i in top_3_indices]
                 
                 self.log_sys("Synthesizing Path B via Mascot...")
-                self.mascot_engine.set_model(mascot_model)
-                path_b_result = self.logic.semantic_synthesis(self.mascot_engine, top_3_texts, current_prompt)
+                # The embedding lane embeds (and caches) the audit's source texts while
+                # the mascot lane is still synthesizing
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as lane:
+                    prefetch = lane.submit(self.logic.get_semantic_embeddings,
+                                           [f"{mascot_model}:{t}" for t in top_3_texts], audit_engine)
+                    path_b_result = self.logic.semantic_synthesis(mascot_engine, top_3_texts, current_prompt)
+                    prefetch.result()
                 
                 # --- Phase 6 Audit Step ---
                 self.log_sys("Performing Synthesis Audit Loopback...")
-                synth_coherence = self.logic.verify_synthesis(path_b_result, top_3_texts, mascot_model, engine=self.mascot_engine)
+                synth_coherence = self.logic.verify_synthesis(path_b_result, top_3_texts, mascot_model, engine=audit_engine)
                 
                 if synth_coherence < 0.7:
                     self.log_rich("!! WARNING: LOW SYNTHESIS COHERENCE DETECTED !!", "USER")
@@ -652,6 +722,9 @@ class PromptTheatorUI:
                         {"text": t, "score": s} for t, s in zip(trajectories, storm_result["scores"])
                     ],
                     "dcx_min": storm_result["min_dcx"],
+                    "stopped_early_at": storm.stopped_early_at,
+                    "concurrency_limit": limiter.limit,
+                    "hedging": hedger.as_dict() if hedger is not None else None,
                     "synthesis": path_b_result,
                     "synthesis_coherence": synth_coherence
                 }
@@ -671,6 +744,121 @@ class PromptTheatorUI:
             err_msg = str(e)
             self.root.after(0, lambda: self.finish(f"CRITICAL ERROR: {err_msg}", "CRASH"))
 
+    def iter_storm(self, storm_engine, full_prompt, n, temp, tokens, hedge=False):
+        """
+        Yields final-storm trajectories as they land. Ollama storms of ASYNC_STORM_MIN_N
+        and up stream through AsyncEngineV3 (closing cancels in-flight streams, hedges
+        cancel their losers; with hedge set, the storm's Hedger is left in self.storm_hedger);
+        GGML and small storms use the thread pool (no hedging). Closing
+        cancels queued paths; GGML paths also stream their tokens into the progress bar
+        and stop within one token, small Ollama storms finish their in-flight requests.
+        """
+        main_model = storm_engine.model
+        limiter = self.storm_limiter(main_model)
+        completed = 0
+        self.storm_hedger = None
+
+        if storm_engine.engine is self.engine_v1 and n >= ASYNC_STORM_MIN_N:
+            self.log_sys(f"Async streaming backend: {n} streams on one event loop.")
+            # Only the async backend hedges, so only its storms get a Hedger
+            hedger = self.storm_hedger = Hedger() if hedge else None
+            options = {"temperature": temp, "num_predict": tokens, "num_thread": self.threads_var.get()}
+            run = self.engine_v3.start_storm(full_prompt, n, model=main_model, options=options,
+                                             limiter=limiter, hedger=hedger)
+            try:
+                for _, res in run:
+                    completed += 1
+                    self.root.after(0, lambda c=completed: self.progress.configure(value=c))
+                    yield res
+            finally:
+                run.cancel()
+            return
+
+        stop = threading.Event()
+        streamed = [0] * n      # Tokens streamed so far by each GGML path still generating
+        last_draw = [0.0]
+
+        def stream_progress(idx):
+            def on_token(_text):
+                streamed[idx] += 1
+                now = time.perf_counter()
+                if now - last_draw[0] >= 0.1:  # Redraw at most 10x per second across all paths
+                    last_draw[0] = now
+                    value = completed + sum(streamed) / max(1, tokens)
+                    self.root.after(0, lambda v=value: self.progress.configure(value=v))
+            return on_token
+
+        def run_single_path(idx):
+            nonlocal completed
+            with limiter.slot() as slot:
+                if stop.is_set():
+                    slot.record = False  # Storm already collapsed while this path waited
+                    return None
+                self.log_sys(f"- Starting Path {idx+1}/{n}...")
+                if storm_engine.name == "ggml":
+                    res = storm_engine.generate(
+                        full_prompt, 
+                        temperature=temp, 
+                        num_predict=tokens, 
+                        num_thread=self.threads_var.get(),
+                        cdlss_trajectories=n,
+                        cdlss_dcx=float(self.dcx_high.get()),
+                        on_token=stream_progress(idx),
+                        cancel=stop
+                    )
+                    streamed[idx] = 0
+                    if stop.is_set():
+                        slot.record = False  # Cut short by the collapse: not a latency sample
+                        return None
+                else:
+                    res = storm_engine.generate(full_prompt, temperature=temp, num_predict=tokens, num_thread=self.threads_var.get())
+                slot.work = len(res or "")
+                slot.ok = not generation_failed(res)
+            completed += 1
+            self.root.after(0, lambda: self.progress.configure(value=completed))
+            return res
+
+        # Threads up to the ceiling; the limiter decides how many generate at once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=limiter.max_limit) as executor:
+            futures = [executor.submit(run_single_path, i) for i in range(n)]
+            try:
+                for f in concurrent.futures.as_completed(futures):
+                    yield f.result()
+            finally:
+                stop.set()
+                for pending in futures:
+                    pending.cancel()
+
+    def stage_engines(self, main_model, mascot_model):
+        """
+        Per-stage handles for one run (storm, mascot, embedding, audit embedding), each
+        bound to its model with its own lane, so the stages can overlap without racing
+        on set_model(). Storm embeddings come from the storm backend (GGML falls back to
+        hashed vectors); the mascot and its synthesis audit always use Ollama.
+        """
+        embed_model = self.logic.embed_models[0]
+        storm_engine = self.engine.bind(main_model)
+        mascot_engine = self.engine_v1.bind(mascot_model, max_concurrency=MASCOT_LANE)
+        embed_engine = self.engine.bind(embed_model, max_concurrency=EMBED_LANE)
+        if self.engine is self.engine_v1:
+            audit_engine = embed_engine
+        else:
+            audit_engine = self.engine_v1.bind(embed_model, max_concurrency=EMBED_LANE)
+        return storm_engine, mascot_engine, embed_engine, audit_engine
+
+    def prefill_storm(self, prompt, n, storm_engine):
+        """Evaluates the shared storm prompt once so the n trajectories only pay for their own tokens."""
+        if n < 2 or not capabilities_of(storm_engine).prefix_cache:
+            return
+        t0 = time.perf_counter()
+        if storm_engine.prefill(prompt, num_thread=self.threads_var.get()):
+            self.log_sys(f"Prompt prefix prefilled once in {time.perf_counter() - t0:.2f}s (shared by {n} paths).")
+
+    def storm_limiter(self, model):
+        """Adaptive concurrency for (server, model); the workers setting is only its ceiling."""
+        server = getattr(self.engine, "base_url", self.engine.name)
+        return get_limiter((server, model), max_limit=self.workers_var.get())
+
     def save_storm_audit(self, data):
         """Saves deep diagnostic storm data to JSON with robust serialization."""
         base_dir = os.path.dirname(os.path.abspath(__file__))